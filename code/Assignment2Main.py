@@ -10,131 +10,81 @@ You may NOT download or copy this file for publication or sale.
 This file is intended for teaching purposes.
 '''
 
-import numpy as np
-import Plotter as pl
-import MeshGenerator as mg
-import Discretisation as dc
+import os
 import ErrorAnalysis as ea
+import RefinementStudy as rs
+import HeatDiffusion as hd
 
+# Set to a directory to render every figure headless to a PNG file there instead of opening plot windows.
+PlotDirectory = None
+
+def PlotFile(name):
+
+    return None if PlotDirectory is None else os.path.join(PlotDirectory, name + ".png")
 
-def ImplicitDiffusion(nodeTable, thermalConduct, isquiet):
-    """
-    Solves the heat diffusion equation implicitly.
-    :param nodeTable: The node table for the mesh, with all co-ordinates, volumes and initial conditions computed.
-    :param thermalConduct: The thermal conductivity of the fluid.
-    :param isquiet: When true suppresses all write outs.
-    :return: A node table with solved temperatures and error at each node.
-    """
-    # Determine number of nodes
-    numberofNodesX = len(nodeTable.TemperatureNP1)
-    numberofNodesY = len(nodeTable.TemperatureNP1[0])
-
-    # Build Coefficient Matrix and Source Vectors
-    SourceVector = np.zeros(dtype=float, shape=(numberofNodesX*numberofNodesY, 1))
-    TemperatureVector = np.zeros(dtype=float, shape=(numberofNodesX*numberofNodesY, 1))
-    DiffusionMatrix = np.zeros(dtype=float, shape=(numberofNodesX*numberofNodesY, numberofNodesX*numberofNodesY))
-
-    for inode in range(numberofNodesX*numberofNodesY):
-        DiffusionMatrix[:][inode] -= dc.Diffusion2DRow(nodeTable.Coordinate, nodeTable.CellSize, nodeTable.Volume, thermalConduct, inode)
-        SourceVector[inode] = dc.ComputeSource(nodeTable.Coordinate, inode)
-
-    # Solve implicit system Ax = b.
-    # hint: use np linear algebra to solve the system, ie your line should look like TemperatureVector = ....
-# code here...
-
-    # Transfer solution to node table
-    for irow in range(numberofNodesY):
-        for icolu in range(numberofNodesX):
-            nodeTable.TemperatureNP1[icolu][irow] = TemperatureVector[dc.GetMatrixIndex(icolu, irow, numberofNodesX)]
-
-    # Perform error analysis
-    for irow in range(numberofNodesY):
-        for icolu in range(numberofNodesX):
-            nodeTable.AnalyticalSolution[icolu][irow] = ea.AnalyicalSolution2D(nodeTable.Coordinate[icolu][irow])
-            nodeTable.AbsoluteError[icolu][irow] = ea.ComputeAbsoluteError(nodeTable.TemperatureNP1[icolu][irow], nodeTable.AnalyticalSolution[icolu][irow])
-
-    if not isquiet:
-        print("\nSimulation completed")
-    return nodeTable
 
 '''
 ***************************************************************************************************************************************************************
 Solve part C.
 ***************************************************************************************************************************************************************
 '''
-# Set up variables
-NumberofNodesX = 2
-NumberofNodesY = 2
-ThermalConductivity = 4.0
-
-#Set up plotter (customise plotter here)
-plotter = pl.Plotter("Assignment 2 - Part C", 2, 2, 3)
-plotter.Add2DPlot(1, "Temperature distrabution", "Co-ordiante", "Temperature", NumberofNodesX, NumberofNodesY, True)
-plotter.Add2DPlot(2, "Temperature Analytical", "Co-ordiante", "Temperature", NumberofNodesX, NumberofNodesY, True)
-plotter.Add2DPlot(3, "Error Absolute", "Co-ordiante", "Absolute Error", NumberofNodesX, NumberofNodesY, True)
-
-nodeTable = mg.GenerateMesh2DMesh(NumberofNodesX, NumberofNodesY)
-# code here...
-
-# Report result and plot
-print('Maximum error in the mesh is: ' + str(np.amax(nodeTable.AbsoluteError)))
-plotter.Update2DPlotData(1, nodeTable.TemperatureNP1, "Temperature")
-plotter.Update2DPlotData(2, nodeTable.AnalyticalSolution, "Analytical Temperature")
-plotter.Update2DPlotData(3, nodeTable.AbsoluteError, "Absolute Error")
-plotter.Plot(True)
+def SolvePartC():
+
+    # Set up variables
+    NumberofNodesX = 2
+    ThermalConductivity = 4.0
+
+    nodeTable = hd.SolveMesh(NumberofNodesX, ThermalConductivity, isquiet=False)
+
+    # Report result and plot
+    print('Maximum error in the mesh is: ' + str(nodeTable.ErrorNorms['MaxError']))
+    hd.PlotSolution(nodeTable, "Assignment 2 - Part C", PlotFile("PartC"))
+    return nodeTable
+
 
 '''
 ***************************************************************************************************************************************************************
 Solve part D.
 ***************************************************************************************************************************************************************
 '''
-# Set up variables
-ThermalConductivity = 4
-MeshSize = []
-MeshAbsoluteError = []
+def SolvePartD():
 
-# code here...
+    # Set up variables
+    ThermalConductivity = 4
 
-# Set up plotter (customise plotter here)
-plotter = pl.Plotter("Assignment 2 - Part D", 1, 1, 1)
-plotter.Add1DPlot(1, "Temperature distrabution", "Co-ordiante", "Temperature", "", "-", False)
+    # Solve every mesh of the refinement study in parallel.
+    StudyResults = rs.RunRefinementStudy([5, 9, 17, 33, 65], ThermalConductivity)
+    rs.PrintRefinementStudy(StudyResults)
 
-# code here...
+    # State l2Norm and plot mesh error vs size.
+    print('L2Norm is: ' + str(ea.ComputeErrorL2Norm(list(StudyResults['MaxError']), list(StudyResults['MeshSize']))))
+    hd.PlotRefinementStudy(StudyResults, "Assignment 2 - Part D", PlotFile("PartD"))
+    return StudyResults
 
-# State l2Norm and plot mesh error vs size.
-print('L2Norm is: ' + str(ea.ComputeErrorL2Norm(MeshAbsoluteError, MeshSize)))
-plotter.Update1DPlotData(1, MeshSize, MeshAbsoluteError, "")
-plotter.Plot(True)
 
 '''
 ***************************************************************************************************************************************************************
 Solve part E.
 ***************************************************************************************************************************************************************
 '''
-# Set up variables
-NumberofNodesX = 10
-NumberofNodesY = 10
-ThermalConductivity = 4.0
-ErrorTolerence = 1.0e-5
-MaxAbsoluteError = ErrorTolerence * 10.0 # change to ErrorTolerence * 10.0 to actually solve the problem
-
-# Set up plotter (customise plotter here)
-plotter = pl.Plotter("Assignment 2 - Part E", 2, 2, 3)
-plotter.Add2DPlot(1, "Temperature distrabution", "Co-ordiante", "Temperature", NumberofNodesX, NumberofNodesY, True)
-plotter.Add2DPlot(2, "Temperature Analytical", "Co-ordiante", "Temperature", NumberofNodesX, NumberofNodesY, True)
-plotter.Add2DPlot(3, "Error Absolute", "Co-ordiante", "Absolute Error", NumberofNodesX, NumberofNodesY, True)
-
-while MaxAbsoluteError > ErrorTolerence:
-# code here...
-    print("Mesh Size: " + str(NumberofNodesX) + 'x' + str(NumberofNodesY) + '\tAbsolute error: ' + str(MaxAbsoluteError))
-
-# code here...
-
-# Re-run final solution to obtain the plots for the mesh with the least number of nodes.
-nodeTable = mg.GenerateMesh2DMesh(NumberofNodesX, NumberofNodesY)
-nodeTable = ImplicitDiffusion(nodeTable, ThermalConductivity, True)
-plotter.Update2DPlotData(1, nodeTable.TemperatureNP1, "Temperature")
-plotter.Update2DPlotData(2, nodeTable.AnalyticalSolution, "Analytical Temperature")
-plotter.Update2DPlotData(3, nodeTable.AbsoluteError, "Absolute Error")
-plotter.Plot(True)
+def SolvePartE():
+
+    # Set up variables
+    NumberofNodesX = 10
+    ThermalConductivity = 4.0
+    ErrorTolerence = 1.0e-5
+
+    # Find the smallest mesh meeting the tolerance from the convergence rate instead of growing it one node at a time.
+    MeshSize, MaxAbsoluteError, NumberofSolves = rs.SearchMeshSize(ThermalConductivity, ErrorTolerence, NumberofNodesX, isquiet=False)
+    print("Smallest mesh: " + str(MeshSize) + 'x' + str(MeshSize) + '\tAbsolute error: ' + str(MaxAbsoluteError) + '\tSolves: ' + str(NumberofSolves))
+
+    # Re-run final solution to obtain the plots for the mesh with the least number of nodes.
+    nodeTable = hd.SolveMesh(MeshSize, ThermalConductivity)
+    hd.PlotSolution(nodeTable, "Assignment 2 - Part E", PlotFile("PartE"))
+    return MeshSize
+
 
+if __name__ == '__main__':
+    SolvePartC()
+    SolvePartD()
+    SolvePartE()
@@ -0,0 +1,422 @@
+'''
+File Name: Benchmarks.py
+Description: Performance benchmarks for the diffusion solvers.
+Author: Bevan Jones
+Copyright Notice:
+This file is property of the University of Cape Town
+You may download or copy this file for use in your own program.
+You may NOT download or copy this file to another site.
+You may NOT download or copy this file for publication or sale.
+This file is intended for teaching purposes.
+'''
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import numpy as np
+import scipy
+import MeshGenerator as mg
+import Discretisation as dc
+import ErrorAnalysis as ea
+import IterativeSolver as its
+import Multigrid as mgs
+import RefinementStudy as rs
+import MeshOptimiser as mo
+import QuadtreeRefinement as qr
+from DiffusionSolver import ImplicitDiffusion
+
+# One row per phase per mesh of a benchmark suite.
+PhaseResultType = np.dtype([('MeshSize', int), ('Nodes', int), ('Phase', 'U16'), ('Time', float), ('PeakMemory', int)])
+
+# Phases timed by RunBenchmarkSuite, in the order they run.
+BenchmarkPhases = ["mesh", "assembly", "solve", "error", "plot"]
+
+
+def BenchmarkMultigrid(meshSizes, stretchFactor, tolerance, isfullMultigrid=False):
+    """
+    Reports multigrid cycles to tolerance and solve time against mesh size.
+    :param meshSizes: Number of nodes in each direction for each run.
+    :param stretchFactor: Stretch factor applied in both directions.
+    :param tolerance: Relative residual tolerance.
+    :param isfullMultigrid: When true the first cycle is a full multigrid cycle.
+    :return: List of (mesh size, levels, cycles, solve time) tuples.
+    """
+    results = []
+    print("\nMultigrid, stretch factor " + str(stretchFactor) + ", tolerance " + str(tolerance))
+    print("Mesh Size\tLevels\tCycles\tSolve time (s)\tTime per node (us)")
+    for meshSize in meshSizes:
+        coordinates = mg.ComputeNodeLine(meshSize, stretchFactor)
+        nodeCoordinate = np.zeros((meshSize, meshSize, 2))
+        nodeCoordinate[:, :, 0] = coordinates[:, np.newaxis]
+        nodeCoordinate[:, :, 1] = coordinates[np.newaxis, :]
+        source = dc.ComputeSourceField(nodeCoordinate)
+
+        startTime = time.perf_counter()
+        hierarchy = mgs.MultigridHierarchy(coordinates, coordinates, 4.0, smoother=mgs.SelectSmoother(coordinates, coordinates))
+        phi, rhs = its.MatrixFreeSystem(hierarchy.Operator[0], source)
+        phi, residualHistory = mgs.MultigridSolve(hierarchy, phi, rhs, tolerance, 100, isfullMultigrid)
+        solveTime = time.perf_counter() - startTime
+
+        results.append((meshSize, hierarchy.NumberofLevels(), len(residualHistory) - 1, solveTime))
+        print(str(meshSize) + 'x' + str(meshSize) + '\t' + str(hierarchy.NumberofLevels()) + '\t' + str(len(residualHistory) - 1) + '\t'
+              + '%.4f' % solveTime + '\t\t' + '%.3f' % (1.0e6*solveTime/meshSize**2))
+    return results
+
+
+def BenchmarkMeshGeneration(meshSizes, stretchFactor):
+    """
+    Reports the time to generate a full mesh against mesh size.
+    :param meshSizes: Number of nodes in each direction for each run.
+    :param stretchFactor: Stretch factor applied in both directions.
+    :return: List of (mesh size, generation time) tuples.
+    """
+    results = []
+    print("\nMesh generation, stretch factor " + str(stretchFactor))
+    print("Mesh Size\tNodes\t\tTime (s)\tTime per node (ns)")
+    for meshSize in meshSizes:
+        startTime = time.perf_counter()
+        mg.GenerateMesh2DMesh(meshSize, meshSize, stretchFactor, stretchFactor)
+        generationTime = time.perf_counter() - startTime
+
+        results.append((meshSize, generationTime))
+        print(str(meshSize) + 'x' + str(meshSize) + '\t' + str(meshSize**2) + '\t\t' + '%.4f' % generationTime + '\t\t' + '%.2f' % (1.0e9*generationTime/meshSize**2))
+    return results
+
+
+def BenchmarkWarmStart(meshSizes, solverType, stretchFactor=1.0):
+    """
+    Reports the iterations saved per mesh of a refinement sweep by starting each solve from the previous mesh's solution.
+    :param meshSizes: Number of nodes in each direction for each mesh, solved coarse to fine.
+    :param solverType: Iterative solver passed to ImplicitDiffusion.
+    :param stretchFactor: Stretch factor applied in both directions.
+    :return: List of (mesh size, cold iterations, warm iterations, cold time, warm time) tuples.
+    """
+    coldResults = rs.RunRefinementStudy(meshSizes, 4.0, solverType, stretchFactor, maxWorkers=0)
+    warmResults = rs.RunRefinementStudy(meshSizes, 4.0, solverType, stretchFactor, iswarmStart=True)
+
+    results = []
+    print("\nWarm start, " + solverType + ", stretch factor " + str(stretchFactor))
+    print("Mesh Size\tCold iterations\tWarm iterations\tCold time (s)\tWarm time (s)")
+    for cold, warm in zip(coldResults, warmResults):
+        results.append((cold['MeshSize'], cold['Iterations'], warm['Iterations'], cold['SolveTime'], warm['SolveTime']))
+        print(str(cold['MeshSize']) + 'x' + str(cold['MeshSize']) + '\t' + str(cold['Iterations']) + '\t\t' + str(warm['Iterations']) + '\t\t'
+              + '%.4f' % cold['SolveTime'] + '\t\t' + '%.4f' % warm['SolveTime'])
+    return results
+
+
+def BenchmarkGradedMesh(errorTolerances):
+    """
+    Compares the fewest nodes meeting each error tolerance on a uniform mesh and on a mesh graded by MeshOptimiser.
+    :param errorTolerances: Largest acceptable maximum absolute errors.
+    :return: List of (tolerance, uniform mesh size, graded mesh size, (x, y) cell ratios) tuples.
+    """
+    results = []
+    print("\nGraded meshes")
+    print("Tolerance\tUniform\t\tGraded\t\tNode fraction\tCell ratios")
+    for errorTolerance in errorTolerances:
+        uniformSize = rs.SearchMeshSize(4.0, errorTolerance, 5)[0]
+        gradedSize, cellRatios, maxError, numberofSolves = mo.SearchGradedMeshSize(4.0, errorTolerance, 9)
+        results.append((errorTolerance, uniformSize, gradedSize, cellRatios))
+        print('%.1e' % errorTolerance + '\t\t' + str(uniformSize) + 'x' + str(uniformSize) + '\t\t' + str(gradedSize) + 'x' + str(gradedSize) + '\t\t'
+              + '%.2f' % (gradedSize**2/uniformSize**2) + '\t\t' + '%.3f' % cellRatios[0] + ', ' + '%.3f' % cellRatios[1])
+    return results
+
+
+def BenchmarkLocalRefinement(errorTolerances, blockCells=8, maxLevel=6):
+    """
+    Compares uniform refinement of the block hierarchy with refinement of only the blocks with the largest error estimates.
+    :param errorTolerances: Largest acceptable maximum absolute errors.
+    :param blockCells: Cells along each side of a block, at least 5.
+    :param maxLevel: Deepest level of the quadtree.
+    :return: List of (tolerance, uniform cells, adaptive cells, uniform solve time, adaptive solve time) tuples.
+    """
+    results = []
+    print("\nBlock structured refinement, " + str(blockCells) + 'x' + str(blockCells) + " cell blocks")
+    print("Tolerance\tUniform cells\tAdaptive cells\tUniform solve (s)\tAdaptive solve (s)")
+    for errorTolerance in errorTolerances:
+        uniform = qr.RefineToTolerance(4.0, errorTolerance, blockCells, maxLevel, refineFraction=0.0)
+        adaptive = qr.RefineToTolerance(4.0, errorTolerance, blockCells, maxLevel)
+        results.append((errorTolerance, uniform.NumberofCells(), adaptive.NumberofCells(), uniform.SolveTime, adaptive.SolveTime))
+        print('%.1e' % errorTolerance + '\t\t' + str(uniform.NumberofCells()) + '\t\t' + str(adaptive.NumberofCells()) + '\t\t'
+              + '%.4f' % uniform.SolveTime + '\t\t\t' + '%.4f' % adaptive.SolveTime)
+    return results
+
+
+def BenchmarkDomainDecomposition(meshSize, subdomainLayouts, stretchFactor=1.0, tolerance=1.0e-10):
+    """
+    Strong scaling of the parallel solver, one fixed mesh solved with more and more subdomains. The efficiency of P subdomains is
+    T1/(P TP) against the first layout, scaled by its number of subdomains, so a value near one means the extra processes paid for themselves.
+    :param meshSize: Number of nodes in each direction.
+    :param subdomainLayouts: (subdomains in x, subdomains in y) of each run, the first is the reference.
+    :param stretchFactor: Stretch factor applied in both directions.
+    :param tolerance: Relative residual tolerance.
+    :return: List of (subdomains, iterations, time, speed up, efficiency) tuples.
+    """
+    nodeTable = mg.GenerateMesh2DMesh(meshSize, meshSize, stretchFactor, stretchFactor)
+    results = []
+    print("\nDomain decomposition, " + str(meshSize) + 'x' + str(meshSize) + ", " + str(os.cpu_count()) + " cores")
+    print("Subdomains\tIterations\tTime (s)\tSpeed up\tEfficiency")
+    for layout in subdomainLayouts:
+        startTime = time.perf_counter()
+        ImplicitDiffusion(nodeTable, 4.0, True, "parallel", tolerance, subdomains=layout)
+        solveTime = time.perf_counter() - startTime
+        numberofSubdomains = layout[0]*layout[1]
+        if not results:
+            referenceTime, referenceSubdomains = solveTime, numberofSubdomains
+        speedUp = referenceTime/solveTime
+        efficiency = speedUp*referenceSubdomains/numberofSubdomains
+        results.append((tuple(layout), len(nodeTable.ResidualHistory) - 1, solveTime, speedUp, efficiency))
+        print(str(layout[0]) + 'x' + str(layout[1]) + '\t\t' + str(results[-1][1]) + '\t\t' + '%.4f' % solveTime + '\t\t' + '%.2f' % speedUp
+              + '\t\t' + '%.2f' % efficiency)
+    return results
+
+
+def BenchmarkMixedPrecision(meshSize, solverTypes, stretchFactor=1.0, tolerance=1.0e-10):
+    """
+    Double against mixed precision solves of one mesh, the memory held by the assembled solver, the solve time and the change in maximum error.
+    :param meshSize: Number of nodes in each direction.
+    :param solverTypes: Solver types passed to ImplicitDiffusion.
+    :param stretchFactor: Stretch factor applied in both directions.
+    :param tolerance: Relative residual tolerance.
+    :return: List of (solver type, double bytes, mixed bytes, double time, mixed time, maximum error difference) tuples.
+    """
+    nodeTable = mg.GenerateMesh2DMesh(meshSize, meshSize, stretchFactor, stretchFactor)
+    results = []
+    print("\nMixed precision, " + str(meshSize) + 'x' + str(meshSize) + ", stretch factor " + str(stretchFactor))
+    print("Solver\t\tDouble (MB)\tMixed (MB)\tDouble time (s)\tMixed time (s)\tError difference")
+    for solverType in solverTypes:
+        phases = []
+        for ismixedPrecision in [False, True]:
+            ImplicitDiffusion(nodeTable, 4.0, True, solverType, tolerance, factorisationCache=None, isstoreErrorFields=False, ismixedPrecision=ismixedPrecision)
+            phases.append((nodeTable.Profile.Phases["assembly"]["Bytes"], nodeTable.Profile.Phases["assembly"]["Time"] + nodeTable.Profile.Phases["solve"]["Time"],
+                           float(nodeTable.ErrorNorms['MaxError'])))
+        (doubleBytes, doubleTime, doubleError), (mixedBytes, mixedTime, mixedError) = phases
+        results.append((solverType, doubleBytes, mixedBytes, doubleTime, mixedTime, abs(mixedError - doubleError)))
+        print(solverType + '\t\t' + '%.2f' % (doubleBytes/1024**2) + '\t\t' + '%.2f' % (mixedBytes/1024**2) + '\t\t' + '%.4f' % doubleTime + '\t\t'
+              + '%.4f' % mixedTime + '\t\t' + '%.2e' % results[-1][5])
+    return results
+
+
+def MeasurePhase(repeats, function, *args, **kwargs):
+    """
+    Times a function as the best of several runs, then records the peak memory it allocates (numpy arrays included) in one more run
+    under tracemalloc, which is kept out of the timed runs because it slows Python heavy code such as plotting.
+    :param repeats: Number of timed runs.
+    :param function: The phase to run, it must give the same result every run.
+    :return: function's result, wall time in seconds, peak allocated bytes
+    """
+    wallTime = np.inf
+    for irepeat in range(repeats):
+        startTime = time.perf_counter()
+        function(*args, **kwargs)
+        wallTime = min(wallTime, time.perf_counter() - startTime)
+
+    tracemalloc.start()
+    result = function(*args, **kwargs)
+    peakMemory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, wallTime, peakMemory
+
+
+def MeasureSolvePhases(repeats, nodeTable, solverType, phases=("assembly", "solve")):
+    """
+    Times phases of ImplicitDiffusion from its profile, so each covers only the work the chosen solver does in it, eg no matrix is
+    assembled for "fast". Each phase's time is the best of several runs, and its peak memory is taken in one more run under tracemalloc.
+    :param repeats: Number of timed runs.
+    :param nodeTable: The node table for the mesh, solved in place.
+    :param solverType: Solver passed to ImplicitDiffusion.
+    :param phases: Names of the profile phases to report.
+    :return: List of (phase, wall time in seconds, peak allocated bytes) tuples.
+    """
+    wallTimes = {phase: np.inf for phase in phases}
+    for irepeat in range(repeats):
+        ImplicitDiffusion(nodeTable, 4.0, True, solverType, factorisationCache=None, isstoreErrorFields=False)
+        for phase in phases:
+            wallTimes[phase] = min(wallTimes[phase], nodeTable.Profile.Phases[phase]["Time"])
+
+    # Peaks are counted from the memory in use as the phase starts, ie what the phase itself allocates.
+    peakMemories = {}
+    startMemory = [0]
+
+    def RecordPeak(name, record):
+        currentMemory, peakMemory = tracemalloc.get_traced_memory()
+        peakMemories[name] = peakMemory - startMemory[0]
+        startMemory[0] = currentMemory
+        tracemalloc.reset_peak()
+
+    tracemalloc.start()
+    ImplicitDiffusion(nodeTable, 4.0, True, solverType, factorisationCache=None, isstoreErrorFields=False, hooks=[RecordPeak])
+    tracemalloc.stop()
+    return [(phase, wallTimes[phase], peakMemories[phase]) for phase in phases]
+
+
+def PlotPhase(nodeTable, fileName):
+
+    # The three panel figure of Assignment2Main, rendered headless.
+    import Plotter as pl
+    numberofNodesX = len(nodeTable.Coordinate)
+    numberofNodesY = len(nodeTable.Coordinate[0])
+    plotter = pl.Plotter("Benchmark", 2, 2, 3, fileName)
+    plotter.Add2DPlot(1, "Temperature distrabution", "Co-ordiante", "Temperature", numberofNodesX, numberofNodesY, True)
+    plotter.Add2DPlot(2, "Temperature Analytical", "Co-ordiante", "Temperature", numberofNodesX, numberofNodesY, True)
+    plotter.Add2DPlot(3, "Error Absolute", "Co-ordiante", "Absolute Error", numberofNodesX, numberofNodesY, True)
+    plotter.Update2DPlotData(1, nodeTable.TemperatureNP1, "Temperature")
+    plotter.Update2DPlotData(2, nodeTable.AnalyticalSolution, "Analytical Temperature")
+    plotter.Update2DPlotData(3, nodeTable.AbsoluteError, "Absolute Error")
+    plotter.SaveFigure(fileName, False)
+
+
+def RunBenchmarkSuite(meshSizes, solverType="fast", stretchFactor=1.0, isplot=True, repeats=3):
+    """
+    Times every phase of a run (mesh generation, assembly, solve, error analysis and plotting) across a ladder of mesh sizes.
+    Assembly and solve are the solver's own phases, see MeasureSolvePhases.
+    :param meshSizes: Number of nodes in each direction for each mesh.
+    :param solverType: Solver passed to ImplicitDiffusion.
+    :param stretchFactor: Stretch factor applied in both directions.
+    :param isplot: When false the plot phase is skipped.
+    :param repeats: Number of timed runs of each phase, the fastest is reported.
+    :return: Structured array of PhaseResultType, one row per mesh size and phase.
+    """
+    results = []
+    print("\nBenchmark suite, " + solverType + ", stretch factor " + str(stretchFactor))
+    print("Mesh Size\tPhase\t\tTime (s)\tPeak memory (MB)")
+    with tempfile.TemporaryDirectory() as directory:
+        for meshSize in meshSizes:
+            nodeTable, meshTime, meshMemory = MeasurePhase(repeats, mg.GenerateMesh2DMesh, meshSize, meshSize, stretchFactor, stretchFactor)
+            phases = [("mesh", meshTime, meshMemory)]
+            phases += MeasureSolvePhases(repeats, nodeTable, solverType)
+            phases.append(("error",) + MeasurePhase(repeats, ea.ComputeErrorNorms, nodeTable.Coordinate, nodeTable.TemperatureNP1, nodeTable.Volume,
+                                                    nodeTable.AbsoluteError[:, :, 0], nodeTable.AnalyticalSolution[:, :, 0])[1:])
+            if isplot:
+                phases.append(("plot",) + MeasurePhase(repeats, PlotPhase, nodeTable, os.path.join(directory, "Benchmark.png"))[1:])
+
+            for phase, phaseTime, peakMemory in phases:
+                results.append((meshSize, meshSize**2, phase, phaseTime, peakMemory))
+                print(str(meshSize) + 'x' + str(meshSize) + '\t' + phase + '\t\t' + '%.4f' % phaseTime + '\t\t' + '%.2f' % (peakMemory/1024.0**2))
+    return np.array(results, dtype=PhaseResultType)
+
+
+def ScalingExponents(results):
+    """
+    Least squares slope of log(time) against log(nodes) for each phase, 1 is linear scaling.
+    :param results: Output of RunBenchmarkSuite.
+    :return: Dictionary of phase to exponent.
+    """
+    exponents = {}
+    for phase in BenchmarkPhases:
+        phaseResults = results[results['Phase'] == phase]
+        if len(phaseResults) > 1:
+            exponents[phase] = float(np.polyfit(np.log(phaseResults['Nodes']), np.log(np.maximum(phaseResults['Time'], 1.0e-9)), 1)[0])
+    return exponents
+
+
+def WriteBenchmarkJSON(results, fileName, solverType, stretchFactor):
+    """
+    Writes the suite's results, scaling exponents and the environment they were measured in as JSON.
+    :param results: Output of RunBenchmarkSuite.
+    :param fileName: JSON file to write.
+    :return: void
+    """
+    report = {"Environment": {"Python": platform.python_version(), "Numpy": np.__version__, "Scipy": scipy.__version__,
+                              "Machine": platform.machine(), "Platform": platform.platform()},
+              "SolverType": solverType,
+              "StretchFactor": stretchFactor,
+              "ScalingExponents": ScalingExponents(results),
+              "Results": [{name: row[name].item() for name in PhaseResultType.names} for row in results]}
+    with open(fileName, 'w') as jsonFile:
+        json.dump(report, jsonFile, indent=2)
+
+
+def ReadBenchmarkJSON(fileName):
+    """
+    Reads results written by WriteBenchmarkJSON.
+    :param fileName: JSON file to read.
+    :return: Structured array of PhaseResultType.
+    """
+    with open(fileName) as jsonFile:
+        report = json.load(jsonFile)
+    return np.array([tuple(row[name] for name in PhaseResultType.names) for row in report["Results"]], dtype=PhaseResultType)
+
+
+def CompareWithBaseline(results, baseline, timeTolerance=0.5, memoryTolerance=0.25, minimumTime=1.0e-3):
+    """
+    Flags phases that got slower or use more memory than a stored baseline, matching rows by mesh size and phase.
+    :param results: Output of RunBenchmarkSuite.
+    :param baseline: Earlier results, eg from ReadBenchmarkJSON.
+    :param timeTolerance: Allowed relative increase in time.
+    :param memoryTolerance: Allowed relative increase in peak memory.
+    :param minimumTime: Phases faster than this in both runs are too noisy to compare in time.
+    :return: List of (mesh size, phase, quantity, baseline value, new value) tuples, empty when nothing regressed.
+    """
+    baselineRows = {(int(row['MeshSize']), str(row['Phase'])): row for row in baseline}
+    regressions = []
+    for row in results:
+        key = (int(row['MeshSize']), str(row['Phase']))
+        if key not in baselineRows:
+            continue
+        baselineRow = baselineRows[key]
+        if max(row['Time'], baselineRow['Time']) >= minimumTime and row['Time'] > (1.0 + timeTolerance)*baselineRow['Time']:
+            regressions.append(key + ("Time", float(baselineRow['Time']), float(row['Time'])))
+        if row['PeakMemory'] > (1.0 + memoryTolerance)*baselineRow['PeakMemory']:
+            regressions.append(key + ("PeakMemory", int(baselineRow['PeakMemory']), int(row['PeakMemory'])))
+    return regressions
+
+
+def PlotScalingCurves(results, fileName):
+    """
+    Renders time and peak memory of every phase against mesh size to an image file.
+    :param results: Output of RunBenchmarkSuite.
+    :param fileName: Image file to write, eg .png or .svg.
+    :return: void
+    """
+    import Plotter as pl
+    phases = [phase for phase in BenchmarkPhases if np.any(results['Phase'] == phase)]
+    meshSizes = results[results['Phase'] == phases[0]]['MeshSize']
+    plotter = pl.Plotter("Benchmark scaling", 1, 2, 2, fileName)
+    plotter.Add1DPlot(1, "Phase time", "Mesh size", "Time (s)", "log", "-x", True)
+    plotter.Add1DPlot(2, "Phase peak memory", "Mesh size", "Peak memory (bytes)", "log", "-x", True)
+    plotter.Update1DPlotData(1, meshSizes, [results[results['Phase'] == phase]['Time'] for phase in phases], phases)
+    plotter.Update1DPlotData(2, meshSizes, [np.maximum(results[results['Phase'] == phase]['PeakMemory'], 1) for phase in phases], phases)
+    plotter.SaveFigure(fileName, False)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Diffusion solver benchmarks.")
+    parser.add_argument("--suite", action="store_true", help="Run the per phase suite instead of the solver ladders.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[33, 65, 129, 257, 513, 1025], help="Mesh sizes of the suite.")
+    parser.add_argument("--solver", default="fast", help="Solver type of the suite.")
+    parser.add_argument("--stretch", type=float, default=1.0, help="Stretch factor of the suite.")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs of each phase, the fastest is reported.")
+    parser.add_argument("--output", default="BenchmarkResults.json", help="JSON file the suite results are written to.")
+    parser.add_argument("--curves", default="BenchmarkScaling.png", help="Image file the scaling curves are written to.")
+    parser.add_argument("--baseline", default=None, help="JSON results of an earlier run to check for regressions against.")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed relative slow down of a phase against the baseline.")
+    arguments = parser.parse_args()
+
+    if not arguments.suite:
+        BenchmarkMeshGeneration([256, 1024, 2048], 1.0)
+        BenchmarkMeshGeneration([256, 1024, 2048], 1.001)
+        BenchmarkMultigrid([33, 64, 129, 256, 513], 1.0, 1.0e-8)
+        BenchmarkMultigrid([33, 64, 129, 256, 513], 1.02, 1.0e-8)
+        BenchmarkWarmStart([17, 33, 65, 129, 257], "cg")
+        BenchmarkWarmStart([17, 33, 65, 129, 257], "multigrid")
+        BenchmarkGradedMesh([1.0e-4, 1.0e-5, 1.0e-6])
+        BenchmarkLocalRefinement([3.0e-5, 1.0e-5, 2.0e-6])
+        BenchmarkDomainDecomposition(513, [(1, 1), (2, 1), (2, 2), (4, 2), (4, 4)])
+        BenchmarkMixedPrecision(513, ["sparse", "cg", "multigrid"], 1.01)
+        sys.exit(0)
+
+    suiteResults = RunBenchmarkSuite(arguments.sizes, arguments.solver, arguments.stretch, repeats=arguments.repeats)
+    WriteBenchmarkJSON(suiteResults, arguments.output, arguments.solver, arguments.stretch)
+    PlotScalingCurves(suiteResults, arguments.curves)
+    print("\nScaling exponents (time ~ nodes^p): " + str(ScalingExponents(suiteResults)))
+    if arguments.baseline is not None:
+        regressions = CompareWithBaseline(suiteResults, ReadBenchmarkJSON(arguments.baseline), arguments.tolerance)
+        for meshSize, phase, quantity, baselineValue, newValue in regressions:
+            print("Regression: " + str(meshSize) + 'x' + str(meshSize) + ' ' + phase + ' ' + quantity + ' ' + str(baselineValue) + ' -> ' + str(newValue))
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,271 @@
+'''
+File Name: DiffusionSolver.py
+Description: Implicit solvers for the heat diffusion equation on a node table.
+Author: Bevan Jones
+Copyright Notice:
+This file is property of the University of Cape Town
+You may download or copy this file for use in your own program.
+You may NOT download or copy this file to another site.
+You may NOT download or copy this file for publication or sale.
+This file is intended for teaching purposes.
+'''
+
+import numpy as np
+import scipy.sparse.linalg as spla
+import Discretisation as dc
+import ErrorAnalysis as ea
+import IterativeSolver as its
+import Multigrid as mgs
+import FactorisationCache as fc
+import FastPoissonSolver as fps
+import Instrumentation as ins
+import DomainDecomposition as dd
+import MixedPrecision as mp
+
+
+def ImplicitDiffusion(nodeTable, thermalConduct, isquiet, solverType="fast", tolerance=1.0e-10, maxIterations=10000, preconditioner="ssor", relaxationFactor=None,
+                      factorisationCache=fc.DefaultCache, initialTable=None, isstoreErrorFields=True, hooks=None, subdomains=None, ismixedPrecision=False):
+    """
+    Solves the heat diffusion equation implicitly.
+    :param nodeTable: The node table for the mesh, with all co-ordinates, volumes and initial conditions computed.
+    :param thermalConduct: The thermal conductivity of the fluid.
+    :param isquiet: When true suppresses all write outs.
+    :param solverType: "fast" uses discrete sine transforms on uniform meshes and falls back to "sparse" on stretched ones,
+                       "dense" factorises the full coefficient matrix, "sparse" assembles a CSR matrix and uses a sparse LU factorisation,
+                       "cg", "sor" and "jacobi" solve matrix free with preconditioned conjugate gradient, red-black SOR or Jacobi,
+                       "multigrid" and "fmg" use geometric multigrid V-cycles, the latter starting with a full multigrid cycle,
+                       "parallel" runs block-Jacobi preconditioned conjugate gradient with one process per subdomain.
+    :param tolerance: Relative residual tolerance for the iterative solvers.
+    :param maxIterations: Iteration (or multigrid cycle) cap for the iterative solvers.
+    :param preconditioner: Preconditioner for "cg", either "ssor", "jacobi" or "none".
+    :param relaxationFactor: Relaxation factor for the iterative solvers, None picks a default.
+    :param factorisationCache: Cache reused by the direct solvers across calls with the same mesh and conductivity, None refactorises every call.
+    :param initialTable: A solved node table, eg from a coarser mesh, whose temperatures are interpolated onto this mesh as the
+                         initial guess of the iterative solvers.
+    :param isstoreErrorFields: When false only nodeTable.ErrorNorms is computed and the analytical and absolute error fields are never allocated.
+    :param hooks: Callables taking (phase name, phase record) run after each phase, see Instrumentation.SolveProfile.
+    :param subdomains: (subdomains in x, subdomains in y) for the "parallel" solver, None uses one subdomain per core.
+    :param ismixedPrecision: When true the factorisation, operator or multigrid hierarchy is held in float32 and iterative refinement against
+                             double precision residuals brings every solver type, the direct ones included, to the residual tolerance.
+                             Not supported by "parallel".
+    :return: A node table with solved temperatures and error at each node, nodeTable.Profile holds the time, bytes and counts of the
+             source, assembly, solve, transfer and error phases.
+    """
+    # Determine number of nodes
+    numberofNodesX = len(nodeTable.TemperatureNP1)
+    numberofNodesY = len(nodeTable.TemperatureNP1[0])
+
+    Profile = ins.SolveProfile(hooks)
+    nodeTable.Profile = Profile
+    if solverType == "fast" and not fps.IsUniformMesh(nodeTable.Coordinate):
+        solverType = "sparse"
+    if solverType not in ["fast", "dense", "sparse", "cg", "sor", "jacobi", "multigrid", "fmg", "parallel"]:
+        print("Critical Error: solver type " + str(solverType) + " is not supported.")
+        exit(1)
+    if ismixedPrecision and solverType == "parallel":
+        print("Critical Error: solver type " + str(solverType) + " is not supported in mixed precision.")
+        exit(1)
+
+    # Build Source Vector, the solution is copied once into the node table through TemperatureNP1 (a view of TemperatureVector).
+    with Profile.Phase("source") as record:
+        SourceVector = np.zeros(dtype=float, shape=(numberofNodesX*numberofNodesY, 1))
+        TemperatureVector = nodeTable.TemperatureVector()
+        SourceVector[:, 0] = dc.ComputeSourceField(nodeTable.Coordinate).ravel(order='F')
+        SourceField = SourceVector[:, 0].reshape((numberofNodesX, numberofNodesY), order='F')
+        record["Rows"] = numberofNodesX*numberofNodesY
+        record["Bytes"] += SourceVector.nbytes
+
+    # Assemble (or fetch) whatever the solver needs, a factorisation, a matrix free operator or a multigrid hierarchy,
+    # the parallel solver assembles each subdomain's operator in its own process. Mixed precision keeps the double precision operator
+    # for the residuals alongside the single precision solver.
+    with Profile.Phase("assembly") as record:
+        record["Rows"] = 0
+        record["Nonzeros"] = 0
+        if ismixedPrecision:
+            Operator = its.DiffusionOperator2D(nodeTable.Coordinate, nodeTable.CellSize, nodeTable.Volume, thermalConduct)
+            Solver = mp.SinglePrecisionSolver(nodeTable, Operator, thermalConduct, solverType, maxIterations, preconditioner, relaxationFactor, factorisationCache)
+            record["CacheHit"] = Solver.IsCacheHit
+            record["Rows"] = Operator.Diagonal.size
+            record["Nonzeros"] = 5*Operator.Diagonal.size
+            record["Bytes"] += Operator.NumberofBytes() + Solver.NumberofBytes()
+        elif solverType in ["dense", "sparse"]:
+            Factorisation, DiffusionMatrix, FactorisationBytes = DirectFactorisation(nodeTable, thermalConduct, solverType, factorisationCache)
+            record["CacheHit"] = DiffusionMatrix is None
+            if DiffusionMatrix is not None:
+                record["Rows"] = DiffusionMatrix.shape[0]
+                record["Nonzeros"] = DiffusionMatrix.nnz
+                record["Bytes"] += DiffusionMatrix.data.nbytes + DiffusionMatrix.indices.nbytes + DiffusionMatrix.indptr.nbytes + FactorisationBytes
+        elif solverType in ["cg", "sor", "jacobi"]:
+            Operator = its.DiffusionOperator2D(nodeTable.Coordinate, nodeTable.CellSize, nodeTable.Volume, thermalConduct)
+            record["Rows"] = Operator.Diagonal.size
+            record["Nonzeros"] = 5*Operator.Diagonal.size
+            record["Bytes"] += Operator.NumberofBytes()
+        elif solverType in ["multigrid", "fmg"]:
+            Hierarchy = mgs.BuildHierarchy(nodeTable.Coordinate, thermalConduct)
+            record["Rows"] = sum(operator.Diagonal.size for operator in Hierarchy.Operator)
+            record["Nonzeros"] = 5*record["Rows"]
+            record["Levels"] = Hierarchy.NumberofLevels()
+            record["Bytes"] += sum(5*operator.Diagonal.nbytes for operator in Hierarchy.Operator)
+
+    # Map a previous solution onto this mesh as the initial guess.
+    InitialGuess = None
+    if initialTable is not None and solverType in ["cg", "sor", "jacobi", "multigrid", "fmg", "parallel"]:
+        with Profile.Phase("transfer") as record:
+            InitialGuess = mgs.InterpolateField(initialTable.Coordinate, initialTable.TemperatureNP1[:, :, 0], nodeTable.Coordinate)
+            record["Bytes"] += InitialGuess.nbytes
+
+    with Profile.Phase("solve") as record:
+        if ismixedPrecision:
+            # Single precision corrections, residuals against the node table in double precision.
+            TemperatureField, nodeTable.ResidualHistory, record["InnerIterations"] = mp.MixedPrecisionSolve(Operator, Solver, SourceField, tolerance,
+                                                                                                           initialGuess=InitialGuess)
+        elif solverType == "fast":
+            # Uniform mesh, diagonalised by sine transforms so no matrix is assembled or factorised.
+            TemperatureField = fps.FastDiffusionSolve(nodeTable.Coordinate, thermalConduct, SourceField)
+            nodeTable.ResidualHistory = []
+        elif solverType in ["dense", "sparse"]:
+            # Solve implicit system Ax = b, only forward and back substitution on a cache hit.
+            TemperatureField = Factorisation.solve(SourceVector[:, 0])
+            nodeTable.ResidualHistory = []
+        elif solverType in ["multigrid", "fmg"]:
+            # Solve without forming a matrix, stopping once the residual tolerance is met.
+            TemperatureField, nodeTable.ResidualHistory = mgs.MultigridDiffusionSolve(nodeTable.Coordinate, thermalConduct, SourceField, tolerance, maxIterations,
+                                                                                      solverType == "fmg", InitialGuess, Hierarchy)
+        elif solverType == "parallel":
+            TemperatureField, nodeTable.ResidualHistory = dd.DomainDecompositionSolve(nodeTable.Coordinate, thermalConduct, SourceField, tolerance, maxIterations,
+                                                                                      subdomains, InitialGuess)
+        else:
+            TemperatureField, nodeTable.ResidualHistory = its.MatrixFreeSolve(nodeTable.Coordinate, nodeTable.CellSize, nodeTable.Volume, thermalConduct, SourceField,
+                                                                              solverType, tolerance, maxIterations, preconditioner, relaxationFactor, InitialGuess,
+                                                                              Operator)
+        record["Bytes"] += TemperatureField.nbytes
+        record["Iterations"] = max(len(nodeTable.ResidualHistory) - 1, 0)
+        if len(nodeTable.ResidualHistory) > 0:
+            record["Residual"] = float(nodeTable.ResidualHistory[-1])
+        if not isquiet and len(nodeTable.ResidualHistory) > 0:
+            print("Iterative solve finished after " + str(len(nodeTable.ResidualHistory) - 1) + " iterations, residual " + str(nodeTable.ResidualHistory[-1]))
+
+    # Copy the solution into the node table in one pass, the direct solvers' vector is viewed as a field rather than the field flattened.
+    with Profile.Phase("transfer") as record:
+        nodeTable.TemperatureNP1[:, :, 0] = TemperatureField.reshape((numberofNodesX, numberofNodesY), order='F')
+        record["Rows"] = record.get("Rows", 0) + TemperatureVector.size
+        record["Bytes"] += TemperatureVector.nbytes
+
+    # Perform error analysis in one streaming pass, filling the error fields only when they are wanted.
+    with Profile.Phase("error") as record:
+        if isstoreErrorFields:
+            nodeTable.ErrorNorms = ea.ComputeErrorNorms(nodeTable.Coordinate, nodeTable.TemperatureNP1, nodeTable.Volume,
+                                                        nodeTable.AbsoluteError[:, :, 0], nodeTable.AnalyticalSolution[:, :, 0])
+            record["Bytes"] += nodeTable.AbsoluteError.nbytes + nodeTable.AnalyticalSolution.nbytes
+        else:
+            nodeTable.ErrorNorms = ea.ComputeErrorNorms(nodeTable.Coordinate, nodeTable.TemperatureNP1, nodeTable.Volume)
+        record["Rows"] = numberofNodesX*numberofNodesY
+        record["MaxError"] = float(nodeTable.ErrorNorms['MaxError'])
+
+    if not isquiet:
+        print("\nSimulation completed")
+    return nodeTable
+
+
+def DirectFactorisation(nodeTable, thermalConduct, solverType, factorisationCache):
+    """
+    Reuses the factorisation of an identical mesh and conductivity, otherwise assembles and factorises the implicit system.
+    :param nodeTable: The node table for the mesh.
+    :param thermalConduct: The thermal conductivity.
+    :param solverType: "dense" or "sparse".
+    :param factorisationCache: A FactorisationCache, or None to always factorise.
+    :return: factorisation, the assembled matrix (None on a cache hit), bytes held by the factorisation
+    """
+    CacheKey = fc.MeshSignature(nodeTable.Coordinate, thermalConduct, solverType)
+    Factorisation = factorisationCache.Get(CacheKey) if factorisationCache is not None else None
+    if Factorisation is not None:
+        return Factorisation, None, factorisationCache.Entries[CacheKey][1]
+
+    DiffusionMatrix = -dc.Diffusion2DSparseMatrix(nodeTable.Coordinate, nodeTable.CellSize, nodeTable.Volume, thermalConduct)
+    if solverType == "dense":
+        Factorisation = fc.DenseLUFactorisation(DiffusionMatrix.toarray())
+        FactorisationBytes = Factorisation.NumberofBytes()
+    else:
+        Factorisation = spla.splu(DiffusionMatrix.tocsc())
+        FactorisationBytes = fc.SparseLUNumberofBytes(Factorisation)
+    if factorisationCache is not None:
+        factorisationCache.Put(CacheKey, Factorisation, FactorisationBytes)
+    return Factorisation, DiffusionMatrix, FactorisationBytes
+
+
+def ImplicitDiffusionBatch(nodeTable, thermalConducts, sources=None, solverType="fast", tolerance=1.0e-10, maxIterations=10000, preconditioner="ssor",
+                           relaxationFactor=None, factorisationCache=fc.DefaultCache, isstoreErrorFields=True, subdomains=None):
+    """
+    Solves many cases on one mesh, assembling once per distinct conductivity and solving all of its right hand sides together.
+    :param nodeTable: The node table for the mesh, it is not modified.
+    :param thermalConducts: Conductivity of each case, or one conductivity for every case.
+    :param sources: Source field of each case, shape (number of cases, nx, ny), or one field of shape (nx, ny) for every case,
+                    None uses the source of ImplicitDiffusion. Boundary values follow the implicit system, -T = source.
+    :param solverType: As ImplicitDiffusion, "fast", "dense" and "sparse" solve every right hand side of a conductivity in one call,
+                       the iterative solvers reuse one operator (or multigrid hierarchy) per conductivity and solve the cases in turn,
+                       "parallel" runs one domain decomposition solve per case.
+    :param tolerance: Relative residual tolerance for the iterative solvers.
+    :param maxIterations: Iteration (or multigrid cycle) cap for the iterative solvers.
+    :param preconditioner: Preconditioner for "cg", either "ssor", "jacobi" or "none".
+    :param relaxationFactor: Relaxation factor for the iterative solvers, None picks a default.
+    :param factorisationCache: Cache reused by the direct solvers, None refactorises every call.
+    :param isstoreErrorFields: When false no absolute error fields are returned, only their norms.
+    :param subdomains: (subdomains in x, subdomains in y) for the "parallel" solver, None uses one subdomain per core.
+    :return: temperatures and absolute errors of shape (number of cases, nx, ny) (errors None when not stored),
+             error norms of each case as an array of ErrorAnalysis.ErrorNormType
+    """
+    # Determine number of nodes and cases, a single conductivity or source applies to every case.
+    numberofNodesX = len(nodeTable.TemperatureNP1)
+    numberofNodesY = len(nodeTable.TemperatureNP1[0])
+    thermalConducts = np.atleast_1d(np.asarray(thermalConducts, dtype=float))
+    if sources is None:
+        sources = dc.ComputeSourceField(nodeTable.Coordinate)
+    sources = np.asarray(sources, dtype=float)
+    if sources.ndim == 2:
+        sources = sources[np.newaxis]
+    numberofCases = max(len(thermalConducts), len(sources))
+    if len(thermalConducts) not in [1, numberofCases] or len(sources) not in [1, numberofCases] or sources.shape[1:] != (numberofNodesX, numberofNodesY):
+        print("Critical Error: " + str(len(thermalConducts)) + " conductivities and source shape " + str(sources.shape) + " do not match the mesh and each other.")
+        exit(1)
+    thermalConducts = np.broadcast_to(thermalConducts, (numberofCases,))
+    sources = np.broadcast_to(sources, (numberofCases, numberofNodesX, numberofNodesY))
+
+    if solverType == "fast" and not fps.IsUniformMesh(nodeTable.Coordinate):
+        solverType = "sparse"
+    if solverType not in ["fast", "dense", "sparse", "cg", "sor", "jacobi", "multigrid", "fmg", "parallel"]:
+        print("Critical Error: solver type " + str(solverType) + " is not supported.")
+        exit(1)
+
+    temperatures = np.empty((numberofCases, numberofNodesX, numberofNodesY))
+    for thermalConduct in np.unique(thermalConducts):
+        cases = np.flatnonzero(thermalConducts == thermalConduct)
+        if solverType == "fast":
+            temperatures[cases] = fps.FastDiffusionSolve(nodeTable.Coordinate, thermalConduct, sources[cases])
+        elif solverType in ["dense", "sparse"]:
+            # One column per case in matrix order (x fastest).
+            Factorisation = DirectFactorisation(nodeTable, thermalConduct, solverType, factorisationCache)[0]
+            SourceMatrix = sources[cases].transpose(0, 2, 1).reshape(len(cases), -1).T
+            temperatures[cases] = Factorisation.solve(np.ascontiguousarray(SourceMatrix)).T.reshape(len(cases), numberofNodesY, numberofNodesX).transpose(0, 2, 1)
+        elif solverType in ["multigrid", "fmg"]:
+            Hierarchy = mgs.BuildHierarchy(nodeTable.Coordinate, thermalConduct)
+            for icase in cases:
+                temperatures[icase] = mgs.MultigridDiffusionSolve(nodeTable.Coordinate, thermalConduct, sources[icase], tolerance, maxIterations,
+                                                                  solverType == "fmg", hierarchy=Hierarchy)[0]
+        elif solverType == "parallel":
+            # Each subdomain's operator is assembled in its worker process, there is nothing to share between cases.
+            for icase in cases:
+                temperatures[icase] = dd.DomainDecompositionSolve(nodeTable.Coordinate, thermalConduct, sources[icase], tolerance, maxIterations,
+                                                                  subdomains)[0]
+        else:
+            Operator = its.DiffusionOperator2D(nodeTable.Coordinate, nodeTable.CellSize, nodeTable.Volume, thermalConduct)
+            for icase in cases:
+                temperatures[icase] = its.MatrixFreeSolve(nodeTable.Coordinate, nodeTable.CellSize, nodeTable.Volume, thermalConduct, sources[icase],
+                                                          solverType, tolerance, maxIterations, preconditioner, relaxationFactor, operator=Operator)[0]
+
+    # Error analysis of every case against the analytical solution.
+    absoluteErrors = np.empty((numberofCases, numberofNodesX, numberofNodesY)) if isstoreErrorFields else None
+    errorNorms = np.zeros(numberofCases, dtype=ea.ErrorNormType)
+    for icase in range(numberofCases):
+        errorNorms[icase] = ea.ComputeErrorNorms(nodeTable.Coordinate, temperatures[icase], nodeTable.Volume,
+                                                 absoluteErrors[icase] if isstoreErrorFields else None)
+    return temperatures, absoluteErrors, errorNorms
@@ -11,23 +11,114 @@ You may NOT download or copy this file for publication or sale.
 '''
 
 import numpy as np
+import scipy.sparse as sp
 
 def GetMatrixIndex(imeshColumn, imeshRow, numberNodesX):
-    matrixIndex = 0
-# code here...
+    matrixIndex = imeshColumn + imeshRow*numberNodesX
     return matrixIndex
 
+def Diffusion2DStencil(nodeCoordinate, nodeCellSize, nodeVolume, viscocity):
+    """
+    Computes the five point implicit diffusion stencil for every node of the mesh in one pass.
+    Each coefficient array has shape (nx, ny); ravel with order='F' to get matrix (GetMatrixIndex) ordering.
+    Dirichlet boundary nodes have a unit centre coefficient and no neighbours.
+    :param nodeCoordinate: Nodal co-ordinates, shape (nx, ny, 2).
+    :param nodeCellSize: Nodal cell sizes, shape (nx, ny, 2).
+    :param nodeVolume: Nodal control volumes, shape (nx, ny, 1).
+    :param viscocity: The diffusion coefficient.
+    :return: coeffCentre, coeffWest, coeffEast, coeffSouth, coeffNorth, isBoundary
+    """
+    numberNodesX = len(nodeCoordinate)
+    numberNodesY = len(nodeCoordinate[0])
+    coeffCentre = np.ones((numberNodesX, numberNodesY))
+    coeffWest = np.zeros((numberNodesX, numberNodesY))
+    coeffEast = np.zeros((numberNodesX, numberNodesY))
+    coeffSouth = np.zeros((numberNodesX, numberNodesY))
+    coeffNorth = np.zeros((numberNodesX, numberNodesY))
+    isBoundary = np.ones((numberNodesX, numberNodesY), dtype=bool)
+    isBoundary[1:-1, 1:-1] = False
+
+    # Face fluxes divided by the control volume, interior nodes only, always in double precision.
+    nodeCellSize = np.asarray(nodeCellSize, dtype=float)
+    coorX = np.asarray(nodeCoordinate[:, :, 0], dtype=float)
+    coorY = np.asarray(nodeCoordinate[:, :, 1], dtype=float)
+    volume = np.asarray(nodeVolume[1:-1, 1:-1, 0], dtype=float)
+    coeffWest[1:-1, 1:-1] = viscocity*nodeCellSize[1:-1, 1:-1, 1]/(coorX[1:-1, 1:-1] - coorX[:-2, 1:-1])/volume
+    coeffEast[1:-1, 1:-1] = viscocity*nodeCellSize[1:-1, 1:-1, 1]/(coorX[2:, 1:-1] - coorX[1:-1, 1:-1])/volume
+    coeffSouth[1:-1, 1:-1] = viscocity*nodeCellSize[1:-1, 1:-1, 0]/(coorY[1:-1, 1:-1] - coorY[1:-1, :-2])/volume
+    coeffNorth[1:-1, 1:-1] = viscocity*nodeCellSize[1:-1, 1:-1, 0]/(coorY[1:-1, 2:] - coorY[1:-1, 1:-1])/volume
+    coeffCentre[1:-1, 1:-1] = -(coeffWest[1:-1, 1:-1] + coeffEast[1:-1, 1:-1] + coeffSouth[1:-1, 1:-1] + coeffNorth[1:-1, 1:-1])
+    return coeffCentre, coeffWest, coeffEast, coeffSouth, coeffNorth, isBoundary
+
 def Diffusion2DRow(nodeCoordinate, nodeCellSize, nodeVolume, viscocity, inode):
 
     numberNodesX = len(nodeCoordinate)
     numberNodesY = len(nodeCoordinate[0])
     diffusionRow = np.zeros(numberNodesX*numberNodesY)
-# code here...
+    icolu = inode % numberNodesX
+    irow = inode // numberNodesX
+
+    # Compatibility wrapper, prefer Diffusion2DStencil when assembling the whole mesh.
+    coeffCentre, coeffWest, coeffEast, coeffSouth, coeffNorth, isBoundary = Diffusion2DStencil(nodeCoordinate, nodeCellSize, nodeVolume, viscocity)
+    diffusionRow[inode] = coeffCentre[icolu][irow]
+    if not isBoundary[icolu][irow]:
+        diffusionRow[GetMatrixIndex(icolu - 1, irow, numberNodesX)] = coeffWest[icolu][irow]
+        diffusionRow[GetMatrixIndex(icolu + 1, irow, numberNodesX)] = coeffEast[icolu][irow]
+        diffusionRow[GetMatrixIndex(icolu, irow - 1, numberNodesX)] = coeffSouth[icolu][irow]
+        diffusionRow[GetMatrixIndex(icolu, irow + 1, numberNodesX)] = coeffNorth[icolu][irow]
     return diffusionRow
 
+def Diffusion2DSparseMatrix(nodeCoordinate, nodeCellSize, nodeVolume, viscocity):
+    """
+    Assembles the implicit diffusion operator for the whole mesh in sparse (CSR) form.
+    Row inode is identical to Diffusion2DRow(..., inode), but only the five stencil entries are stored.
+    :param nodeCoordinate: Nodal co-ordinates, shape (nx, ny, 2).
+    :param nodeCellSize: Nodal cell sizes, shape (nx, ny, 2).
+    :param nodeVolume: Nodal control volumes, shape (nx, ny, 1).
+    :param viscocity: The diffusion coefficient.
+    :return: A scipy.sparse CSR matrix of shape (nx*ny, nx*ny).
+    """
+    numberNodesX = len(nodeCoordinate)
+    numberNodesY = len(nodeCoordinate[0])
+    coeffCentre, coeffWest, coeffEast, coeffSouth, coeffNorth, isBoundary = Diffusion2DStencil(nodeCoordinate, nodeCellSize, nodeVolume, viscocity)
+
+    # The DIA format stores A[k, k + offset] in column k + offset of that diagonal.
+    diagonals = np.zeros((5, numberNodesX*numberNodesY))
+    diagonals[0] = coeffCentre.ravel(order='F')
+    diagonals[1, :-1] = coeffWest.ravel(order='F')[1:]
+    diagonals[2, 1:] = coeffEast.ravel(order='F')[:-1]
+    diagonals[3, :-numberNodesX] = coeffSouth.ravel(order='F')[numberNodesX:]
+    diagonals[4, numberNodesX:] = coeffNorth.ravel(order='F')[:-numberNodesX]
+    offsets = [0, -1, 1, -numberNodesX, numberNodesX]
+    return sp.dia_matrix((diagonals, offsets), shape=(numberNodesX*numberNodesY, numberNodesX*numberNodesY)).tocsr()
+
 def ComputeSource(nodeCoordinate, inode):
 
     source = 0.0
-# code here...
+    numberNodesX = len(nodeCoordinate)
+    numberNodesY = len(nodeCoordinate[0])
+    icolu = inode % numberNodesX
+    irow = inode // numberNodesX
+
+    # No source on the Dirichlet boundary.
+    if icolu == 0 or icolu == numberNodesX - 1 or irow == 0 or irow == numberNodesY - 1:
+        return source
+
+    source = SourceFunction(nodeCoordinate[icolu][irow][0], nodeCoordinate[icolu][irow][1])
     return source
 
+def ComputeSourceField(nodeCoordinate):
+    """
+    Evaluates ComputeSource for every node of the mesh in one pass.
+    :param nodeCoordinate: Nodal co-ordinates, shape (nx, ny, 2).
+    :return: Source field of shape (nx, ny), ravel with order='F' for the source vector.
+    """
+    sourceField = np.zeros(nodeCoordinate.shape[:2])
+    sourceField[1:-1, 1:-1] = SourceFunction(nodeCoordinate[1:-1, 1:-1, 0], nodeCoordinate[1:-1, 1:-1, 1])
+    return sourceField
+
+def SourceFunction(x, y):
+    """
+    Source term at a point, works element wise on arrays.
+    """
+    return 4.0*((2.0 - 12.0*x**2)*(y**2 - y**4) + (x**2 - x**4)*(2.0 - 12.0*y**2))
@@ -0,0 +1,234 @@
+'''
+File Name: DomainDecomposition.py
+Description: Parallel block-Jacobi preconditioned conjugate gradient over rectangular subdomains in shared memory.
+Author: Bevan Jones
+Copyright Notice:
+This file is property of the University of Cape Town
+You may download or copy this file for use in your own program.
+You may NOT download or copy this file to another site.
+You may NOT download or copy this file for publication or sale.
+This file is intended for teaching purposes.
+'''
+
+import os
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import scipy.sparse.linalg as spla
+import MeshGenerator as mg
+import IterativeSolver as its
+
+# Barrier of the solve a worker process belongs to, inherited through the pool initialiser.
+WorkerBarrier = None
+
+# Columns of the shared partial sums, one row per subdomain.
+PartialDirectionProduct = 0
+PartialResidualSquare = 1
+PartialResidualProduct = 2
+PartialReferenceSquare = 3
+
+
+def SetWorkerBarrier(barrier):
+
+    global WorkerBarrier
+    WorkerBarrier = barrier
+
+
+def SplitLine(numberofNodes, numberofParts):
+    """
+    Splits the interior nodes of a line into contiguous, nearly equal ranges.
+    :param numberofNodes: Number of nodes on the line, boundary nodes included.
+    :param numberofParts: Number of ranges.
+    :return: List of (start, stop) node indices.
+    """
+    edges = np.round(np.linspace(1, numberofNodes - 1, numberofParts + 1)).astype(int)
+    return [(int(start), int(stop)) for start, stop in zip(edges[:-1], edges[1:])]
+
+
+def ChooseSubdomains(numberofNodesX, numberofNodesY, numberofWorkers):
+    """
+    Factors the number of workers into a grid of subdomains whose blocks are as close to square as possible.
+    :param numberofNodesX: Number of nodes in x.
+    :param numberofNodesY: Number of nodes in y.
+    :param numberofWorkers: Number of subdomains wanted.
+    :return: (subdomains in x, subdomains in y)
+    """
+    numberofWorkers = max(1, min(numberofWorkers, (numberofNodesX - 2)*(numberofNodesY - 2)))
+    layouts = [(parts, numberofWorkers//parts) for parts in range(1, numberofWorkers + 1) if numberofWorkers % parts == 0
+               and parts <= numberofNodesX - 2 and numberofWorkers//parts <= numberofNodesY - 2]
+    if not layouts:
+        return 1, 1
+    return min(layouts, key=lambda layout: abs(np.log((numberofNodesX/layout[0])/(numberofNodesY/layout[1]))))
+
+
+def CreateSharedBlock(shape):
+    """
+    Allocates a shared memory block for a float64 array, free it with CloseSharedBlock and unlink once done.
+    :param shape: Shape of the array.
+    :return: The shared memory block, view it with SharedArray.
+    """
+    block = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape))*8, 1))
+    SharedArray(block, shape)[...] = 0.0
+    return block
+
+
+def SharedArray(block, shape):
+
+    return np.ndarray(shape, dtype=float, buffer=block.buf)
+
+
+def CloseSharedBlock(block):
+
+    # Arrays still held (eg by a traceback) keep the mapping alive until the process ends.
+    try:
+        block.close()
+    except BufferError:
+        pass
+
+
+def SubdomainConjugateGradient(isubdomain, columns, rows, coordinateX, coordinateY, viscocity, sharedNames, numberofSubdomains, tolerance, maxIterations):
+    """
+    Runs one subdomain's share of the parallel conjugate gradient solve, every subdomain of the solve must run at once.
+    :param isubdomain: Index of this subdomain, its row of the shared partial sums.
+    :param columns: (start, stop) of the owned nodes in x.
+    :param rows: (start, stop) of the owned nodes in y.
+    :param coordinateX: Node positions of the whole mesh in x.
+    :param coordinateY: Node positions of the whole mesh in y.
+    :param viscocity: The diffusion coefficient.
+    :param sharedNames: Shared memory names of the phi, rhs, direction and partial sum arrays.
+    :param numberofSubdomains: Number of subdomains taking part.
+    :param tolerance: Relative residual tolerance, as ConjugateGradient.
+    :param maxIterations: Maximum number of iterations.
+    :return: Residual history of the whole mesh (identical on every subdomain).
+    """
+    shape = (len(coordinateX), len(coordinateY))
+    blocks = [shared_memory.SharedMemory(name=name) for name in sharedNames]
+    try:
+        fields = [SharedArray(block, arrayShape) for block, arrayShape in zip(blocks, [shape, shape, shape, (numberofSubdomains, 4)])]
+        return SubdomainIterations(isubdomain, columns, rows, coordinateX, coordinateY, viscocity, fields, tolerance, maxIterations)
+    except Exception:
+        # Release the other subdomains rather than leave them waiting on this one.
+        WorkerBarrier.abort()
+        raise
+    finally:
+        fields = None
+        for block in blocks:
+            CloseSharedBlock(block)
+
+
+def SubdomainIterations(isubdomain, columns, rows, coordinateX, coordinateY, viscocity, fields, tolerance, maxIterations):
+    """
+    Block-Jacobi preconditioned conjugate gradient iterations of one subdomain. The subdomain owns a block of interior nodes and
+    reads a one node halo of its neighbours' values from the shared fields, the preconditioner is an exact (sparse LU) solve on the block.
+    Barriers separate writing the direction from reading its halo and writing each partial sum from reading them all.
+    """
+    phi, rhs, direction, partials = fields
+    shape = phi.shape
+
+    # Operator of the block with a one node halo, its boundary ring is the neighbours' (or the mesh's) nodes.
+    patch = (slice(columns[0] - 1, columns[1] + 1), slice(rows[0] - 1, rows[1] + 1))
+    owned = (slice(columns[0], columns[1]), slice(rows[0], rows[1]))
+    patchTable = mg.GenerateMesh2DMeshFromLines(coordinateX, coordinateY, (columns[0] - 1, columns[1] + 1, rows[0] - 1, rows[1] + 1))
+    operator = its.DiffusionOperator2D(patchTable.Coordinate, patchTable.CellSize, patchTable.Volume, viscocity)
+    factorisation = spla.splu(operator.InteriorMatrix().tocsc())
+    ownedShape = operator.Diagonal.shape
+
+    def Precondition(residual):
+        return factorisation.solve(residual.ravel(order='F')).reshape(ownedShape, order='F')
+
+    # Residual of the starting guess, and of the guess with only the mesh boundary values for the reference norm.
+    patchColumns = np.arange(columns[0] - 1, columns[1] + 1)
+    patchRows = np.arange(rows[0] - 1, rows[1] + 1)
+    isMeshBoundary = ((patchColumns == 0) | (patchColumns == shape[0] - 1))[:, np.newaxis] | ((patchRows == 0) | (patchRows == shape[1] - 1))[np.newaxis, :]
+    residual = rhs[owned] - operator.Diagonal*phi[owned] + operator.NeighbourSum(phi[patch])
+    precond = Precondition(residual)
+    direction[owned] = precond
+    partials[isubdomain] = [0.0, np.vdot(residual, residual), np.vdot(residual, precond),
+                            np.sum(np.square(rhs[owned] + operator.NeighbourSum(np.where(isMeshBoundary, phi[patch], 0.0))))]
+    WorkerBarrier.wait()
+    residualSquare, rz, referenceSquare = np.sum(partials[:, PartialResidualSquare:], axis=0)
+    referenceNorm = np.sqrt(referenceSquare) if referenceSquare > 0.0 else 1.0
+    residualHistory = [np.sqrt(residualSquare)]
+
+    for iiter in range(maxIterations):
+        if residualHistory[-1] <= tolerance*referenceNorm:
+            break
+
+        # Every direction block is written, read the halo and form A p on the owned nodes.
+        WorkerBarrier.wait()
+        operatorDirection = operator.Diagonal*direction[owned] - operator.NeighbourSum(direction[patch])
+        partials[isubdomain, PartialDirectionProduct] = np.vdot(direction[owned], operatorDirection)
+        WorkerBarrier.wait()
+        alpha = rz/np.sum(partials[:, PartialDirectionProduct])
+        phi[owned] += alpha*direction[owned]
+        residual -= alpha*operatorDirection
+
+        precond = Precondition(residual)
+        partials[isubdomain, PartialResidualSquare] = np.vdot(residual, residual)
+        partials[isubdomain, PartialResidualProduct] = np.vdot(residual, precond)
+        WorkerBarrier.wait()
+        residualSquare, rzNew = np.sum(partials[:, PartialResidualSquare:PartialResidualProduct + 1], axis=0)
+        residualHistory.append(np.sqrt(residualSquare))
+
+        direction[owned] *= rzNew/rz
+        direction[owned] += precond
+        rz = rzNew
+    return residualHistory
+
+
+def DomainDecompositionSolve(nodeCoordinate, viscocity, source, tolerance, maxIterations, subdomains=None, initialGuess=None):
+    """
+    Solves the implicit diffusion system with block-Jacobi preconditioned conjugate gradient, one worker process per subdomain.
+    The fields live in shared memory so workers exchange halos by reading their neighbours' nodes, nothing is copied between processes.
+    :param nodeCoordinate: Nodal co-ordinates of a structured mesh, shape (nx, ny, 2).
+    :param viscocity: The diffusion coefficient.
+    :param source: Source field of shape (nx, ny), the same values as the implicit system's source vector.
+    :param tolerance: Relative residual tolerance.
+    :param maxIterations: Iteration cap.
+    :param subdomains: (subdomains in x, subdomains in y), None uses one subdomain per core, at most one subdomain per interior node line.
+    :param initialGuess: Optional field of shape (nx, ny) to start from, only interior values are used.
+    :return: Temperature field of shape (nx, ny), residual history
+    """
+    coordinateX = np.asarray(nodeCoordinate[:, 0, 0], dtype=float)
+    coordinateY = np.asarray(nodeCoordinate[0, :, 1], dtype=float)
+    shape = (len(coordinateX), len(coordinateY))
+    if subdomains is None:
+        subdomains = ChooseSubdomains(shape[0], shape[1], os.cpu_count() or 1)
+    else:
+        # More parts than interior nodes would leave subdomains without nodes.
+        subdomains = (max(1, min(subdomains[0], shape[0] - 2)), max(1, min(subdomains[1], shape[1] - 2)))
+    layout = [(columns, rows) for rows in SplitLine(shape[1], subdomains[1]) for columns in SplitLine(shape[0], subdomains[0])]
+
+    # Boundary rows of the implicit system read -T = source, interior rows are volume scaled.
+    phi = -np.asarray(source, dtype=float)
+    if shape[0] < 3 or shape[1] < 3:
+        return phi, [0.0]
+    phi[1:-1, 1:-1] = 0.0 if initialGuess is None else initialGuess[1:-1, 1:-1]
+    volume = mg.ComputeCellSizeLine(coordinateX)[1:-1, np.newaxis]*mg.ComputeCellSizeLine(coordinateY)[np.newaxis, 1:-1]
+
+    blocks = [CreateSharedBlock(arrayShape) for arrayShape in [shape, shape, shape, (len(layout), 4)]]
+    try:
+        SharedArray(blocks[0], shape)[...] = phi
+        SharedArray(blocks[1], shape)[1:-1, 1:-1] = source[1:-1, 1:-1]*volume
+
+        # Fork where available so the barrier is inherited, otherwise share it through a manager.
+        isfork = "fork" in multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if isfork else None)
+        manager = None if isfork else context.Manager()
+        barrier = context.Barrier(len(layout)) if isfork else manager.Barrier(len(layout))
+        try:
+            with ProcessPoolExecutor(max_workers=len(layout), mp_context=context, initializer=SetWorkerBarrier, initargs=(barrier,)) as executor:
+                futures = [executor.submit(SubdomainConjugateGradient, isubdomain, columns, rows, coordinateX, coordinateY, viscocity,
+                                           [block.name for block in blocks], len(layout), tolerance, maxIterations)
+                           for isubdomain, (columns, rows) in enumerate(layout)]
+                residualHistory = [future.result() for future in futures][0]
+        finally:
+            if manager is not None:
+                manager.shutdown()
+        phi[...] = SharedArray(blocks[0], shape)
+    finally:
+        for block in blocks:
+            CloseSharedBlock(block)
+            block.unlink()
+    return phi, residualHistory
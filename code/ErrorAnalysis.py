@@ -12,21 +12,103 @@ This file is intended for teaching purposes.
 
 import numpy as np
 
+# Error norms of one solution, see ComputeErrorNorms.
+ErrorNormType = np.dtype([('MaxError', float), ('L1Error', float), ('L2Error', float), ('RMSError', float),
+                          ('MaxErrorColumn', int), ('MaxErrorRow', int), ('MaxErrorX', float), ('MaxErrorY', float)])
+
+# Default size of the temporaries of one chunk of rows.
+ErrorChunkBytes = 4*1024**2
+
 def AnalyicalSolution2D(coordinate):
 
     AnalyticalTemperature = 0.0
-# code here...
+    x = coordinate[0]
+    y = coordinate[1]
+    AnalyticalTemperature = -(x**2 - x**4)*(y**2 - y**4)
     return AnalyticalTemperature
 
+def AnalyicalSolution2DField(nodeCoordinate):
+    """
+    Evaluates AnalyicalSolution2D for every node of the mesh in one pass.
+    :param nodeCoordinate: Nodal co-ordinates, shape (nx, ny, 2).
+    :return: Analytical temperature field of shape (nx, ny).
+    """
+    return AnalyicalSolution2D(np.moveaxis(nodeCoordinate, -1, 0))
+
 def ComputeAbsoluteError(numericalNode, analyticalNode):
 
     absoluteError = 0.0
-# code here...
+    absoluteError = abs(numericalNode - analyticalNode)
     return absoluteError
 
+def ComputeIntegralL2Error(absoluteError, nodeVolume):
+    """
+    Volume weighted L2 norm of the error over the unit square.
+    :param absoluteError: Absolute error at each node, shape (nx, ny) or (nx, ny, 1).
+    :param nodeVolume: Nodal control volumes with the same shape.
+    :return: sqrt(sum(error^2 * volume))
+    """
+    return np.sqrt(np.sum(np.square(absoluteError, dtype=float)*nodeVolume))
+
 def ComputeErrorL2Norm(maxMeshError, numberofNodes):
 
     l2Norm = 0.0
-# code here...
+
+    # Least squares fit of log(error) against log(nodes), the slope is the order of accuracy.
+    logError = np.log(np.asarray(maxMeshError, dtype=float))
+    logNodes = np.log(np.asarray(numberofNodes, dtype=float))
+    if len(logError) > 1:
+        l2Norm = -np.polyfit(logNodes, logError, 1)[0]
     return l2Norm
 
+
+def ComputeErrorNorms(nodeCoordinate, temperature, nodeVolume, absoluteError=None, analyticalSolution=None, rowsPerChunk=None):
+    """
+    Maximum, L1, L2 and RMS error against the analytical solution in a single pass over chunks of mesh rows,
+    so no full error field is allocated. Works on in memory and memory mapped node table fields alike.
+    :param nodeCoordinate: Nodal co-ordinates, shape (nx, ny, 2).
+    :param temperature: Numerical temperature, shape (nx, ny) or (nx, ny, 1).
+    :param nodeVolume: Nodal control volumes, shape (nx, ny) or (nx, ny, 1).
+    :param absoluteError: Optional array of shape (nx, ny) the absolute error is written into, eg nodeTable.AbsoluteError[:, :, 0].
+    :param analyticalSolution: Optional array of shape (nx, ny) the analytical solution is written into.
+    :param rowsPerChunk: Mesh rows (constant y) per chunk, None sizes chunks from ErrorChunkBytes.
+    :return: A record of ErrorNormType, L1 and L2 are volume weighted, RMS is over nodes.
+    """
+    numberofNodesX = len(nodeCoordinate)
+    numberofNodesY = len(nodeCoordinate[0])
+    if rowsPerChunk is None:
+        rowsPerChunk = max(1, ErrorChunkBytes//(8*8*numberofNodesX))
+
+    norms = np.zeros((), dtype=ErrorNormType)
+    sumAbsolute = 0.0
+    sumSquare = 0.0
+    sumSquareVolume = 0.0
+    maxError = -1.0
+    for rowStart in range(0, numberofNodesY, rowsPerChunk):
+        rows = slice(rowStart, min(rowStart + rowsPerChunk, numberofNodesY))
+        coordinate = np.asarray(nodeCoordinate[:, rows], dtype=float)
+        analytical = AnalyicalSolution2DField(coordinate)
+        error = ComputeAbsoluteError(np.asarray(temperature[:, rows], dtype=float).reshape(analytical.shape), analytical)
+        volume = np.asarray(nodeVolume[:, rows], dtype=float).reshape(analytical.shape)
+
+        sumAbsolute += np.sum(error*volume)
+        sumSquare += np.sum(np.square(error))
+        sumSquareVolume += np.sum(np.square(error)*volume)
+        ichunkMax = np.argmax(error)
+        if error.flat[ichunkMax] > maxError:
+            icolumn, irow = np.unravel_index(ichunkMax, error.shape)
+            maxError = error[icolumn, irow]
+            norms['MaxErrorColumn'] = icolumn
+            norms['MaxErrorRow'] = rowStart + irow
+            norms['MaxErrorX'], norms['MaxErrorY'] = coordinate[icolumn, irow]
+
+        if absoluteError is not None:
+            absoluteError[:, rows] = error
+        if analyticalSolution is not None:
+            analyticalSolution[:, rows] = analytical
+
+    norms['MaxError'] = maxError
+    norms['L1Error'] = sumAbsolute
+    norms['L2Error'] = np.sqrt(sumSquareVolume)
+    norms['RMSError'] = np.sqrt(sumSquare/(numberofNodesX*numberofNodesY))
+    return norms
@@ -0,0 +1,111 @@
+'''
+File Name: FactorisationCache.py
+Description: Least recently used cache of direct solver factorisations, keyed by mesh and conductivity.
+Author: Bevan Jones
+Copyright Notice:
+This file is property of the University of Cape Town
+You may download or copy this file for use in your own program.
+You may NOT download or copy this file to another site.
+You may NOT download or copy this file for publication or sale.
+This file is intended for teaching purposes.
+'''
+
+import hashlib
+from collections import OrderedDict
+import numpy as np
+import scipy.linalg as sla
+
+
+def MeshSignature(nodeCoordinate, thermalConduct, solverType):
+    """
+    Key identifying a factorisation. Meshes are tensor products, so the node lines in x and y fix every
+    spacing and stretch parameter (and with them the cell sizes and volumes).
+    :param nodeCoordinate: Nodal co-ordinates, shape (nx, ny, 2).
+    :param thermalConduct: The thermal conductivity.
+    :param solverType: The solver the factorisation belongs to.
+    :return: A hashable key.
+    """
+    digest = hashlib.sha1()
+    digest.update(np.ascontiguousarray(nodeCoordinate[:, 0, 0]).tobytes())
+    digest.update(np.ascontiguousarray(nodeCoordinate[0, :, 1]).tobytes())
+    return (len(nodeCoordinate), len(nodeCoordinate[0]), digest.hexdigest(), float(thermalConduct), solverType)
+
+
+class FactorisationCache:
+    def __init__(self, memoryBudget):
+        """
+        Keeps factorisations until their total size exceeds memoryBudget, then evicts the least recently used.
+        :param memoryBudget: Maximum number of bytes held by cached factorisations.
+        """
+        self.MemoryBudget = memoryBudget
+        self.MemoryUsed = 0
+        self.Hits = 0
+        self.Misses = 0
+        self.Evictions = 0
+        self.Entries = OrderedDict()
+
+    def Get(self, key):
+        """
+        Looks up a factorisation and marks it as most recently used.
+        :param key: See MeshSignature.
+        :return: The factorisation, or None on a miss.
+        """
+        if key in self.Entries:
+            self.Hits += 1
+            self.Entries.move_to_end(key)
+            return self.Entries[key][0]
+        self.Misses += 1
+        return None
+
+    def Put(self, key, factorisation, nbytes):
+        """
+        Stores a factorisation, evicting old entries to stay within budget.
+        Factorisations larger than the whole budget are not stored.
+        :param key: See MeshSignature.
+        :param factorisation: Any object with a solve method.
+        :param nbytes: Memory held by the factorisation.
+        :return: void
+        """
+        if key in self.Entries:
+            self.MemoryUsed -= self.Entries.pop(key)[1]
+        if nbytes > self.MemoryBudget:
+            return
+        while self.MemoryUsed + nbytes > self.MemoryBudget:
+            evictedKey, (evicted, evictedBytes) = self.Entries.popitem(last=False)
+            self.MemoryUsed -= evictedBytes
+            self.Evictions += 1
+        self.Entries[key] = (factorisation, nbytes)
+        self.MemoryUsed += nbytes
+
+    def Clear(self):
+
+        self.Entries.clear()
+        self.MemoryUsed = 0
+
+
+class DenseLUFactorisation:
+    def __init__(self, matrix):
+        """
+        Dense LU factorisation with the same solve interface as scipy's sparse SuperLU object.
+        :param matrix: Square numpy array.
+        """
+        self.LU, self.Pivots = sla.lu_factor(matrix)
+
+    def solve(self, rhs):
+
+        return sla.lu_solve((self.LU, self.Pivots), rhs)
+
+    def NumberofBytes(self):
+
+        return self.LU.nbytes + self.Pivots.nbytes
+
+
+def SparseLUNumberofBytes(factorisation):
+    """
+    Memory held by a scipy SuperLU factorisation, values and indices of L and U plus the permutations.
+    """
+    return (factorisation.L.dtype.itemsize + 4)*(factorisation.L.nnz + factorisation.U.nnz) + factorisation.perm_r.nbytes + factorisation.perm_c.nbytes
+
+
+# Shared by every ImplicitDiffusion call unless a cache is passed in.
+DefaultCache = FactorisationCache(512*1024**2)
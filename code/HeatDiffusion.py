@@ -0,0 +1,137 @@
+'''
+File Name: HeatDiffusion.py
+Description: Library entry point and command line interface of the heat diffusion solvers, plotting is only loaded when a plot is asked for.
+Author: Bevan Jones
+Copyright Notice:
+This file is property of the University of Cape Town
+You may download or copy this file for use in your own program.
+You may NOT download or copy this file to another site.
+You may NOT download or copy this file for publication or sale.
+This file is intended for teaching purposes.
+'''
+
+import sys
+import argparse
+import MeshGenerator as mg
+import RefinementStudy as rs
+import MeshOptimiser as mo
+from DiffusionSolver import ImplicitDiffusion
+
+
+def SolveMesh(meshSize, thermalConduct=4.0, solverType="fast", stretchFactor=1.0, tolerance=1.0e-10, isquiet=True):
+    """
+    Generates and solves one square mesh.
+    :param meshSize: Number of nodes in each direction.
+    :param thermalConduct: The thermal conductivity.
+    :param solverType: Solver passed to ImplicitDiffusion.
+    :param stretchFactor: Stretch factor applied in both directions.
+    :param tolerance: Relative residual tolerance for the iterative solvers.
+    :param isquiet: When true suppresses the solver's write outs.
+    :return: The solved node table.
+    """
+    nodeTable = mg.GenerateMesh2DMesh(meshSize, meshSize, stretchFactor, stretchFactor)
+    return ImplicitDiffusion(nodeTable, thermalConduct, isquiet, solverType, tolerance)
+
+
+def PlotSolution(nodeTable, windowTitle, outputFile=None, isinteractive=True):
+    """
+    Plots the temperature, analytical temperature and absolute error of a solved node table.
+    :param nodeTable: A solved node table.
+    :param windowTitle: Title of the figure.
+    :param outputFile: When given the figure is rendered headless to this file, see Plotter.
+    :param isinteractive: When true a plot window blocks until it is closed.
+    :return: void
+    """
+    import Plotter as pl
+    numberofNodesX = len(nodeTable.TemperatureNP1)
+    numberofNodesY = len(nodeTable.TemperatureNP1[0])
+    plotter = pl.Plotter(windowTitle, 2, 2, 3, outputFile)
+    plotter.Add2DPlot(1, "Temperature distrabution", "Co-ordiante", "Temperature", numberofNodesX, numberofNodesY, True)
+    plotter.Add2DPlot(2, "Temperature Analytical", "Co-ordiante", "Temperature", numberofNodesX, numberofNodesY, True)
+    plotter.Add2DPlot(3, "Error Absolute", "Co-ordiante", "Absolute Error", numberofNodesX, numberofNodesY, True)
+    plotter.Update2DPlotData(1, nodeTable.TemperatureNP1, "Temperature")
+    plotter.Update2DPlotData(2, nodeTable.AnalyticalSolution, "Analytical Temperature")
+    plotter.Update2DPlotData(3, nodeTable.AbsoluteError, "Absolute Error")
+    plotter.Plot(isinteractive)
+    pl.WaitForAllRenders()
+
+
+def PlotRefinementStudy(results, windowTitle, outputFile=None, isinteractive=True):
+    """
+    Plots the maximum error against mesh size of a refinement study.
+    :param results: Output of RefinementStudy.RunRefinementStudy.
+    :param windowTitle: Title of the figure.
+    :param outputFile: When given the figure is rendered headless to this file, see Plotter.
+    :param isinteractive: When true a plot window blocks until it is closed.
+    :return: void
+    """
+    import Plotter as pl
+    plotter = pl.Plotter(windowTitle, 1, 1, 1, outputFile)
+    plotter.Add1DPlot(1, "Temperature distrabution", "Co-ordiante", "Temperature", "", "-", False)
+    plotter.Update1DPlotData(1, list(results['MeshSize']), list(results['MaxError']), "")
+    plotter.Plot(isinteractive)
+    pl.WaitForAllRenders()
+
+
+def Main(arguments=None):
+    """
+    Command line interface, eg "python HeatDiffusion.py solve --size 65", "refine --sizes 9 17 33" or "search --tolerance 1e-5".
+    Every subcommand writes its figure to --plot FILE headless, or opens a window with --show, and plots nothing otherwise.
+    :param arguments: Argument list, None reads sys.argv.
+    :return: Exit status.
+    """
+    parser = argparse.ArgumentParser(description="Implicit heat diffusion on the unit square.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    solveParser = subparsers.add_parser("solve", help="Solve one mesh and report its errors.")
+    solveParser.add_argument("--size", type=int, default=33, help="Nodes in each direction.")
+    solveParser.add_argument("--stretch", type=float, default=1.0, help="Stretch factor in both directions.")
+    solveParser.add_argument("--tolerance", type=float, default=1.0e-10, help="Relative residual tolerance of the iterative solvers.")
+
+    refineParser = subparsers.add_parser("refine", help="Run a refinement study and report the order of accuracy.")
+    refineParser.add_argument("--sizes", type=int, nargs="+", default=[5, 9, 17, 33, 65], help="Nodes in each direction of each mesh.")
+    refineParser.add_argument("--stretch", type=float, default=1.0, help="Stretch factor in both directions.")
+    refineParser.add_argument("--workers", type=int, default=None, help="Worker processes, 0 solves serially.")
+
+    searchParser = subparsers.add_parser("search", help="Find the smallest mesh meeting a maximum error tolerance.")
+    searchParser.add_argument("--tolerance", type=float, default=1.0e-5, help="Largest acceptable maximum absolute error.")
+    searchParser.add_argument("--size", type=int, default=10, help="Smallest mesh size to consider.")
+    searchParser.add_argument("--graded", action="store_true", help="Optimise the stretching of each direction as well, see MeshOptimiser.")
+
+    for subparser in [solveParser, refineParser, searchParser]:
+        subparser.add_argument("--conductivity", type=float, default=4.0, help="Thermal conductivity.")
+        subparser.add_argument("--solver", default="fast", help="Solver type, see DiffusionSolver.ImplicitDiffusion.")
+        subparser.add_argument("--plot", default=None, help="Render the figure to this .png or .svg file.")
+        subparser.add_argument("--show", action="store_true", help="Open the figure in a window.")
+    arguments = parser.parse_args(arguments)
+    isplot = arguments.plot is not None or arguments.show
+
+    if arguments.command == "solve":
+        nodeTable = SolveMesh(arguments.size, arguments.conductivity, arguments.solver, arguments.stretch, arguments.tolerance, isquiet=True)
+        print("Mesh Size: " + str(arguments.size) + 'x' + str(arguments.size) + '\tMaximum error: ' + str(nodeTable.ErrorNorms['MaxError'])
+              + '\tL2 error: ' + str(nodeTable.ErrorNorms['L2Error']) + '\tSolve time (s): ' + '%.4f' % nodeTable.Profile.TotalTime())
+        if isplot:
+            PlotSolution(nodeTable, "Heat diffusion " + str(arguments.size) + 'x' + str(arguments.size), arguments.plot, arguments.show)
+
+    elif arguments.command == "refine":
+        results = rs.RunRefinementStudy(arguments.sizes, arguments.conductivity, arguments.solver, arguments.stretch, arguments.workers)
+        rs.PrintRefinementStudy(results)
+        if isplot:
+            PlotRefinementStudy(results, "Refinement study", arguments.plot, arguments.show)
+
+    else:
+        if arguments.graded:
+            meshSize, cellRatios, maxError, numberofSolves = mo.SearchGradedMeshSize(arguments.conductivity, arguments.tolerance, arguments.size, arguments.solver)
+        else:
+            cellRatios = (1.0, 1.0)
+            meshSize, maxError, numberofSolves = rs.SearchMeshSize(arguments.conductivity, arguments.tolerance, arguments.size, arguments.solver)
+        print("Smallest mesh: " + str(meshSize) + 'x' + str(meshSize) + '\tAbsolute error: ' + str(maxError) + '\tSolves: ' + str(numberofSolves)
+              + '\tCell ratios: ' + '%.4f' % cellRatios[0] + ', ' + '%.4f' % cellRatios[1])
+        if isplot:
+            nodeTable = mo.SolveGradedMesh(meshSize, arguments.conductivity, arguments.solver, cellRatios)
+            PlotSolution(nodeTable, "Smallest mesh " + str(meshSize) + 'x' + str(meshSize), arguments.plot, arguments.show)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(Main())
@@ -0,0 +1,75 @@
+'''
+File Name: Instrumentation.py
+Description: Per phase timing, memory and count records of a solve, with callback hooks.
+Author: Bevan Jones
+Copyright Notice:
+This file is property of the University of Cape Town
+You may download or copy this file for use in your own program.
+You may NOT download or copy this file to another site.
+You may NOT download or copy this file for publication or sale.
+This file is intended for teaching purposes.
+'''
+
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Hooks called after every phase of every profiled solve, see RegisterHook.
+Hooks = []
+
+
+def RegisterHook(hook):
+    """
+    Adds a callback run after each phase of every solve, eg to log or export the records.
+    :param hook: Callable taking (phase name, phase record).
+    :return: hook, so it can be passed to RemoveHook later.
+    """
+    Hooks.append(hook)
+    return hook
+
+
+def RemoveHook(hook):
+
+    if hook in Hooks:
+        Hooks.remove(hook)
+
+
+class SolveProfile:
+    def __init__(self, hooks=None):
+        """
+        Records of the phases of one solve, in the order they ran. Each record is a dictionary holding the phase's wall "Time"
+        in seconds, the "Bytes" of the arrays it allocated and any counts the phase adds (eg "Rows", "Nonzeros", "Iterations").
+        :param hooks: Callables taking (phase name, phase record) run after each phase, on top of the registered Hooks.
+        """
+        self.Phases = OrderedDict()
+        self.Hooks = list(hooks) if hooks is not None else []
+
+    @contextmanager
+    def Phase(self, name):
+        """
+        Times the enclosed block as one phase, repeated phases of the same name accumulate.
+        :param name: Name of the phase, eg "assembly".
+        :return: The phase record, add counts to it inside the block.
+        """
+        record = self.Phases.setdefault(name, {"Time": 0.0, "Bytes": 0})
+        startTime = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["Time"] += time.perf_counter() - startTime
+            for hook in self.Hooks + Hooks:
+                hook(name, record)
+
+    def TotalTime(self):
+
+        return sum(record["Time"] for record in self.Phases.values())
+
+    def Report(self):
+        """
+        Writes out one line per phase.
+        :return: void
+        """
+        print("\nPhase\t\tTime (s)\tBytes\t\tCounts")
+        for name, record in self.Phases.items():
+            counts = ', '.join(key + ': ' + str(value) for key, value in record.items() if key not in ["Time", "Bytes"])
+            print(name + '\t' + ('\t' if len(name) < 8 else '') + '%.6f' % record["Time"] + '\t' + str(record["Bytes"]) + '\t\t' + counts)
@@ -0,0 +1,372 @@
+'''
+File Name: IterativeSolver.py
+Description: Matrix free diffusion operator and iterative (Krylov and relaxation) solvers.
+Author: Bevan Jones
+Copyright Notice:
+This file is property of the University of Cape Town
+You may download or copy this file for use in your own program.
+You may NOT download or copy this file to another site.
+You may NOT download or copy this file for publication or sale.
+This file is intended for teaching purposes.
+'''
+
+import copy
+import numpy as np
+import scipy.sparse as sp
+import Discretisation as dc
+
+
+class DiffusionOperator2D:
+    def __init__(self, nodeCoordinate, nodeCellSize, nodeVolume, viscocity):
+        """
+        Matrix free form of the implicit diffusion operator, applied directly on (nx, ny) fields.
+        Interior rows are multiplied by the control volume so the operator is symmetric positive definite,
+        Dirichlet boundary values are held fixed in the field and never updated.
+        :param nodeCoordinate: Nodal co-ordinates, shape (nx, ny, 2).
+        :param nodeCellSize: Nodal cell sizes, shape (nx, ny, 2).
+        :param nodeVolume: Nodal control volumes, shape (nx, ny, 1).
+        :param viscocity: The diffusion coefficient.
+        """
+        coeffCentre, coeffWest, coeffEast, coeffSouth, coeffNorth, isBoundary = dc.Diffusion2DStencil(nodeCoordinate, nodeCellSize, nodeVolume, viscocity)
+        volume = np.asarray(nodeVolume[1:-1, 1:-1, 0], dtype=float)
+
+        # Interior coefficients only, neighbour weights are stored positive.
+        self.Shape = isBoundary.shape
+        self.Volume = volume
+        self.Diagonal = -coeffCentre[1:-1, 1:-1]*volume
+        self.West = coeffWest[1:-1, 1:-1]*volume
+        self.East = coeffEast[1:-1, 1:-1]*volume
+        self.South = coeffSouth[1:-1, 1:-1]*volume
+        self.North = coeffNorth[1:-1, 1:-1]*volume
+
+        # Red-black colouring of the interior nodes.
+        icolu, irow = np.meshgrid(np.arange(1, self.Shape[0] - 1), np.arange(1, self.Shape[1] - 1), indexing='ij')
+        self.IsRed = (icolu + irow) % 2 == 0
+
+    def Apply(self, phi):
+        """
+        Applies the operator to a field, the result is zero on the boundary.
+        :param phi: Field of shape (nx, ny), boundary values included.
+        :return: A times phi, shape (nx, ny).
+        """
+        result = np.zeros(self.Shape, dtype=self.Diagonal.dtype)
+        result[1:-1, 1:-1] = self.Diagonal*phi[1:-1, 1:-1] - self.NeighbourSum(phi)
+        return result
+
+    def NeighbourSum(self, phi):
+        """
+        Weighted sum of the four neighbours of every interior node.
+        :param phi: Field of shape (nx, ny).
+        :return: Array of shape (nx - 2, ny - 2).
+        """
+        return self.West*phi[:-2, 1:-1] + self.East*phi[2:, 1:-1] + self.South*phi[1:-1, :-2] + self.North*phi[1:-1, 2:]
+
+    def Residual(self, phi, rhs):
+        """
+        Computes rhs - A phi on the interior, zero on the boundary.
+        :param phi: Field of shape (nx, ny).
+        :param rhs: Right hand side of shape (nx, ny), only interior values are used.
+        :return: Residual of shape (nx, ny).
+        """
+        residual = np.zeros(self.Shape, dtype=self.Diagonal.dtype)
+        residual[1:-1, 1:-1] = rhs[1:-1, 1:-1] - self.Diagonal*phi[1:-1, 1:-1] + self.NeighbourSum(phi)
+        return residual
+
+    def AsType(self, dataType):
+        """
+        Copy of the operator with its coefficients held in dataType, eg np.float32 for the inner solves of a mixed precision solve.
+        Fields applied to the copy are worked on in the same precision.
+        :param dataType: numpy floating point type.
+        :return: A DiffusionOperator2D.
+        """
+        operator = copy.copy(self)
+        operator.Volume = self.Volume.astype(dataType)
+        operator.Diagonal = self.Diagonal.astype(dataType)
+        operator.West = self.West.astype(dataType)
+        operator.East = self.East.astype(dataType)
+        operator.South = self.South.astype(dataType)
+        operator.North = self.North.astype(dataType)
+        return operator
+
+    def NumberofBytes(self):
+
+        return sum(coefficients.nbytes for coefficients in [self.Diagonal, self.West, self.East, self.South, self.North])
+
+    def InteriorMatrix(self):
+        """
+        Assembles the operator restricted to the interior nodes, for direct solves on small meshes.
+        :return: A scipy.sparse CSR matrix of size (nx - 2)*(ny - 2), interior nodes ordered as GetMatrixIndex.
+        """
+        numberInteriorX = self.Shape[0] - 2
+        numberInterior = numberInteriorX*(self.Shape[1] - 2)
+        if numberInterior == 0:
+            return sp.csr_matrix((0, 0), dtype=self.Diagonal.dtype)
+        west = self.West.flatten(order='F')
+        east = self.East.flatten(order='F')
+        south = self.South.flatten(order='F')
+        north = self.North.flatten(order='F')
+
+        # Couplings to boundary nodes are dropped, the boundary values live in the field.
+        west[::numberInteriorX] = 0.0
+        east[numberInteriorX - 1::numberInteriorX] = 0.0
+        interiorMatrix = sp.diags(self.Diagonal.ravel(order='F'))
+        if numberInterior > 1:
+            interiorMatrix = interiorMatrix - sp.diags(west[1:], -1) - sp.diags(east[:-1], 1)
+        if numberInterior > numberInteriorX:
+            interiorMatrix = interiorMatrix - sp.diags(south[numberInteriorX:], -numberInteriorX) - sp.diags(north[:-numberInteriorX], numberInteriorX)
+        return interiorMatrix.tocsr()
+
+    def JacobiSweep(self, phi, rhs, omega):
+        """
+        One weighted Jacobi sweep, updates phi in place.
+        :param phi: Field of shape (nx, ny).
+        :param rhs: Right hand side of shape (nx, ny).
+        :param omega: Relaxation factor.
+        :return: phi
+        """
+        update = (rhs[1:-1, 1:-1] + self.NeighbourSum(phi))/self.Diagonal
+        phi[1:-1, 1:-1] += omega*(update - phi[1:-1, 1:-1])
+        return phi
+
+    def RedBlackSORSweep(self, phi, rhs, omega, isreverse=False):
+        """
+        One red-black successive over relaxation sweep, updates phi in place.
+        :param phi: Field of shape (nx, ny).
+        :param rhs: Right hand side of shape (nx, ny).
+        :param omega: Relaxation factor, 1.0 gives red-black Gauss-Seidel.
+        :param isreverse: When true the black nodes are updated before the red nodes.
+        :return: phi
+        """
+        colours = [~self.IsRed, self.IsRed] if isreverse else [self.IsRed, ~self.IsRed]
+        for colour in colours:
+            update = (rhs[1:-1, 1:-1] + self.NeighbourSum(phi))/self.Diagonal
+            interior = phi[1:-1, 1:-1]
+            interior[colour] += omega*(update[colour] - interior[colour])
+        return phi
+
+    def ZebraLineSweep(self, phi, rhs, isalongX, isreverse=False):
+        """
+        One zebra line Gauss-Seidel sweep, every second line of nodes is solved exactly then the others.
+        Robust smoother when the cells are stretched, updates phi in place.
+        :param phi: Field of shape (nx, ny).
+        :param rhs: Right hand side of shape (nx, ny).
+        :param isalongX: When true lines run in x (fixed row), otherwise in y (fixed column).
+        :param isreverse: When true the odd lines are solved before the even lines.
+        :return: phi
+        """
+        # Work on lines along the first axis, transposed views write straight back into phi.
+        if isalongX:
+            field, source, diagonal, lower, upper, before, after = phi, rhs, self.Diagonal, self.West, self.East, self.South, self.North
+        else:
+            field, source, diagonal, lower, upper, before, after = phi.T, rhs.T, self.Diagonal.T, self.South.T, self.North.T, self.West.T, self.East.T
+
+        for start in ([1, 0] if isreverse else [0, 1]):
+            lines = slice(start, None, 2)
+            lineSource = source[1:-1, 1:-1][:, lines] + before[:, lines]*field[1:-1, :-2][:, lines] + after[:, lines]*field[1:-1, 2:][:, lines]
+            lineSource[0] += lower[0, lines]*field[0, 1:-1][lines]
+            lineSource[-1] += upper[-1, lines]*field[-1, 1:-1][lines]
+            field[1:-1, 1:-1][:, lines] = SolveTridiagonal(-lower[:, lines], diagonal[:, lines], -upper[:, lines], lineSource)
+        return phi
+
+
+def SolveTridiagonal(lower, diagonal, upper, rhs):
+    """
+    Thomas algorithm along the first axis, every column is an independent tridiagonal system.
+    :param lower: Sub diagonal, lower[0] is not used.
+    :param diagonal: Main diagonal.
+    :param upper: Super diagonal, upper[-1] is not used.
+    :param rhs: Right hand sides.
+    :return: Solution with the same shape as rhs.
+    """
+    numberRows = len(diagonal)
+    modifiedUpper = np.zeros(diagonal.shape, dtype=rhs.dtype)
+    modifiedRhs = np.zeros(rhs.shape, dtype=rhs.dtype)
+    modifiedUpper[0] = upper[0]/diagonal[0]
+    modifiedRhs[0] = rhs[0]/diagonal[0]
+    for irow in range(1, numberRows):
+        denominator = diagonal[irow] - lower[irow]*modifiedUpper[irow - 1]
+        modifiedUpper[irow] = upper[irow]/denominator
+        modifiedRhs[irow] = (rhs[irow] - lower[irow]*modifiedRhs[irow - 1])/denominator
+
+    solution = np.zeros(rhs.shape, dtype=rhs.dtype)
+    solution[-1] = modifiedRhs[-1]
+    for irow in range(numberRows - 2, -1, -1):
+        solution[irow] = modifiedRhs[irow] - modifiedUpper[irow]*solution[irow + 1]
+    return solution
+
+
+def OptimalSORFactor(numberofNodesX, numberofNodesY):
+    """
+    Relaxation factor that is optimal for the model Poisson problem on the finer direction of the mesh.
+    :param numberofNodesX: Number of nodes in x.
+    :param numberofNodesY: Number of nodes in y.
+    :return: omega
+    """
+    return 2.0/(1.0 + np.sin(np.pi/(max(numberofNodesX, numberofNodesY) - 1)))
+
+
+def ConjugateGradient(operator, phi, rhs, tolerance, maxIterations, preconditioner="ssor", omega=1.0):
+    """
+    Preconditioned conjugate gradient solve of A phi = rhs, boundary values of phi are kept.
+    :param operator: A DiffusionOperator2D.
+    :param phi: Initial guess of shape (nx, ny), overwritten with the solution.
+    :param rhs: Right hand side of shape (nx, ny).
+    :param tolerance: Stop once the residual norm drops below tolerance times the residual of a zero interior guess.
+    :param maxIterations: Maximum number of iterations.
+    :param preconditioner: "jacobi", "ssor" (symmetric red-black SOR) or "none".
+    :param omega: Relaxation factor used by the ssor preconditioner.
+    :return: phi, residual history (one entry per iteration, the first is the initial residual)
+    """
+    referenceNorm = ReferenceResidualNorm(operator, phi, rhs)
+    residual = operator.Residual(phi, rhs)
+    residualHistory = [np.linalg.norm(residual)]
+    if residualHistory[0] <= tolerance*referenceNorm:
+        return phi, residualHistory
+
+    precond = ApplyPreconditioner(operator, residual, preconditioner, omega)
+    direction = precond.copy()
+    rz = np.vdot(residual, precond)
+    for iiter in range(maxIterations):
+        operatorDirection = operator.Apply(direction)
+        alpha = rz/np.vdot(direction, operatorDirection)
+        phi += alpha*direction
+        residual -= alpha*operatorDirection
+        residualHistory.append(np.linalg.norm(residual))
+        if residualHistory[-1] <= tolerance*referenceNorm:
+            break
+
+        precond = ApplyPreconditioner(operator, residual, preconditioner, omega)
+        rzNew = np.vdot(residual, precond)
+        direction *= rzNew/rz
+        direction += precond
+        rz = rzNew
+    return phi, residualHistory
+
+
+def RelaxationSolve(operator, phi, rhs, tolerance, maxIterations, smoother="sor", omega=1.0, stallIterations=None):
+    """
+    Stand alone relaxation solve of A phi = rhs, boundary values of phi are kept.
+    :param operator: A DiffusionOperator2D.
+    :param phi: Initial guess of shape (nx, ny), overwritten with the solution.
+    :param rhs: Right hand side of shape (nx, ny).
+    :param tolerance: Stop once the residual norm drops below tolerance times the residual of a zero interior guess.
+    :param maxIterations: Maximum number of sweeps.
+    :param smoother: "sor" for red-black SOR or "jacobi" for weighted Jacobi.
+    :param omega: Relaxation factor.
+    :param stallIterations: When given also stop once this many sweeps pass without a new smallest residual, ie round off has been reached.
+    :return: phi, residual history (one entry per sweep, the first is the initial residual)
+    """
+    referenceNorm = ReferenceResidualNorm(operator, phi, rhs)
+    residualHistory = [np.linalg.norm(operator.Residual(phi, rhs))]
+    smallestIteration = 0
+    for iiter in range(maxIterations):
+        if residualHistory[-1] <= tolerance*referenceNorm:
+            break
+        if stallIterations is not None and iiter - smallestIteration > stallIterations:
+            break
+        if smoother == "sor":
+            operator.RedBlackSORSweep(phi, rhs, omega)
+        elif smoother == "jacobi":
+            operator.JacobiSweep(phi, rhs, omega)
+        else:
+            print("Critical Error: smoother " + str(smoother) + " is not supported.")
+            exit(1)
+        residualHistory.append(np.linalg.norm(operator.Residual(phi, rhs)))
+        if residualHistory[-1] < residualHistory[smallestIteration]:
+            smallestIteration = iiter + 1
+    return phi, residualHistory
+
+
+def ApplyPreconditioner(operator, residual, preconditioner, omega):
+
+    if preconditioner == "jacobi":
+        precond = np.zeros(operator.Shape, dtype=residual.dtype)
+        precond[1:-1, 1:-1] = residual[1:-1, 1:-1]/operator.Diagonal
+    elif preconditioner == "ssor":
+        # Forward then reverse sweep from a zero guess keeps the preconditioner symmetric.
+        precond = np.zeros(operator.Shape, dtype=residual.dtype)
+        operator.RedBlackSORSweep(precond, residual, omega)
+        operator.RedBlackSORSweep(precond, residual, omega, True)
+    elif preconditioner == "none":
+        precond = residual.copy()
+    else:
+        print("Critical Error: preconditioner " + str(preconditioner) + " is not supported.")
+        exit(1)
+    return precond
+
+
+def ReferenceResidualNorm(operator, phi, rhs):
+
+    # Residual of the guess with only the boundary values set, ie the norm of the effective right hand side.
+    boundaryOnly = phi.copy()
+    boundaryOnly[1:-1, 1:-1] = 0.0
+    referenceNorm = np.linalg.norm(operator.Residual(boundaryOnly, rhs))
+    return referenceNorm if referenceNorm > 0.0 else 1.0
+
+
+def MatrixFreeSystem(operator, source, initialGuess=None):
+    """
+    Converts the implicit system's source vector into an initial field and volume scaled right hand side.
+    :param operator: A DiffusionOperator2D.
+    :param source: Source field of shape (nx, ny).
+    :param initialGuess: Optional field of shape (nx, ny) whose interior values start the iteration, zero otherwise.
+    :return: phi with the Dirichlet values set, rhs
+    """
+    # Boundary rows of the implicit system read -T = source, fields take the precision of the operator.
+    phi = -source.astype(operator.Diagonal.dtype)
+    phi[1:-1, 1:-1] = 0.0 if initialGuess is None else initialGuess[1:-1, 1:-1]
+    rhs = np.zeros(operator.Shape, dtype=operator.Diagonal.dtype)
+    rhs[1:-1, 1:-1] = source[1:-1, 1:-1]*operator.Volume
+    return phi, rhs
+
+
+def MatrixFreeSolve(nodeCoordinate, nodeCellSize, nodeVolume, viscocity, source, solverType, tolerance, maxIterations, preconditioner="ssor", omega=None, initialGuess=None,
+                    operator=None):
+    """
+    Solves the implicit diffusion system without forming a matrix.
+    :param nodeCoordinate: Nodal co-ordinates, shape (nx, ny, 2).
+    :param nodeCellSize: Nodal cell sizes, shape (nx, ny, 2).
+    :param nodeVolume: Nodal control volumes, shape (nx, ny, 1).
+    :param viscocity: The diffusion coefficient.
+    :param source: Source field of shape (nx, ny), the same values as the implicit system's source vector.
+    :param solverType: "cg", "sor" or "jacobi".
+    :param tolerance: Relative residual tolerance.
+    :param maxIterations: Iteration cap.
+    :param preconditioner: Preconditioner for "cg", see ConjugateGradient.
+    :param omega: Relaxation factor, None selects a default for the chosen method.
+    :param initialGuess: Optional field of shape (nx, ny) to start from, only interior values are used.
+    :param operator: A DiffusionOperator2D already built for this mesh and coefficient, None builds one.
+    :return: Temperature field of shape (nx, ny), residual history
+    """
+    if operator is None:
+        operator = DiffusionOperator2D(nodeCoordinate, nodeCellSize, nodeVolume, viscocity)
+    phi, rhs = MatrixFreeSystem(operator, source, initialGuess)
+    return IterativeSolve(operator, phi, rhs, solverType, tolerance, maxIterations, preconditioner, omega)
+
+
+def IterativeSolve(operator, phi, rhs, solverType, tolerance, maxIterations, preconditioner="ssor", omega=None, stallIterations=None):
+    """
+    Solves A phi = rhs with the chosen iterative method, in the precision of the operator and fields.
+    :param operator: A DiffusionOperator2D.
+    :param phi: Initial guess of shape (nx, ny), overwritten with the solution.
+    :param rhs: Right hand side of shape (nx, ny).
+    :param solverType: "cg", "sor" or "jacobi".
+    :param tolerance: Relative residual tolerance.
+    :param maxIterations: Iteration cap.
+    :param preconditioner: Preconditioner for "cg", see ConjugateGradient.
+    :param omega: Relaxation factor, None selects a default for the chosen method.
+    :param stallIterations: Stall check of "sor" and "jacobi", see RelaxationSolve.
+    :return: phi, residual history
+    """
+    numberofNodesX, numberofNodesY = operator.Shape
+    if solverType == "cg":
+        phi, residualHistory = ConjugateGradient(operator, phi, rhs, tolerance, maxIterations, preconditioner, 1.0 if omega is None else omega)
+    elif solverType == "sor":
+        phi, residualHistory = RelaxationSolve(operator, phi, rhs, tolerance, maxIterations, "sor", OptimalSORFactor(numberofNodesX, numberofNodesY) if omega is None else omega,
+                                               stallIterations)
+    elif solverType == "jacobi":
+        phi, residualHistory = RelaxationSolve(operator, phi, rhs, tolerance, maxIterations, "jacobi", 1.0 if omega is None else omega, stallIterations)
+    else:
+        print("Critical Error: iterative solver type " + str(solverType) + " is not supported.")
+        exit(1)
+    return phi, residualHistory
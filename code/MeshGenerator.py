@@ -16,13 +16,97 @@ import NodeTable as nt
 def ComputeInitialNodeSpacing(numberofNodes, positveStretchFactor):
 
     deltaX = 1.0
-# code here...
+    numberofCells = numberofNodes - 1
+
+    # First spacing of a geometric series of cells that fills the unit length.
+    if positveStretchFactor == 1.0:
+        deltaX = 1.0/numberofCells
+    else:
+        deltaX = (positveStretchFactor - 1.0)/(positveStretchFactor**numberofCells - 1.0)
     return deltaX
 
-def GenerateMesh2DMesh(numberofNodesX, numberofNodesY):
+def ComputeNodeLine(numberofNodes, positveStretchFactor):
+    """
+    Computes the node positions along one direction of the unit square from the closed form of the geometric series.
+    :param numberofNodes: Number of nodes along the line.
+    :param positveStretchFactor: Ratio of successive cell widths, 1.0 gives a uniform line.
+    :return: Array of node positions from 0.0 to 1.0.
+    """
+    numberofCells = numberofNodes - 1
+    if positveStretchFactor == 1.0:
+        return np.arange(numberofNodes)/numberofCells
+    logStretch = np.log(positveStretchFactor)
+    if numberofCells*logStretch > 700.0:
+        # Mirror of the shrinking line, avoids overflowing stretchFactor**numberofCells.
+        return 1.0 - ComputeNodeLine(numberofNodes, 1.0/positveStretchFactor)[::-1]
+
+    # x_i = deltaX*(r**i - 1)/(r - 1) with deltaX from ComputeInitialNodeSpacing, written with expm1 for accuracy near r = 1.
+    coordinates = np.expm1(np.arange(numberofNodes)*logStretch)/np.expm1(numberofCells*logStretch)
+    coordinates[-1] = 1.0
+    return coordinates
+
+def StretchFactorForCellRatio(numberofNodes, cellRatio):
+    """
+    Stretch factor whose last cell is cellRatio times the width of the first, the same grading at any number of nodes.
+    :param numberofNodes: Number of nodes along the line.
+    :param cellRatio: Width of the last cell over the width of the first.
+    :return: The stretch factor.
+    """
+    if cellRatio == 1.0 or numberofNodes < 3:
+        return 1.0
+    return float(cellRatio)**(1.0/(numberofNodes - 2))
+
+def ComputeCellSizeLine(coordinates):
+    """
+    Width of the control volume around each node of a line, half way to each neighbour.
+    :param coordinates: Node positions along the line.
+    :return: Array of cell widths.
+    """
+    spacing = np.diff(coordinates)
+    cellSize = np.zeros(len(coordinates))
+    cellSize[:-1] += 0.5*spacing
+    cellSize[1:] += 0.5*spacing
+    return cellSize
+
+def GenerateMesh2DMesh(numberofNodesX, numberofNodesY, stretchFactorX=1.0, stretchFactorY=1.0, subBlock=None, dataType=np.float64, storageDirectory=None):
+    """
+    Generates a uniform or geometrically stretched mesh on the unit square.
+    :param numberofNodesX: Number of nodes in x.
+    :param numberofNodesY: Number of nodes in y.
+    :param stretchFactorX: Ratio of successive cell widths in x.
+    :param stretchFactorY: Ratio of successive cell widths in y.
+    :param subBlock: Optional (columnStart, columnStop, rowStart, rowStop), only these nodes of the full mesh are generated.
+    :param dataType: Storage precision of the node table.
+    :param storageDirectory: When given the node table fields are memory mapped .npy files in this directory.
+    :return: A node table with co-ordinates, cell sizes and volumes computed.
+    """
+    return GenerateMesh2DMeshFromLines(ComputeNodeLine(numberofNodesX, stretchFactorX), ComputeNodeLine(numberofNodesY, stretchFactorY), subBlock, dataType, storageDirectory)
+
+def GenerateMesh2DMeshFromLines(coordinateX, coordinateY, subBlock=None, dataType=np.float64, storageDirectory=None):
+    """
+    Generates a tensor product mesh from the node positions along each direction.
+    :param coordinateX: Node positions in x.
+    :param coordinateY: Node positions in y.
+    :param subBlock: Optional (columnStart, columnStop, rowStart, rowStop), only these nodes of the full mesh are generated.
+    :param dataType: Storage precision of the node table.
+    :param storageDirectory: When given the node table fields are memory mapped .npy files in this directory.
+    :return: A node table with co-ordinates, cell sizes and volumes computed.
+    """
+    # Cell sizes come from the full lines so block edges see their neighbours outside the block.
+    cellSizeX = ComputeCellSizeLine(coordinateX)
+    cellSizeY = ComputeCellSizeLine(coordinateY)
+    if subBlock is not None:
+        columnStart, columnStop, rowStart, rowStop = subBlock
+        coordinateX, cellSizeX = coordinateX[columnStart:columnStop], cellSizeX[columnStart:columnStop]
+        coordinateY, cellSizeY = coordinateY[rowStart:rowStop], cellSizeY[rowStart:rowStop]
 
     newNodeTable = nt.NodeTable()
-    newNodeTable.Diffusion2D(numberofNodesX, numberofNodesY)
-# code here...
-    return newNodeTable
+    newNodeTable.Diffusion2D(len(coordinateX), len(coordinateY), dataType, storageDirectory)
 
+    # Nodal co-ordinates, cell sizes and volumes by broadcasting the lines over the mesh.
+    newNodeTable.Coordinate[:, :, 0] = coordinateX[:, np.newaxis]
+    newNodeTable.Coordinate[:, :, 1] = coordinateY[np.newaxis, :]
+    newNodeTable.CellSize[:, :, 0] = cellSizeX[:, np.newaxis]
+    newNodeTable.CellSize[:, :, 1] = cellSizeY[np.newaxis, :]
+    newNodeTable.Volume[:, :, 0] = np.outer(cellSizeX, cellSizeY)
+    return newNodeTable
@@ -0,0 +1,141 @@
+'''
+File Name: MeshOptimiser.py
+Description: Chooses the stretching of each direction from the error of a coarse solve, then the fewest nodes meeting an error tolerance.
+Author: Bevan Jones
+Copyright Notice:
+This file is property of the University of Cape Town
+You may download or copy this file for use in your own program.
+You may NOT download or copy this file to another site.
+You may NOT download or copy this file for publication or sale.
+This file is intended for teaching purposes.
+'''
+
+import numpy as np
+import MeshGenerator as mg
+import RefinementStudy as rs
+from DiffusionSolver import ImplicitDiffusion
+
+# Golden section ratio of the line search.
+GoldenRatio = 0.5*(3.0 - np.sqrt(5.0))
+
+
+def SolveGradedMesh(meshSize, thermalConduct, solverType, cellRatios):
+    """
+    Solves one mesh graded to the given cell ratios, keeping the absolute error field for the optimiser.
+    :param meshSize: Number of nodes in each direction.
+    :param thermalConduct: The thermal conductivity.
+    :param solverType: Solver passed to ImplicitDiffusion.
+    :param cellRatios: (x, y) ratios of the last to the first cell width.
+    :return: The solved node table.
+    """
+    stretchFactors = [mg.StretchFactorForCellRatio(meshSize, cellRatio) for cellRatio in cellRatios]
+    nodeTable = mg.GenerateMesh2DMesh(meshSize, meshSize, stretchFactors[0], stretchFactors[1])
+    return ImplicitDiffusion(nodeTable, thermalConduct, True, solverType, factorisationCache=None)
+
+
+def ErrorCentroid(nodeTable):
+    """
+    Volume weighted mean position of the absolute error in each direction, 0.5 when the error is balanced about the middle of the square.
+    :param nodeTable: A solved node table.
+    :return: (x, y) centroid of the error.
+    """
+    weightedError = nodeTable.AbsoluteError[:, :, 0]*nodeTable.Volume[:, :, 0]
+    totalError = np.sum(weightedError)
+    if totalError == 0.0:
+        return 0.5, 0.5
+    return (float(np.dot(np.sum(weightedError, axis=1), nodeTable.Coordinate[:, 0, 0])/totalError),
+            float(np.dot(np.sum(weightedError, axis=0), nodeTable.Coordinate[0, :, 1])/totalError))
+
+
+def OptimiseCellRatios(meshSize, thermalConduct, solverType="fast", cellRatios=(1.0, 1.0), maxSearches=2, ratioTolerance=0.01, maxCellRatio=100.0):
+    """
+    Grades the mesh to minimise its maximum error. Nodes are moved towards the side of each direction holding more of the error,
+    ie along the offset of the error centroid from the middle, and the distance moved is found by a golden section search on the
+    logarithm of the cell ratios. The search repeats from the new mesh while its error centroid still points somewhere.
+    :param meshSize: Number of nodes in each direction, a coarse mesh is enough as the best cell ratios hardly change with mesh size.
+    :param thermalConduct: The thermal conductivity.
+    :param solverType: Solver passed to ImplicitDiffusion.
+    :param cellRatios: (x, y) cell ratios to start from.
+    :param maxSearches: Number of line searches.
+    :param ratioTolerance: Width of the final bracket in the logarithm of the cell ratios.
+    :param maxCellRatio: Largest ratio of the widest to the narrowest cell considered.
+    :return: (x, y) cell ratios, their maximum error, number of solves performed
+    """
+    maxErrors = {}
+    nodeTables = {}
+
+    def MaxError(logRatios):
+        key = tuple(np.round(logRatios, 12))
+        if key not in maxErrors:
+            nodeTable = SolveGradedMesh(meshSize, thermalConduct, solverType, np.exp(logRatios))
+            maxErrors[key] = float(nodeTable.ErrorNorms['MaxError'])
+            nodeTables[key] = nodeTable
+        return maxErrors[key]
+
+    logRatios = np.log(np.asarray(cellRatios, dtype=float))
+    bestError = MaxError(logRatios)
+    for isearch in range(maxSearches):
+        # More error on the far side of a direction means the cells there should shrink, ie a smaller cell ratio.
+        direction = 0.5 - np.array(ErrorCentroid(nodeTables[tuple(np.round(logRatios, 12))]))
+        if np.linalg.norm(direction) < 1.0e-3:
+            break
+        direction /= np.linalg.norm(direction)
+        maxStep = np.log(maxCellRatio)
+
+        # Bracket the minimum by doubling the step until the error grows again, a step still improving at the cap is taken as it is.
+        lower, middle, upper = 0.0, 0.0, min(0.25, maxStep)
+        while MaxError(logRatios + upper*direction) < MaxError(logRatios + middle*direction):
+            if upper >= maxStep:
+                lower = middle = upper
+                break
+            lower, middle, upper = middle, upper, min(2.0*upper, maxStep)
+
+        # Golden section search of the bracket, the end points are never better than the best point inside it.
+        while upper - lower > ratioTolerance:
+            if upper - middle > middle - lower:
+                probe = middle + GoldenRatio*(upper - middle)
+                if MaxError(logRatios + probe*direction) < MaxError(logRatios + middle*direction):
+                    lower, middle = middle, probe
+                else:
+                    upper = probe
+            else:
+                probe = middle - GoldenRatio*(middle - lower)
+                if MaxError(logRatios + probe*direction) < MaxError(logRatios + middle*direction):
+                    upper, middle = middle, probe
+                else:
+                    lower = probe
+
+        if MaxError(logRatios + middle*direction) >= bestError:
+            break
+        logRatios = logRatios + middle*direction
+        bestError = MaxError(logRatios)
+    return tuple(float(cellRatio) for cellRatio in np.exp(logRatios)), bestError, len(maxErrors)
+
+
+def SearchGradedMeshSize(thermalConduct, errorTolerance, minimumMeshSize, solverType="fast", maxAdaptations=3, isquiet=True):
+    """
+    Finds the fewest nodes meeting the error tolerance on a graded mesh. The cell ratios are optimised on the coarsest mesh,
+    the smallest mesh size meeting the tolerance at those ratios is searched for, and the ratios are optimised again on that mesh
+    until the mesh size stops changing.
+    :param thermalConduct: The thermal conductivity.
+    :param errorTolerance: Largest acceptable maximum absolute error.
+    :param minimumMeshSize: Smallest mesh size to consider, the first grading is found on it.
+    :param solverType: Solver passed to ImplicitDiffusion.
+    :param maxAdaptations: Largest number of times the grading is optimised.
+    :param isquiet: When false every adaptation is written out.
+    :return: mesh size, (x, y) cell ratios, maximum error, number of solves performed
+    """
+    meshSize = minimumMeshSize
+    cellRatios = (1.0, 1.0)
+    numberofSolves = 0
+    for iadaptation in range(maxAdaptations):
+        cellRatios, maxError, optimiseSolves = OptimiseCellRatios(meshSize, thermalConduct, solverType, cellRatios)
+        newMeshSize, maxError, searchSolves = rs.SearchMeshSize(thermalConduct, errorTolerance, minimumMeshSize, solverType, cellRatios=cellRatios)
+        numberofSolves += optimiseSolves + searchSolves
+        if not isquiet:
+            print("Adaptation " + str(iadaptation + 1) + ": cell ratios " + '%.4f' % cellRatios[0] + ', ' + '%.4f' % cellRatios[1]
+                  + '\tMesh Size: ' + str(newMeshSize) + 'x' + str(newMeshSize) + '\tAbsolute error: ' + str(maxError))
+        if newMeshSize == meshSize:
+            break
+        meshSize = newMeshSize
+    return meshSize, cellRatios, maxError, numberofSolves
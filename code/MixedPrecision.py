@@ -0,0 +1,144 @@
+'''
+File Name: MixedPrecision.py
+Description: Mixed precision solves, the solver works in single precision and iterative refinement against double precision residuals recovers full accuracy.
+Author: Bevan Jones
+Copyright Notice:
+This file is property of the University of Cape Town
+You may download or copy this file for use in your own program.
+You may NOT download or copy this file to another site.
+You may NOT download or copy this file for publication or sale.
+This file is intended for teaching purposes.
+'''
+
+import numpy as np
+import scipy.sparse.linalg as spla
+import IterativeSolver as its
+import Multigrid as mgs
+import FactorisationCache as fc
+import FastPoissonSolver as fps
+
+
+class SinglePrecisionSolver:
+    def __init__(self, nodeTable, operator, thermalConduct, solverType, maxIterations=10000, preconditioner="ssor", relaxationFactor=None,
+                 factorisationCache=None, tolerance=1.0e-4):
+        """
+        Holds the factorisation, operator or multigrid hierarchy of the implicit system in float32 and solves the correction
+        equation A c = r of iterative refinement with it. Each correction only has to gain a few digits, the double precision
+        residual of the next refinement step measures what is left.
+        :param nodeTable: The node table for the mesh.
+        :param operator: The double precision DiffusionOperator2D of the mesh, the single precision copies are made from it.
+        :param thermalConduct: The thermal conductivity.
+        :param solverType: As ImplicitDiffusion, apart from "parallel".
+        :param maxIterations: Iteration (or multigrid cycle) cap of each correction solve.
+        :param preconditioner: Preconditioner for "cg", either "ssor", "jacobi" or "none".
+        :param relaxationFactor: Relaxation factor for the iterative solvers, None picks a default.
+        :param factorisationCache: Cache reused by "dense" and "sparse" across calls with the same mesh and conductivity, None refactorises every call.
+        :param tolerance: Relative residual tolerance of each iterative correction solve. Residuals computed in single precision stop
+                          falling at roughly the condition number times 6e-8, the relaxation and multigrid corrections also stop once they
+                          stall, conjugate gradient updates its residual recursively and does not stall.
+        """
+        self.SolverType = solverType
+        self.MaxIterations = maxIterations
+        self.Preconditioner = preconditioner
+        self.RelaxationFactor = relaxationFactor
+        self.Tolerance = tolerance
+        self.Coordinate = nodeTable.Coordinate
+        self.ThermalConduct = thermalConduct
+        self.Shape = operator.Shape
+        self.Volume = operator.Volume
+        self.IsCacheHit = False
+
+        if operator.Diagonal.size == 0:
+            # Every node is a boundary node, the Dirichlet values are the solution and there is nothing to factorise.
+            self.SolverType = "none"
+            self.NumberofStoredBytes = 0
+        elif solverType == "fast":
+            # Nothing is stored, the sine transforms run in single precision.
+            self.NumberofStoredBytes = 0
+        elif solverType in ["dense", "sparse"]:
+            CacheKey = fc.MeshSignature(nodeTable.Coordinate, thermalConduct, solverType + "-float32")
+            self.Factorisation = factorisationCache.Get(CacheKey) if factorisationCache is not None else None
+            self.IsCacheHit = self.Factorisation is not None
+            if self.IsCacheHit:
+                self.NumberofStoredBytes = factorisationCache.Entries[CacheKey][1]
+            else:
+                InteriorMatrix = operator.InteriorMatrix().astype(np.float32)
+                if solverType == "dense":
+                    self.Factorisation = fc.DenseLUFactorisation(InteriorMatrix.toarray())
+                    self.NumberofStoredBytes = self.Factorisation.NumberofBytes()
+                else:
+                    self.Factorisation = spla.splu(InteriorMatrix.tocsc())
+                    self.NumberofStoredBytes = fc.SparseLUNumberofBytes(self.Factorisation)
+                if factorisationCache is not None:
+                    factorisationCache.Put(CacheKey, self.Factorisation, self.NumberofStoredBytes)
+        elif solverType in ["cg", "sor", "jacobi"]:
+            self.Operator = operator.AsType(np.float32)
+            self.NumberofStoredBytes = self.Operator.NumberofBytes()
+        elif solverType in ["multigrid", "fmg"]:
+            self.Hierarchy = mgs.BuildHierarchy(nodeTable.Coordinate, thermalConduct).AsType(np.float32)
+            self.NumberofStoredBytes = self.Hierarchy.NumberofBytes()
+        else:
+            print("Critical Error: solver type " + str(solverType) + " is not supported in mixed precision.")
+            exit(1)
+
+    def SolveCorrection(self, residual):
+        """
+        Solves A c = residual in single precision with a zero boundary.
+        :param residual: Double precision residual of shape (nx, ny), only interior values are used.
+        :return: correction of shape (nx, ny) in float32, number of iterations (or cycles) taken
+        """
+        correction = np.zeros(self.Shape, dtype=np.float32)
+        rhs = residual.astype(np.float32)
+        if self.SolverType == "none":
+            return correction, 0
+        elif self.SolverType == "fast":
+            # The sine transform solver takes the unscaled source, the interior volumes are all dx dy.
+            source = np.zeros(self.Shape, dtype=np.float32)
+            source[1:-1, 1:-1] = residual[1:-1, 1:-1]/self.Volume
+            return fps.FastDiffusionSolve(self.Coordinate, self.ThermalConduct, source, np.float32), 0
+        elif self.SolverType in ["dense", "sparse"]:
+            interior = self.Factorisation.solve(np.ascontiguousarray(rhs[1:-1, 1:-1].ravel(order='F')))
+            correction[1:-1, 1:-1] = interior.reshape((self.Shape[0] - 2, self.Shape[1] - 2), order='F')
+            return correction, 0
+        elif self.SolverType in ["multigrid", "fmg"]:
+            correction, residualHistory = mgs.MultigridSolve(self.Hierarchy, correction, rhs, self.Tolerance, self.MaxIterations, self.SolverType == "fmg",
+                                                             stallCycles=1)
+        else:
+            # Optimal SOR can take close to a sweep per node line to fall back below its starting residual.
+            correction, residualHistory = its.IterativeSolve(self.Operator, correction, rhs, self.SolverType, self.Tolerance, self.MaxIterations,
+                                                             self.Preconditioner, self.RelaxationFactor, max(self.Shape))
+        return correction, len(residualHistory) - 1
+
+    def NumberofBytes(self):
+
+        return self.NumberofStoredBytes
+
+
+def MixedPrecisionSolve(operator, solver, source, tolerance, maxRefinements=50, initialGuess=None):
+    """
+    Iterative refinement, the residual of the implicit system is computed in double precision with the operator built from the
+    node table, the correction is solved for in single precision and added to the double precision solution, until the residual
+    meets the same tolerance a double precision solve would.
+    :param operator: The double precision DiffusionOperator2D of the mesh.
+    :param solver: A SinglePrecisionSolver of the same mesh.
+    :param source: Source field of shape (nx, ny), the same values as the implicit system's source vector.
+    :param tolerance: Stop once the residual norm drops below tolerance times the residual of a zero interior guess.
+    :param maxRefinements: Refinement step cap, refinement stalls if the single precision solve is too inaccurate (very badly conditioned meshes).
+    :param initialGuess: Optional field of shape (nx, ny) to start from, only interior values are used.
+    :return: Temperature field of shape (nx, ny), residual history (one entry per refinement step, the first is the initial residual),
+             total iterations of the single precision solves
+    """
+    phi, rhs = its.MatrixFreeSystem(operator, source, initialGuess)
+    referenceNorm = its.ReferenceResidualNorm(operator, phi, rhs)
+    residual = operator.Residual(phi, rhs)
+    residualHistory = [np.linalg.norm(residual)]
+    numberofIterations = 0
+    for irefinement in range(maxRefinements):
+        if residualHistory[-1] <= tolerance*referenceNorm:
+            break
+        correction, iterations = solver.SolveCorrection(residual)
+        phi[1:-1, 1:-1] += correction[1:-1, 1:-1]
+        numberofIterations += iterations
+        residual = operator.Residual(phi, rhs)
+        residualHistory.append(np.linalg.norm(residual))
+    return phi, residualHistory, numberofIterations
@@ -0,0 +1,307 @@
+'''
+File Name: Multigrid.py
+Description: Geometric multigrid solver for the implicit diffusion system on structured meshes.
+Author: Bevan Jones
+Copyright Notice:
+This file is property of the University of Cape Town
+You may download or copy this file for use in your own program.
+You may NOT download or copy this file to another site.
+You may NOT download or copy this file for publication or sale.
+This file is intended for teaching purposes.
+'''
+
+import copy
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+import MeshGenerator as mg
+import IterativeSolver as its
+
+
+def CoarsenLine(coordinates):
+    """
+    Picks every second node of a line, always keeping the last node so even node counts coarsen too.
+    :param coordinates: Node positions along the fine line.
+    :return: Indices of the fine nodes that make up the coarse line.
+    """
+    coarseIndex = np.arange(0, len(coordinates), 2)
+    if coarseIndex[-1] != len(coordinates) - 1:
+        coarseIndex = np.append(coarseIndex, len(coordinates) - 1)
+    return coarseIndex
+
+
+def LineProlongation(fineCoordinates, coarseIndex):
+    """
+    Linear interpolation from a coarse line onto the fine line, weighted by the actual node positions.
+    :param fineCoordinates: Node positions along the fine line.
+    :param coarseIndex: Indices of the coarse nodes on the fine line.
+    :return: A scipy.sparse matrix of shape (number fine nodes, number coarse nodes).
+    """
+    return LineInterpolation(fineCoordinates[coarseIndex], fineCoordinates)
+
+
+def LineInterpolation(sourceCoordinates, targetCoordinates):
+    """
+    Linear interpolation between the nodes of two lines spanning the same interval.
+    :param sourceCoordinates: Node positions the values are known at.
+    :param targetCoordinates: Node positions to interpolate to.
+    :return: A scipy.sparse matrix of shape (number target nodes, number source nodes).
+    """
+    numberTarget = len(targetCoordinates)
+
+    # Source interval each target node sits in and its linear weight.
+    interval = np.clip(np.searchsorted(sourceCoordinates, targetCoordinates, side='right') - 1, 0, len(sourceCoordinates) - 2)
+    weight = (targetCoordinates - sourceCoordinates[interval])/(sourceCoordinates[interval + 1] - sourceCoordinates[interval])
+    weight = np.clip(weight, 0.0, 1.0)
+    rows = np.concatenate((np.arange(numberTarget), np.arange(numberTarget)))
+    cols = np.concatenate((interval, interval + 1))
+    data = np.concatenate((1.0 - weight, weight))
+    return sp.csr_matrix((data, (rows, cols)), shape=(numberTarget, len(sourceCoordinates)))
+
+
+def InterpolateField(sourceCoordinate, field, targetCoordinate):
+    """
+    Bilinear interpolation of a nodal field from one structured mesh onto another, eg a coarse solution onto a finer mesh.
+    :param sourceCoordinate: Nodal co-ordinates of the mesh the field lives on, shape (nx, ny, 2).
+    :param field: Nodal field, shape (nx, ny).
+    :param targetCoordinate: Nodal co-ordinates of the new mesh, shape (mx, my, 2).
+    :return: Interpolated field of shape (mx, my).
+    """
+    interpolationX = LineInterpolation(np.asarray(sourceCoordinate[:, 0, 0], dtype=float), np.asarray(targetCoordinate[:, 0, 0], dtype=float))
+    interpolationY = LineInterpolation(np.asarray(sourceCoordinate[0, :, 1], dtype=float), np.asarray(targetCoordinate[0, :, 1], dtype=float))
+    return interpolationX @ (interpolationY @ np.asarray(field, dtype=float).T).T
+
+
+class MultigridHierarchy:
+    def __init__(self, coordinateX, coordinateY, viscocity, minimumNodes=5, preSweeps=2, postSweeps=2, smoother="line"):
+        """
+        Builds the mesh hierarchy by repeatedly dropping every second node line of the structured mesh.
+        Coarse operators are rediscretised on the coarse node positions, so stretched meshes are supported.
+        :param coordinateX: Node positions in x of the finest mesh.
+        :param coordinateY: Node positions in y of the finest mesh.
+        :param viscocity: The diffusion coefficient.
+        :param minimumNodes: A direction is no longer coarsened once it has this many nodes or fewer.
+        :param preSweeps: Smoothing sweeps before restriction.
+        :param postSweeps: Smoothing sweeps after prolongation.
+        :param smoother: "line" for alternating direction zebra line Gauss-Seidel, robust on stretched meshes,
+                         or "redblack" for point red-black Gauss-Seidel, cheaper on uniform meshes.
+        """
+        self.Smoother = smoother
+        self.PreSweeps = preSweeps
+        self.PostSweeps = postSweeps
+        self.Operator = []
+        self.ProlongationX = []
+        self.ProlongationY = []
+        self.CoarseIndexX = []
+        self.CoarseIndexY = []
+
+        while True:
+            levelTable = mg.GenerateMesh2DMeshFromLines(coordinateX, coordinateY)
+            self.Operator.append(its.DiffusionOperator2D(levelTable.Coordinate, levelTable.CellSize, levelTable.Volume, viscocity))
+            if len(coordinateX) <= minimumNodes and len(coordinateY) <= minimumNodes:
+                break
+
+            # Semi-coarsen once one direction has reached the minimum size.
+            coarseIndexX = CoarsenLine(coordinateX) if len(coordinateX) > minimumNodes else np.arange(len(coordinateX))
+            coarseIndexY = CoarsenLine(coordinateY) if len(coordinateY) > minimumNodes else np.arange(len(coordinateY))
+            self.ProlongationX.append(LineProlongation(coordinateX, coarseIndexX))
+            self.ProlongationY.append(LineProlongation(coordinateY, coarseIndexY))
+            self.CoarseIndexX.append(coarseIndexX)
+            self.CoarseIndexY.append(coarseIndexY)
+            coordinateX = coordinateX[coarseIndexX]
+            coordinateY = coordinateY[coarseIndexY]
+
+        # Exact solve on the coarsest mesh.
+        self.CoarseSolver = None
+        if self.Operator[-1].Diagonal.size > 0:
+            self.CoarseSolver = spla.splu(self.Operator[-1].InteriorMatrix().tocsc())
+
+    def NumberofLevels(self):
+
+        return len(self.Operator)
+
+    def AsType(self, dataType):
+        """
+        Copy of the hierarchy with its operators, transfers and coarse factorisation held in dataType, eg np.float32 for the
+        inner solves of a mixed precision solve, cycles on the copy then run in that precision.
+        :param dataType: numpy floating point type.
+        :return: A MultigridHierarchy.
+        """
+        hierarchy = copy.copy(self)
+        hierarchy.Operator = [operator.AsType(dataType) for operator in self.Operator]
+        hierarchy.ProlongationX = [prolongation.astype(dataType) for prolongation in self.ProlongationX]
+        hierarchy.ProlongationY = [prolongation.astype(dataType) for prolongation in self.ProlongationY]
+        if self.CoarseSolver is not None:
+            hierarchy.CoarseSolver = spla.splu(hierarchy.Operator[-1].InteriorMatrix().tocsc())
+        return hierarchy
+
+    def NumberofBytes(self):
+
+        # Coefficients of every level plus the stored values and indices of the transfers.
+        transferBytes = sum(prolongation.data.nbytes + prolongation.indices.nbytes + prolongation.indptr.nbytes
+                            for prolongation in self.ProlongationX + self.ProlongationY)
+        return sum(operator.NumberofBytes() for operator in self.Operator) + transferBytes
+
+    def Restrict(self, ilevel, residual):
+        """
+        Transfers a residual from level ilevel to level ilevel + 1, the transpose of Prolong.
+        """
+        coarseResidual = self.ProlongationX[ilevel].T @ residual @ self.ProlongationY[ilevel]
+        coarseResidual[[0, -1], :] = 0.0
+        coarseResidual[:, [0, -1]] = 0.0
+        return coarseResidual
+
+    def Prolong(self, ilevel, correction):
+        """
+        Interpolates a field from level ilevel + 1 onto level ilevel.
+        """
+        return self.ProlongationX[ilevel] @ (self.ProlongationY[ilevel] @ correction.T).T
+
+    def Inject(self, ilevel, phi):
+        """
+        Copies the values of level ilevel that also exist on level ilevel + 1.
+        """
+        return phi[np.ix_(self.CoarseIndexX[ilevel], self.CoarseIndexY[ilevel])]
+
+    def CoarseSolve(self, phi, rhs):
+
+        if self.CoarseSolver is not None:
+            operator = self.Operator[-1]
+            boundaryOnly = phi.copy()
+            boundaryOnly[1:-1, 1:-1] = 0.0
+            residual = operator.Residual(boundaryOnly, rhs)
+            interior = self.CoarseSolver.solve(residual[1:-1, 1:-1].ravel(order='F'))
+            phi[1:-1, 1:-1] = interior.reshape(operator.Diagonal.shape, order='F')
+        return phi
+
+    def Smooth(self, ilevel, phi, rhs, isreverse):
+
+        operator = self.Operator[ilevel]
+        if self.Smoother == "line":
+            operator.ZebraLineSweep(phi, rhs, not isreverse, isreverse)
+            operator.ZebraLineSweep(phi, rhs, isreverse, isreverse)
+        elif self.Smoother == "redblack":
+            operator.RedBlackSORSweep(phi, rhs, 1.0, isreverse)
+        else:
+            print("Critical Error: smoother " + str(self.Smoother) + " is not supported.")
+            exit(1)
+        return phi
+
+    def VCycle(self, phi, rhs, ilevel=0):
+        """
+        One V-cycle on A phi = rhs at level ilevel, updates phi in place.
+        :param phi: Field on level ilevel, boundary values included.
+        :param rhs: Right hand side on level ilevel.
+        :param ilevel: The level to start from, 0 is the finest mesh.
+        :return: phi
+        """
+        if ilevel == self.NumberofLevels() - 1:
+            return self.CoarseSolve(phi, rhs)
+
+        operator = self.Operator[ilevel]
+        for isweep in range(self.PreSweeps):
+            self.Smooth(ilevel, phi, rhs, False)
+
+        # Coarse grid correction, the correction is zero on the boundary.
+        coarseRhs = self.Restrict(ilevel, operator.Residual(phi, rhs))
+        coarseCorrection = np.zeros(self.Operator[ilevel + 1].Shape, dtype=coarseRhs.dtype)
+        self.VCycle(coarseCorrection, coarseRhs, ilevel + 1)
+        phi += self.Prolong(ilevel, coarseCorrection)
+
+        # Reverse ordering keeps the cycle symmetric.
+        for isweep in range(self.PostSweeps):
+            self.Smooth(ilevel, phi, rhs, True)
+        return phi
+
+    def FullMultigrid(self, phi, rhs, ilevel=0):
+        """
+        Full multigrid, solve on the coarser level first and use its prolongation as the initial guess of one V-cycle.
+        :param phi: Field on level ilevel, only the boundary values are used.
+        :param rhs: Right hand side on level ilevel.
+        :param ilevel: The level to start from, 0 is the finest mesh.
+        :return: phi
+        """
+        if ilevel == self.NumberofLevels() - 1:
+            return self.CoarseSolve(phi, rhs)
+
+        coarsePhi = self.Inject(ilevel, phi)
+        coarsePhi[1:-1, 1:-1] = 0.0
+        self.FullMultigrid(coarsePhi, self.Restrict(ilevel, rhs), ilevel + 1)
+        phi[1:-1, 1:-1] = self.Prolong(ilevel, coarsePhi)[1:-1, 1:-1]
+        return self.VCycle(phi, rhs, ilevel)
+
+
+def MultigridSolve(hierarchy, phi, rhs, tolerance, maxCycles, isfullMultigrid=False, stallCycles=None):
+    """
+    Solves A phi = rhs on the finest level with repeated V-cycles.
+    :param hierarchy: A MultigridHierarchy.
+    :param phi: Initial guess of shape (nx, ny), overwritten with the solution.
+    :param rhs: Right hand side of shape (nx, ny).
+    :param tolerance: Stop once the residual norm drops below tolerance times the residual of a zero interior guess.
+    :param maxCycles: Maximum number of cycles.
+    :param isfullMultigrid: When true the first cycle is a full multigrid cycle.
+    :param stallCycles: When given also stop once this many cycles pass without a new smallest residual, ie round off has been reached.
+    :return: phi, residual history (one entry per cycle, the first is the initial residual)
+    """
+    operator = hierarchy.Operator[0]
+    referenceNorm = its.ReferenceResidualNorm(operator, phi, rhs)
+    residualHistory = [np.linalg.norm(operator.Residual(phi, rhs))]
+    smallestCycle = 0
+    for icycle in range(maxCycles):
+        if residualHistory[-1] <= tolerance*referenceNorm:
+            break
+        if stallCycles is not None and icycle - smallestCycle > stallCycles:
+            break
+        if isfullMultigrid and icycle == 0:
+            hierarchy.FullMultigrid(phi, rhs)
+        else:
+            hierarchy.VCycle(phi, rhs)
+        residualHistory.append(np.linalg.norm(operator.Residual(phi, rhs)))
+        if residualHistory[-1] < residualHistory[smallestCycle]:
+            smallestCycle = icycle + 1
+    return phi, residualHistory
+
+
+def SelectSmoother(coordinateX, coordinateY, maxAspectRatio=2.0):
+    """
+    Point smoothing stalls on stretched cells, pick line smoothing once any cell aspect ratio exceeds maxAspectRatio.
+    :param coordinateX: Node positions in x.
+    :param coordinateY: Node positions in y.
+    :param maxAspectRatio: Largest cell aspect ratio handled with point smoothing.
+    :return: "redblack" or "line"
+    """
+    spacingX = np.diff(coordinateX)
+    spacingY = np.diff(coordinateY)
+    aspectRatio = max(np.amax(spacingX)/np.amin(spacingY), np.amax(spacingY)/np.amin(spacingX))
+    return "redblack" if aspectRatio <= maxAspectRatio else "line"
+
+
+def BuildHierarchy(nodeCoordinate, viscocity):
+    """
+    Multigrid hierarchy of a structured mesh, with the smoother chosen from the mesh's cell aspect ratio.
+    :param nodeCoordinate: Nodal co-ordinates of a structured mesh, shape (nx, ny, 2).
+    :param viscocity: The diffusion coefficient.
+    :return: A MultigridHierarchy.
+    """
+    coordinateX = nodeCoordinate[:, 0, 0]
+    coordinateY = nodeCoordinate[0, :, 1]
+    return MultigridHierarchy(coordinateX, coordinateY, viscocity, smoother=SelectSmoother(coordinateX, coordinateY))
+
+
+def MultigridDiffusionSolve(nodeCoordinate, viscocity, source, tolerance, maxCycles, isfullMultigrid=False, initialGuess=None, hierarchy=None):
+    """
+    Solves the implicit diffusion system with geometric multigrid.
+    :param nodeCoordinate: Nodal co-ordinates of a structured mesh, shape (nx, ny, 2).
+    :param viscocity: The diffusion coefficient.
+    :param source: Source field of shape (nx, ny), the same values as the implicit system's source vector.
+    :param tolerance: Relative residual tolerance.
+    :param maxCycles: Cycle cap.
+    :param isfullMultigrid: When true the first cycle is a full multigrid cycle, which discards any initial guess.
+    :param initialGuess: Optional field of shape (nx, ny) to start from, only interior values are used.
+    :param hierarchy: A MultigridHierarchy already built for this mesh and coefficient, None builds one.
+    :return: Temperature field of shape (nx, ny), residual history
+    """
+    if hierarchy is None:
+        hierarchy = BuildHierarchy(nodeCoordinate, viscocity)
+    phi, rhs = its.MatrixFreeSystem(hierarchy.Operator[0], source, initialGuess)
+    return MultigridSolve(hierarchy, phi, rhs, tolerance, maxCycles, isfullMultigrid)
@@ -10,26 +10,139 @@ You may NOT download or copy this file for publication or sale.
 This file is intended for teaching purposes.
 '''
 
+import os
 import numpy as np
 
 class NodeTable:
+    __slots__ = ['Buffer', 'Coordinate', 'CellSize', 'Volume', 'TemperatureNP1', 'ResidualHistory', 'ErrorNorms', 'Profile', 'StorageDirectory', '_AbsoluteError', '_AnalyticalSolution']
 
-    def Diffusion2D(self, numberofNodesX, numberofNodesY):
+    def Diffusion2D(self, numberofNodesX, numberofNodesY, dataType=np.float64, storageDirectory=None):
         """
         Initialises a node with various nodal properties.
+        All fields are views into one contiguous buffer, each field stored in matrix (GetMatrixIndex) order.
         :param numberofNodesX: Number of nodes
         :param numberofNodesY: dimension of simulation
+        :param dataType: Storage precision, np.float32 halves the memory but rounds co-ordinates to single precision.
+        :param storageDirectory: When given, every field lives in a memory mapped .npy file in this directory instead of RAM.
         """
 
+        # Co-ordinate x, y, cell size x, y, volume and temperature, x varies fastest within each field.
+        self.StorageDirectory = storageDirectory
+        self.Buffer = self.AllocateField("Buffer", dataType, (6, numberofNodesY, numberofNodesX))
+        self.SetFieldViews()
+
+        # Error analysis, fields allocated on first use and the norms of the last solve (ErrorAnalysis.ErrorNormType).
+        self._AbsoluteError = None
+        self._AnalyticalSolution = None
+        self.ErrorNorms = None
+
+        # Solver convergence, residual norm after each iteration of an iterative solve, and the phase records of the last solve.
+        self.ResidualHistory = []
+        self.Profile = None
+
+    def Load(self, directory, mmapMode="r+"):
+        """
+        Reopens a node table written by Save without regenerating the mesh or re-solving.
+        :param directory: Directory the node table was saved to.
+        :param mmapMode: "r+" maps the files for reading and writing, "r" read only, None reads them into RAM.
+        :return: self
+        """
+        self.StorageDirectory = directory if mmapMode == "r+" else None
+        self.Buffer = np.load(os.path.join(directory, "Buffer.npy"), mmap_mode=mmapMode)
+        self.SetFieldViews()
+        self._AbsoluteError = LoadFieldIfExists(os.path.join(directory, "AbsoluteError.npy"), mmapMode)
+        self._AnalyticalSolution = LoadFieldIfExists(os.path.join(directory, "AnalyticalSolution.npy"), mmapMode)
+        residualFile = os.path.join(directory, "ResidualHistory.npy")
+        self.ResidualHistory = list(np.load(residualFile)) if os.path.isfile(residualFile) else []
+        normsFile = os.path.join(directory, "ErrorNorms.npy")
+        self.ErrorNorms = np.load(normsFile)[()] if os.path.isfile(normsFile) else None
+        return self
+
+    def Save(self, directory):
+        """
+        Checkpoints every allocated field as .npy files, reopen with Load.
+        :param directory: Directory to write to, created if needed.
+        :return: void
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        # Error fields are written in the buffer layout, (1, ny, nx) with x fastest.
+        for fileName, field in [("Buffer", self.Buffer), ("AbsoluteError", self._AbsoluteError), ("AnalyticalSolution", self._AnalyticalSolution)]:
+            if field is None:
+                continue
+            if fileName != "Buffer":
+                field = field.transpose(2, 1, 0)
+            if isinstance(field, np.memmap) and os.path.abspath(field.filename) == os.path.abspath(os.path.join(directory, fileName + ".npy")):
+                field.flush()
+            else:
+                np.save(os.path.join(directory, fileName + ".npy"), field)
+        np.save(os.path.join(directory, "ResidualHistory.npy"), np.asarray(self.ResidualHistory, dtype=float))
+        if self.ErrorNorms is not None:
+            np.save(os.path.join(directory, "ErrorNorms.npy"), self.ErrorNorms)
+
+    def Flush(self):
+        """
+        Writes memory mapped fields back to disk.
+        """
+        for field in [self.Buffer, self._AbsoluteError, self._AnalyticalSolution]:
+            if isinstance(field, np.memmap):
+                field.flush()
+
+    def AllocateField(self, fileName, dataType, shape):
+
+        if self.StorageDirectory is None:
+            return np.zeros(dtype=dataType, shape=shape)
+        if not os.path.isdir(self.StorageDirectory):
+            os.makedirs(self.StorageDirectory)
+        return np.lib.format.open_memmap(os.path.join(self.StorageDirectory, fileName + ".npy"), mode='w+', dtype=dataType, shape=shape)
+
+    def SetFieldViews(self):
+
         # General attributes of node
-        self.Coordinate = np.zeros(dtype=float, shape=(numberofNodesX, numberofNodesY, 2))
-        self.CellSize = np.zeros(dtype=float, shape=(numberofNodesX, numberofNodesY, 2))
-        self.Volume = np.zeros(dtype=float, shape=(numberofNodesX, numberofNodesY, 1))
+        self.Coordinate = self.Buffer[0:2].transpose(2, 1, 0)
+        self.CellSize = self.Buffer[2:4].transpose(2, 1, 0)
+        self.Volume = self.Buffer[4:5].transpose(2, 1, 0)
 
         # Flow at n+1
-        self.TemperatureNP1 = np.zeros(dtype=float, shape=(numberofNodesX, numberofNodesY, 1))
+        self.TemperatureNP1 = self.Buffer[5:6].transpose(2, 1, 0)
+
+    def TemperatureVector(self):
+        """
+        The temperature of every node as a flat view in matrix order, solvers write their solution straight into it.
+        :return: Array of shape (nx*ny,) sharing memory with TemperatureNP1.
+        """
+        return self.Buffer[5].reshape(-1)
+
+    def LazyField(self, fileName):
+
+        # Stored like the buffer (x fastest) so memory mapped files match the matrix order.
+        field = self.AllocateField(fileName, self.Buffer.dtype, (1, self.Buffer.shape[1], self.Buffer.shape[2]))
+        return field.transpose(2, 1, 0)
+
+    @property
+    def AbsoluteError(self):
+        if self._AbsoluteError is None:
+            self._AbsoluteError = self.LazyField("AbsoluteError")
+        return self._AbsoluteError
+
+    @AbsoluteError.setter
+    def AbsoluteError(self, value):
+        self._AbsoluteError = value
+
+    @property
+    def AnalyticalSolution(self):
+        if self._AnalyticalSolution is None:
+            self._AnalyticalSolution = self.LazyField("AnalyticalSolution")
+        return self._AnalyticalSolution
+
+    @AnalyticalSolution.setter
+    def AnalyticalSolution(self, value):
+        self._AnalyticalSolution = value
+
+
 
-        # Error analysis
-        self.AbsoluteError = np.zeros(dtype=float, shape=(numberofNodesX, numberofNodesY, 1))
-        self.AnalyticalSolution = np.zeros(dtype=float, shape=(numberofNodesX, numberofNodesY, 1))
+def LoadFieldIfExists(fileName, mmapMode):
 
+    if not os.path.isfile(fileName):
+        return None
+    return np.load(fileName, mmap_mode=mmapMode).transpose(2, 1, 0)
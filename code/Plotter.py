@@ -10,28 +10,46 @@ You may NOT download or copy this file for publication or sale.
 This file is intended for teaching purposes.
 '''
 
+import os
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from matplotlib import pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+# Background thread shared by every headless plotter, figures render in the order they are submitted.
+RenderExecutor = None
+
+# 2D plots of meshes with more nodes than this in either direction are drawn without node grid lines.
+GridLineNodeLimit = 64
 
 class Plotter:
-    def __init__(self, windowTitle, mrow, mcolu, mplot):
+    def __init__(self, windowTitle, mrow, mcolu, mplot, outputFile=None):
         """
         Constructor of the post processing grpah plotter.
         :param windowTitle: Name of the window to be created
         :param mrow: Number of rows in the graphing window
         :param mcolu: Number of columns in the graphing window
         :param mplot: The number of plots in the window.
+        :param outputFile: When given the plotter is headless, Plot renders off screen to this .png or .svg file on a background thread
+                           instead of opening a window.
         """
 
         # Set up basic info
         self.mRow = mrow
         self.mColu = mcolu
         self.mPlot = mplot
+        self.OutputFile = outputFile
+        self.PendingRender = None
 
-        # Set up the window, allocate the sub plots.
-        plt.ion()
-        plt.show(block=True)
-        self.GraphWind = plt.figure()
+        # Set up the window, or an off screen figure with no GUI at all, allocate the sub plots.
+        if outputFile is None:
+            # Only windowed plotters load pyplot and with it a GUI backend.
+            from matplotlib import pyplot as plt
+            plt.ion()
+            self.GraphWind = plt.figure()
+        else:
+            self.GraphWind = Figure()
+            FigureCanvasAgg(self.GraphWind)
         self.GraphWind.subplots_adjust(left=0.1, bottom=0.05, top=0.85, wspace=0.2, hspace=0.5)
         self.GraphWind.suptitle(windowTitle)
 
@@ -51,6 +69,8 @@ class Plotter:
         self.mNodeX = []
         self.mNodeY = []
         self.ColorBar = []
+        self.Mesh2D = []
+        self.isDrawn = False
 
         #plt.get_current_fig_manager().resize(*plt.get_current_fig_manager().window.maxsize())
 
@@ -67,6 +87,7 @@ class Plotter:
         :return: void
         """
 
+        self.WaitForRender()
         if iplot <= 0:
             print("Critical Error: " + str(iplot) + " must be greater than 0.")
             exit(1)
@@ -90,6 +111,7 @@ class Plotter:
             self.mNodeX.append("")
             self.mNodeY.append("")
             self.ColorBar.append("")
+            self.Mesh2D.append(None)
 
     def Add2DPlot(self, iplot, title, Xlable, Ylabel, mnodeX, mnodeY, isplotLegend):
         """""
@@ -104,6 +126,7 @@ class Plotter:
         :return: void
         """
 
+        self.WaitForRender()
         if iplot <= 0:
             print("Critical Error: " + str(iplot) + " must be greater than 0.")
             exit(1)
@@ -120,6 +143,7 @@ class Plotter:
             self.isSubPlotLege.append(isplotLegend)
             print("Plot " + str(title) + " created successfully.")
             self.ColorBar.append("")
+            self.Mesh2D.append(None)
 
             # add dummy stuff
             self.SubPlotYScale.append("")
@@ -135,6 +159,7 @@ class Plotter:
         :return: void
         """
 
+        self.WaitForRender()
         if not (iplot > 0 and iplot <= self.mPlot):
             print("Critical Error: " + str(iplot) + " does not exist.")
             exit(1)
@@ -153,81 +178,190 @@ class Plotter:
             # If the y data is just a single list then plot straight.
             subPlotLabel = []
             if len(label) <= 1:
-                subPlotLabel.append(self.SubPlot[iplot].plot(dataX, dataY, "k" + str(self.SubPlotYMarker[0]), label=label))
+                subPlotLabel.append(self.SubPlot[iplot].plot(dataX, dataY, "k" + str(self.SubPlotYMarker[iplot]), label=label))
                 if self.isSubPlotLege[iplot]:
                     handles, labels = self.SubPlot[iplot].get_legend_handles_labels()
                     self.SubPlot[iplot].legend(handles[::-1], labels[::-1])
             else:
                 for igraph in range(0, len(label)):
                     colours = ["k", "b", "r", "g", "c"]
-                    subPlotLabel.append(self.SubPlot[iplot].plot(dataX, dataY[igraph], colours[igraph] + str(self.SubPlotYMarker[igraph]), label=label[igraph]))
+                    subPlotLabel.append(self.SubPlot[iplot].plot(dataX, dataY[igraph], colours[igraph] + str(self.SubPlotYMarker[iplot]), label=label[igraph]))
                     if self.isSubPlotLege[iplot]:
                         handles, labels = self.SubPlot[iplot].get_legend_handles_labels()
                         self.SubPlot[iplot].legend(handles[::-1], labels[::-1])
 
             self.SubPlot[iplot].grid()
 
-    def Update2DPlotData(self, iplot, phi, variableName):
+    def Update2DPlotData(self, iplot, phi, variableName, colourLimits=None):
         """
         Add a 2D colour contour plot to the window
+        After the first visit only the colours of the existing mesh are replaced, cheap enough to call every iteration of a solve.
         :param iplot: The graph number to be updated
-        :param phi: The value of the variable. phi is assumed to be [phi(0,0), phi(1,0), .., phi(mnodeX - 1,0), phi(mnodeX,0), .. phi(2*mnodeX - 1,0), ...]
+        :param phi: The value of the variable, a node table field of shape (mnodeX, mnodeY, 1) or an array of shape (mnodeX, mnodeY).
         :param variableName: The name of the variable you are plotting, will be used on the color bar.
+        :param colourLimits: Fixed (min, max) of the colour bar, None follows the field. Fixed limits let live updates redraw only the plot area.
         :return: void
         """
+        self.WaitForRender()
         if not (iplot > 0 and iplot <= self.mPlot):
             print("Critical Error: " + str(iplot) + " does not exist.")
             exit(1)
         else:
             iplot = iplot - 1
+
+            # (mnodeY, mnodeX) view of the field, for a node table field this is the buffer plane itself so nothing is copied.
+            field = np.asarray(phi)
+            if field.ndim == 3:
+                field = field[:, :, 0]
+            field = field.T
+            if colourLimits is None:
+                colourLimits = (np.min(field), np.max(field))
+
+            # Never draw more samples than the plot has pixels.
+            plotSize = self.SubPlot[iplot].get_window_extent()
+            field = DecimateField(field, max(int(plotSize.height), 1), max(int(plotSize.width), 2))
+
+            if self.Mesh2D[iplot] is not None and self.Mesh2D[iplot].get_array().shape == field.shape:
+                # Replace the colours of the existing artist, the colour bar follows the mesh's limits.
+                islimitChanged = tuple(self.Mesh2D[iplot].get_clim()) != tuple(colourLimits)
+                self.Mesh2D[iplot].set_array(field)
+                self.Mesh2D[iplot].set_clim(*colourLimits)
+                self.ColorBar[iplot].set_label(variableName)
+                self.RefreshSubPlot(iplot, islimitChanged)
+                return
+
             coorX = np.linspace(0.0, 1.0, self.mNodeX[iplot])
             coorY = np.linspace(0.0, 1.0, self.mNodeY[iplot])
-            phiNew = []
-
-            # Create a 2D array for scalar field
-            inode = 0
-            for iy in range(self.mNodeY[iplot]):
-                phiRow = []
-                for ix in range(self.mNodeX[iplot]):
-                    phiRow.append(phi[ix][iy][0])
-                    inode = inode + 1
-                phiNew.append(phiRow)
-
-            # Set up points for plotting
+
+            # Set up points for plotting, spread evenly over the domain when the field has been decimated.
             self.SubPlot[iplot].clear()
-            for i in self.SubPlot[iplot].collections[:]:
-                self.SubPlot[iplot].collections.remove(i)
-            X, Y = np.meshgrid(coorX, coorY)
+            X, Y = np.meshgrid(np.linspace(0.0, 1.0, field.shape[1]), np.linspace(0.0, 1.0, field.shape[0]))
 
-            self.SubPlot[iplot].pcolormesh(X, Y, phiNew, shading = 'gouraud')
+            self.Mesh2D[iplot] = self.SubPlot[iplot].pcolormesh(X, Y, field, shading = 'gouraud', vmin=colourLimits[0], vmax=colourLimits[1])
             self.SubPlot[iplot].set_xlabel("x co-ordinate")
             self.SubPlot[iplot].set_ylabel("y co-ordinate")
 
-            # On first visit set up the color bar, other wise just find new max and min.
+            # On first visit set up the color bar, other wise point it at the new mesh.
             if self.ColorBar[iplot] == "":
-                self.ColorBar[iplot] = self.GraphWind.colorbar((self.SubPlot[iplot].pcolormesh(X, Y, phiNew, shading = 'gouraud')), ax=self.SubPlot[iplot])
+                self.ColorBar[iplot] = self.GraphWind.colorbar(self.Mesh2D[iplot], ax=self.SubPlot[iplot])
             else:
-                self.ColorBar[iplot].set_clim(vmax=np.max(phi[:]), vmin=np.min(phi[:]))
-                self.ColorBar[iplot].draw_all()
+                self.ColorBar[iplot].update_normal(self.Mesh2D[iplot])
             self.ColorBar[iplot].set_label(variableName)
             self.SubPlot[iplot].set_title(self.SubPlotTitle[iplot] + '\n')
 
-            # Add grid lines if requested
-            self.SubPlot[iplot].grid(True, which='minor', axis='both', linestyle='-', color='k')
-            self.SubPlot[iplot].set_xticks(coorX, minor=True)
-            self.SubPlot[iplot].set_yticks(coorY, minor=True)
+            # Add grid lines if requested, one per node line would hide the field on large meshes.
+            if max(self.mNodeX[iplot], self.mNodeY[iplot]) <= GridLineNodeLimit:
+                self.SubPlot[iplot].grid(True, which='minor', axis='both', linestyle='-', color='k')
+                self.SubPlot[iplot].set_xticks(coorX, minor=True)
+                self.SubPlot[iplot].set_yticks(coorY, minor=True)
             self.SubPlot[iplot].set_xlim(coorX[0], coorX[len(coorX) - 1])
             self.SubPlot[iplot].set_ylim(coorY[0], coorY[len(coorY) - 1])
 
+    def RefreshSubPlot(self, iplot, islimitChanged):
+        """
+        Shows an updated 2D plot in an open window. When the colour limits are unchanged only the plot area is redrawn and blitted,
+        otherwise a full redraw is requested for the next time the window's event loop runs.
+        :param iplot: The graph index (from 0).
+        :param islimitChanged: Whether the colour bar has to be redrawn too.
+        :return: void
+        """
+        # Headless figures are drawn in full when they are saved, windows that have not been shown yet draw on Plot.
+        canvas = self.GraphWind.canvas
+        if self.OutputFile is not None or not self.isDrawn:
+            return
+        if islimitChanged or not canvas.supports_blit:
+            canvas.draw_idle()
+            return
+
+        # The mesh covers the whole axes, so it and the grid lines are drawn over the last frame.
+        subPlot = self.SubPlot[iplot]
+        subPlot.draw_artist(self.Mesh2D[iplot])
+        subPlot.draw_artist(subPlot.xaxis)
+        subPlot.draw_artist(subPlot.yaxis)
+        canvas.blit(subPlot.bbox)
+        canvas.flush_events()
+
     def Plot(self, ainteractive):
         """
-        Actually update the plotting window
+        Actually update the plotting window, headless plotters render to their output file instead.
         :param asleep: number of seconds to sleep for.
         :return: void
         """
         # if asleep != 0:
         #     plt.waitforbuttonpress(timeout = 0)
 
+        if self.OutputFile is not None:
+            self.SaveFigure(self.OutputFile)
+            return
+        from matplotlib import pyplot as plt
         self.GraphWind.canvas.draw()
+        self.isDrawn = True
         plt.show(block=ainteractive)
 
+    def SaveFigure(self, fileName, isbackground=True):
+        """
+        Renders the figure to an image file, the format (eg png or svg) follows the file extension.
+        :param fileName: File to write, its directory is created if needed.
+        :param isbackground: When true rendering runs on the background thread and this returns straight away.
+        :return: A future that completes once the file is written.
+        """
+        global RenderExecutor
+
+        self.WaitForRender()
+        directory = os.path.dirname(os.path.abspath(fileName))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        if RenderExecutor is None:
+            RenderExecutor = ThreadPoolExecutor(max_workers=1)
+        self.PendingRender = RenderExecutor.submit(self.GraphWind.savefig, fileName)
+        if not isbackground:
+            self.WaitForRender()
+        return self.PendingRender
+
+    def WaitForRender(self):
+        """
+        Blocks until this plotter's last background render has finished, the figure must not change while it renders.
+        Errors raised while rendering are raised here.
+        :return: void
+        """
+        if self.PendingRender is not None:
+            pendingRender = self.PendingRender
+            self.PendingRender = None
+            pendingRender.result()
+
+
+def DecimateField(field, maxRows, maxColumns):
+    """
+    Reduces a 2D field to at most maxRows by maxColumns samples for display, keeping every local extreme.
+    Each block of rows and columns is replaced by its minimum and maximum side by side, so peaks and the colour range survive.
+    :param field: Array of shape (rows, columns), eg (mnodeY, mnodeX).
+    :param maxRows: Largest number of output rows.
+    :param maxColumns: Largest number of output columns, at least 2.
+    :return: The field itself when it is small enough, otherwise the decimated field.
+    """
+    numberRows, numberColumns = field.shape
+    if numberRows <= maxRows and numberColumns <= maxColumns:
+        return field
+
+    # Block sizes, each block of columns gives two output columns.
+    blockRows = -(-numberRows//maxRows)
+    blockColumns = max(-(-2*numberColumns//maxColumns), 1)
+    numberBlockRows = -(-numberRows//blockRows)
+    numberBlockColumns = -(-numberColumns//blockColumns)
+
+    # Pad partial blocks by repeating the last row and column, then reduce each block.
+    padded = np.pad(field, ((0, numberBlockRows*blockRows - numberRows), (0, numberBlockColumns*blockColumns - numberColumns)), mode='edge')
+    blocks = padded.reshape(numberBlockRows, blockRows, numberBlockColumns, blockColumns)
+    decimated = np.empty((numberBlockRows, 2*numberBlockColumns), dtype=field.dtype)
+    decimated[:, 0::2] = blocks.min(axis=(1, 3))
+    decimated[:, 1::2] = blocks.max(axis=(1, 3))
+    return decimated
+
+
+def WaitForAllRenders():
+    """
+    Blocks until every background render submitted so far has been written, eg at the end of a batch run.
+    :return: void
+    """
+    if RenderExecutor is not None:
+        RenderExecutor.submit(lambda: None).result()
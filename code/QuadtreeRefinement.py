@@ -0,0 +1,282 @@
+'''
+File Name: QuadtreeRefinement.py
+Description: Block structured adaptive refinement, a quadtree of square blocks of cells refined where the truncation error is largest.
+Author: Bevan Jones
+Copyright Notice:
+This file is property of the University of Cape Town
+You may download or copy this file for use in your own program.
+You may NOT download or copy this file to another site.
+You may NOT download or copy this file for publication or sale.
+This file is intended for teaching purposes.
+'''
+
+import time
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+import Discretisation as dc
+import ErrorAnalysis as ea
+import NodeTable as nt
+
+# Block sides as (step in x, step in y), a block is only ever one level coarser or finer than the blocks across its sides.
+BlockSides = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+
+
+class RefinementBlock:
+    __slots__ = ['Level', 'IndexX', 'IndexY', 'Table', 'Offset', 'ErrorEstimate']
+
+    def __init__(self, level, indexX, indexY, blockCells):
+        """
+        A square block of blockCells x blockCells cells, the (indexX, indexY) block of the 2^level x 2^level tiling of the unit square.
+        The block's node table holds the cell centres, cell sizes, volumes and solved temperatures of its cells.
+        """
+        self.Level = level
+        self.IndexX = indexX
+        self.IndexY = indexY
+        self.Offset = 0
+        self.ErrorEstimate = 0.0
+
+        cellSize = 0.5**level/blockCells
+        centres = (np.arange(blockCells) + 0.5)*cellSize
+        self.Table = nt.NodeTable()
+        self.Table.Diffusion2D(blockCells, blockCells)
+        self.Table.Coordinate[:, :, 0] = (indexX*0.5**level + centres)[:, np.newaxis]
+        self.Table.Coordinate[:, :, 1] = (indexY*0.5**level + centres)[np.newaxis, :]
+        self.Table.CellSize[:, :, :] = cellSize
+        self.Table.Volume[:, :, 0] = cellSize**2
+
+    def CellSize(self):
+
+        return float(self.Table.CellSize[0, 0, 0])
+
+    def EdgeCells(self, side):
+        """
+        Unknown numbers of the row of cells along one side of the block, in order along the side.
+        :param side: (step in x, step in y) pointing out of the block, one of BlockSides.
+        """
+        blockCells = len(self.Table.Coordinate)
+        along = np.arange(blockCells)
+        if side[0] != 0:
+            return self.Offset + (0 if side[0] < 0 else blockCells - 1) + along*blockCells
+        return self.Offset + along + (0 if side[1] < 0 else blockCells - 1)*blockCells
+
+
+class BlockHierarchy:
+    def __init__(self, blockCells=8, maxLevel=6):
+        """
+        Quadtree of blocks over the unit square, starting from one block. Only the leaves are kept, keyed by (level, index x, index y),
+        and neighbouring leaves never differ by more than one level so each coarse cell side meets at most two fine cells.
+        The heat diffusion equation is discretised cell centred over the leaves with Dirichlet walls at T = 0 (the boundary of the node solvers).
+        Fluxes across a coarse-fine interface are computed once, on the fine side, and added to both cells so the scheme stays conservative.
+        :param blockCells: Cells along each side of a block, at least 5 for the error estimate.
+        :param maxLevel: Blocks on this level are never split.
+        """
+        if blockCells < 5:
+            print("Critical Error: blocks of " + str(blockCells) + " cells are too small, the error estimate needs at least 5 cells along each side.")
+            exit(1)
+        self.BlockCells = blockCells
+        self.MaxLevel = maxLevel
+        self.Blocks = {(0, 0, 0): RefinementBlock(0, 0, 0, blockCells)}
+        self.ErrorNorms = None
+        self.SolveTime = 0.0
+
+    def NumberofCells(self):
+
+        return len(self.Blocks)*self.BlockCells**2
+
+    def FindLeaf(self, level, indexX, indexY):
+        """
+        The leaf covering block (indexX, indexY) of a level, None when that block is split into finer leaves or lies outside the square.
+        """
+        if not (0 <= indexX < 2**level and 0 <= indexY < 2**level):
+            return None
+        for coarserLevel in range(level, -1, -1):
+            shift = level - coarserLevel
+            block = self.Blocks.get((coarserLevel, indexX >> shift, indexY >> shift))
+            if block is not None:
+                return block
+        return None
+
+    def Split(self, key):
+
+        level, indexX, indexY = key
+        del self.Blocks[key]
+        for childX in range(2):
+            for childY in range(2):
+                childKey = (level + 1, 2*indexX + childX, 2*indexY + childY)
+                self.Blocks[childKey] = RefinementBlock(childKey[0], childKey[1], childKey[2], self.BlockCells)
+
+    def Refine(self, keys):
+        """
+        Splits the given leaves into four, then splits any leaf more than one level coarser than a neighbour until the tree is balanced.
+        :param keys: (level, index x, index y) of the leaves to split, leaves on MaxLevel are skipped.
+        :return: Number of leaves split.
+        """
+        numberofSplits = 0
+        pending = [key for key in keys if key in self.Blocks and key[0] < self.MaxLevel]
+        while pending:
+            for key in pending:
+                if key in self.Blocks:
+                    self.Split(key)
+                    numberofSplits += 1
+            pending = set()
+            for level, indexX, indexY in self.Blocks:
+                for side in BlockSides:
+                    neighbour = self.FindLeaf(level, indexX + side[0], indexY + side[1])
+                    if neighbour is not None and neighbour.Level < level - 1:
+                        pending.add((neighbour.Level, neighbour.IndexX, neighbour.IndexY))
+        return numberofSplits
+
+    def Assemble(self, thermalConduct):
+        """
+        Assembles the volume integrated cell centred system over every leaf, cells numbered block by block with x fastest within a block.
+        At a coarse-fine interface the coarse value facing each fine cell is interpolated along the interface from the coarse cell and
+        its neighbours along the side, and the flux through the fine cell's face is taken from the fine cell to that point.
+        :param thermalConduct: The thermal conductivity.
+        :return: CSR matrix, right hand side
+        """
+        blockCells = self.BlockCells
+        numberofCells = self.NumberofCells()
+        for iblock, key in enumerate(sorted(self.Blocks)):
+            self.Blocks[key].Offset = iblock*blockCells**2
+
+        rows, columns, values = [], [], []
+
+        def AddFlux(cells, coefficient, neighbourColumns, neighbourWeights, neighbourRows):
+            # Flux coefficient*(T_cell - sum weight*T_neighbour) out of each cell, and into the neighbour row when there is one.
+            ones = np.ones(len(cells))
+            rows.append(cells)
+            columns.append(cells)
+            values.append(coefficient*ones)
+            for neighbourColumn, weight in zip(neighbourColumns, neighbourWeights):
+                rows.append(cells)
+                columns.append(neighbourColumn)
+                values.append(-coefficient*weight*ones)
+                if neighbourRows is not None:
+                    rows.append(neighbourRows)
+                    columns.append(neighbourColumn)
+                    values.append(coefficient*weight*ones)
+            if neighbourRows is not None:
+                rows.append(neighbourRows)
+                columns.append(cells)
+                values.append(-coefficient*ones)
+
+        rhs = np.zeros(numberofCells)
+        cellIndex = np.arange(blockCells**2).reshape((blockCells, blockCells), order='F')
+        for key, block in self.Blocks.items():
+            table = block.Table
+            rhs[block.Offset:block.Offset + blockCells**2] = (dc.SourceFunction(table.Coordinate[:, :, 0], table.Coordinate[:, :, 1])*table.Volume[:, :, 0]).ravel(order='F')
+
+            # Faces inside the block, a face of width h between centres h apart.
+            AddFlux(block.Offset + cellIndex[:-1, :].ravel(), thermalConduct, [block.Offset + cellIndex[1:, :].ravel()], [1.0], block.Offset + cellIndex[1:, :].ravel())
+            AddFlux(block.Offset + cellIndex[:, :-1].ravel(), thermalConduct, [block.Offset + cellIndex[:, 1:].ravel()], [1.0], block.Offset + cellIndex[:, 1:].ravel())
+
+            for side in BlockSides:
+                cells = block.EdgeCells(side)
+                opposite = (-side[0], -side[1])
+                level, indexX, indexY = key
+                if not (0 <= indexX + side[0] < 2**level and 0 <= indexY + side[1] < 2**level):
+                    # Wall half a cell away at T = 0, the wall gradient from the quadratic through the wall and the two cells inside it.
+                    AddFlux(cells, 3.0*thermalConduct, [cells - side[0] - side[1]*blockCells], [1.0/9.0], None)
+                    continue
+                neighbour = self.FindLeaf(level, indexX + side[0], indexY + side[1])
+                if neighbour is None:
+                    # Finer neighbour, its side owns these faces.
+                    continue
+                if neighbour.Level == level:
+                    if side[0] + side[1] > 0:
+                        neighbourCells = neighbour.EdgeCells(opposite)
+                        AddFlux(cells, thermalConduct, [neighbourCells], [1.0], neighbourCells)
+                    continue
+
+                # Coarse neighbour, this block's side covers half of its side. The coarse value facing each fine cell, a quarter of a
+                # coarse cell along the side from the coarse centre, is the quadratic through three coarse cells along the side, and the
+                # face gradient is the quadratic through it and the two fine cells inside the face, 1.5 and 0.5 fine cells from the face.
+                coarseCells = neighbour.EdgeCells(opposite)
+                half = (indexY if side[0] != 0 else indexX) % 2
+                fineAlong = half*blockCells + np.arange(blockCells)
+                coarseAlong = fineAlong//2
+                coarseStart = np.clip(coarseAlong - 1, 0, blockCells - 3)
+                position = (fineAlong + 0.5)/2.0 - 0.5 - coarseStart
+                coarseWeights = [0.5*(position - 1.0)*(position - 2.0), -position*(position - 2.0), 0.5*position*(position - 1.0)]
+                AddFlux(cells, thermalConduct/3.0, [cells - side[0] - side[1]*blockCells] + [coarseCells[coarseStart + ipoint] for ipoint in range(3)],
+                        [-0.6] + [1.6*weight for weight in coarseWeights], coarseCells[coarseAlong])
+
+        matrix = sp.coo_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))), shape=(numberofCells, numberofCells)).tocsr()
+        return matrix, rhs
+
+    def Solve(self, thermalConduct):
+        """
+        Solves the composite system of every leaf with a sparse LU factorisation, then fills each block's temperatures and error fields.
+        :param thermalConduct: The thermal conductivity.
+        :return: Error norms over the whole square, a record of ErrorAnalysis.ErrorNormType (MaxErrorColumn and MaxErrorRow are within the block).
+        """
+        startTime = time.perf_counter()
+        matrix, rhs = self.Assemble(thermalConduct)
+        temperature = spla.splu(matrix.tocsc(), permc_spec="MMD_AT_PLUS_A").solve(rhs)
+        self.SolveTime = time.perf_counter() - startTime
+
+        blockCells = self.BlockCells
+        self.ErrorNorms = np.zeros((), dtype=ea.ErrorNormType)
+        self.ErrorNorms['MaxError'] = -1.0
+        sumSquareVolume = 0.0
+        sumSquare = 0.0
+        for block in self.Blocks.values():
+            table = block.Table
+            table.TemperatureNP1[:, :, 0] = temperature[block.Offset:block.Offset + blockCells**2].reshape((blockCells, blockCells), order='F')
+            table.ErrorNorms = ea.ComputeErrorNorms(table.Coordinate, table.TemperatureNP1, table.Volume,
+                                                    table.AbsoluteError[:, :, 0], table.AnalyticalSolution[:, :, 0])
+            self.ErrorNorms['L1Error'] += table.ErrorNorms['L1Error']
+            sumSquareVolume += table.ErrorNorms['L2Error']**2
+            sumSquare += table.ErrorNorms['RMSError']**2*blockCells**2
+            if table.ErrorNorms['MaxError'] > self.ErrorNorms['MaxError']:
+                for field in ['MaxError', 'MaxErrorColumn', 'MaxErrorRow', 'MaxErrorX', 'MaxErrorY']:
+                    self.ErrorNorms[field] = table.ErrorNorms[field]
+        self.ErrorNorms['L2Error'] = np.sqrt(sumSquareVolume)
+        self.ErrorNorms['RMSError'] = np.sqrt(sumSquare/self.NumberofCells())
+        return self.ErrorNorms
+
+    def EstimateErrors(self, thermalConduct):
+        """
+        Estimates the truncation error of each block from its solved temperatures, k h^2 (T_xxxx + T_yyyy)/12 for the five point
+        stencil, with the fourth derivatives taken as fourth differences inside the block. Needs no analytical solution.
+        :param thermalConduct: The thermal conductivity.
+        :return: Dictionary of the largest estimate in each block, also stored in block.ErrorEstimate.
+        """
+        estimates = {}
+        for key, block in self.Blocks.items():
+            temperature = block.Table.TemperatureNP1[:, :, 0]
+            differenceX = temperature[:-4] - 4.0*temperature[1:-3] + 6.0*temperature[2:-2] - 4.0*temperature[3:-1] + temperature[4:]
+            differenceY = temperature[:, :-4] - 4.0*temperature[:, 1:-3] + 6.0*temperature[:, 2:-2] - 4.0*temperature[:, 3:-1] + temperature[:, 4:]
+            truncationError = thermalConduct*(differenceX[:, 2:-2] + differenceY[2:-2, :])/(12.0*block.CellSize()**2)
+            block.ErrorEstimate = float(np.amax(np.abs(truncationError)))
+            estimates[key] = block.ErrorEstimate
+        return estimates
+
+
+def RefineToTolerance(thermalConduct, errorTolerance, blockCells=8, maxLevel=6, refineFraction=0.5, isquiet=True):
+    """
+    Solves, estimates the error of each block and splits the blocks whose estimate exceeds refineFraction of the largest,
+    until the maximum error against the analytical solution meets the tolerance or no block can be split.
+    :param thermalConduct: The thermal conductivity.
+    :param errorTolerance: Largest acceptable maximum absolute error.
+    :param blockCells: Cells along each side of a block, at least 5.
+    :param maxLevel: Deepest level of the quadtree.
+    :param refineFraction: Threshold for splitting as a fraction of the largest block estimate, 0 refines uniformly.
+    :param isquiet: When false every pass is written out.
+    :return: The solved BlockHierarchy.
+    """
+    hierarchy = BlockHierarchy(blockCells, maxLevel)
+    while True:
+        maxError = hierarchy.Solve(thermalConduct)['MaxError']
+        if not isquiet:
+            print("Blocks: " + str(len(hierarchy.Blocks)) + '\tCells: ' + str(hierarchy.NumberofCells()) + '\tAbsolute error: ' + str(maxError))
+        if maxError <= errorTolerance:
+            break
+        # Blocks already on the deepest level cannot be split, the threshold comes from the rest.
+        estimates = {key: estimate for key, estimate in hierarchy.EstimateErrors(thermalConduct).items() if key[0] < maxLevel}
+        if not estimates:
+            break
+        threshold = refineFraction*max(estimates.values())
+        hierarchy.Refine([key for key, estimate in estimates.items() if estimate >= threshold])
+    return hierarchy
@@ -0,0 +1,190 @@
+'''
+File Name: RefinementStudy.py
+Description: Mesh refinement studies run in parallel over a process pool.
+Author: Bevan Jones
+Copyright Notice:
+This file is property of the University of Cape Town
+You may download or copy this file for use in your own program.
+You may NOT download or copy this file to another site.
+You may NOT download or copy this file for publication or sale.
+This file is intended for teaching purposes.
+'''
+
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import MeshGenerator as mg
+import ErrorAnalysis as ea
+from DiffusionSolver import ImplicitDiffusion
+
+# One row per mesh of a refinement study.
+StudyResultType = np.dtype([('MeshSize', int), ('Nodes', int), ('MaxError', float), ('L2Error', float),
+                            ('MaxErrorOrder', float), ('L2ErrorOrder', float), ('SolveTime', float), ('Iterations', int)])
+
+
+def SolveRefinementTable(meshSize, thermalConduct, solverType, stretchFactor, initialTable=None):
+    """
+    Solves one mesh of the study and keeps the node table, eg to warm start the next finer mesh from it.
+    :param meshSize: Number of nodes in each direction.
+    :param thermalConduct: The thermal conductivity.
+    :param solverType: Solver passed to ImplicitDiffusion.
+    :param stretchFactor: Stretch factor applied in both directions, or a (x, y) pair.
+    :param initialTable: Solved node table interpolated onto this mesh as the iterative solvers' initial guess, None starts from zero.
+    :return: node table, solve time
+    """
+    startTime = time.perf_counter()
+    stretchFactorX, stretchFactorY = np.broadcast_to(stretchFactor, 2)
+    nodeTable = mg.GenerateMesh2DMesh(meshSize, meshSize, stretchFactorX, stretchFactorY)
+    nodeTable = ImplicitDiffusion(nodeTable, thermalConduct, True, solverType, factorisationCache=None, initialTable=initialTable, isstoreErrorFields=False)
+    return nodeTable, time.perf_counter() - startTime
+
+
+def SolveRefinementLevel(meshSize, thermalConduct, solverType, stretchFactor, initialTable=None):
+    """
+    Solves one mesh of the study, only the error norms are returned so no fields cross the process boundary.
+    :param meshSize: Number of nodes in each direction.
+    :param thermalConduct: The thermal conductivity.
+    :param solverType: Solver passed to ImplicitDiffusion.
+    :param stretchFactor: Stretch factor applied in both directions.
+    :param initialTable: See SolveRefinementTable.
+    :return: meshSize, maximum error, L2 error, solve time, iterations (0 for the direct solvers)
+    """
+    nodeTable, solveTime = SolveRefinementTable(meshSize, thermalConduct, solverType, stretchFactor, initialTable)
+    return LevelSummary(meshSize, nodeTable, solveTime)
+
+
+def LevelSummary(meshSize, nodeTable, solveTime):
+
+    return (meshSize, float(nodeTable.ErrorNorms['MaxError']), float(nodeTable.ErrorNorms['L2Error']), solveTime, max(len(nodeTable.ResidualHistory) - 1, 0))
+
+
+def LimitWorkerMemory(memoryLimit):
+
+    # Caps the address space of a worker so one oversized mesh fails alone instead of exhausting the node.
+    try:
+        import resource
+    except ImportError:
+        return
+    resource.setrlimit(resource.RLIMIT_AS, (memoryLimit, memoryLimit))
+
+
+def RunRefinementStudy(meshSizes, thermalConduct, solverType="fast", stretchFactor=1.0, maxWorkers=None, memoryLimitPerWorker=None, iswarmStart=False):
+    """
+    Solves every mesh size in a process pool and reports the errors and observed order of accuracy.
+    With a warm start the meshes are solved serially, coarse to fine, each starting from the previous solution.
+    :param meshSizes: Number of nodes in each direction for each mesh.
+    :param thermalConduct: The thermal conductivity.
+    :param solverType: Solver passed to ImplicitDiffusion.
+    :param stretchFactor: Stretch factor applied in both directions.
+    :param maxWorkers: Number of worker processes, None uses every core, 0 solves serially in this process.
+    :param memoryLimitPerWorker: Address space limit of each worker in bytes (where supported), None for no limit.
+    :param iswarmStart: When true each iterative solve starts from the previous mesh's solution interpolated onto the new mesh.
+    :return: Structured array of StudyResultType sorted by mesh size.
+    """
+    meshSizes = sorted(meshSizes)
+    if iswarmStart:
+        levels = []
+        nodeTable = None
+        for meshSize in meshSizes:
+            nodeTable, solveTime = SolveRefinementTable(meshSize, thermalConduct, solverType, stretchFactor, nodeTable)
+            levels.append(LevelSummary(meshSize, nodeTable, solveTime))
+    elif maxWorkers == 0:
+        levels = [SolveRefinementLevel(meshSize, thermalConduct, solverType, stretchFactor) for meshSize in meshSizes]
+    else:
+        # Fork where available, spawning would re-run the caller's module level code in every worker.
+        context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+        initializer = LimitWorkerMemory if memoryLimitPerWorker is not None else None
+        with ProcessPoolExecutor(max_workers=maxWorkers, mp_context=context, initializer=initializer,
+                                 initargs=(memoryLimitPerWorker,) if initializer is not None else ()) as executor:
+            futures = [executor.submit(SolveRefinementLevel, meshSize, thermalConduct, solverType, stretchFactor) for meshSize in meshSizes]
+            levels = [future.result() for future in futures]
+
+    results = np.zeros(len(levels), dtype=StudyResultType)
+    for ilevel, (meshSize, maxError, l2Error, solveTime, iterations) in enumerate(levels):
+        results[ilevel] = (meshSize, meshSize**2, maxError, l2Error, np.nan, np.nan, solveTime, iterations)
+
+    # Observed order between successive meshes, error ~ h^p with h = 1/(meshSize - 1).
+    spacing = 1.0/(results['MeshSize'] - 1.0)
+    logSpacingRatio = np.log(spacing[:-1]/spacing[1:])
+    results['MaxErrorOrder'][1:] = np.log(results['MaxError'][:-1]/results['MaxError'][1:])/logSpacingRatio
+    results['L2ErrorOrder'][1:] = np.log(results['L2Error'][:-1]/results['L2Error'][1:])/logSpacingRatio
+    return results
+
+
+def PrintRefinementStudy(results):
+    """
+    Writes out the study table and the least squares order of accuracy against number of nodes per direction.
+    :param results: Output of RunRefinementStudy.
+    :return: void
+    """
+    print("\nMesh Size\tMax error\tOrder\tL2 error\tOrder\tSolve time (s)\tIterations")
+    for row in results:
+        print(str(row['MeshSize']) + 'x' + str(row['MeshSize']) + '\t\t' + '%.4e' % row['MaxError'] + '\t' + '%.2f' % row['MaxErrorOrder'] + '\t'
+              + '%.4e' % row['L2Error'] + '\t' + '%.2f' % row['L2ErrorOrder'] + '\t' + '%.4f' % row['SolveTime'] + '\t\t' + str(row['Iterations']))
+    print('Fitted order of accuracy (max error): ' + str(ea.ComputeErrorL2Norm(results['MaxError'], results['MeshSize'])))
+
+
+def SearchMeshSize(thermalConduct, errorTolerance, minimumMeshSize, solverType="fast", isquiet=True, iswarmStart=False, cellRatios=(1.0, 1.0)):
+    """
+    Finds the smallest mesh size (nodes per direction) whose maximum error meets the tolerance.
+    Fits error ~ C h^p to the solves so far to predict the answer, then bisects to confirm it,
+    giving the same answer as growing the mesh one node at a time when the error decreases with mesh size.
+    :param thermalConduct: The thermal conductivity.
+    :param errorTolerance: Largest acceptable maximum absolute error.
+    :param minimumMeshSize: Smallest mesh size to consider.
+    :param solverType: Solver passed to ImplicitDiffusion.
+    :param isquiet: When false every solve is written out.
+    :param iswarmStart: When true each iterative solve starts from the solution of the closest mesh size solved so far.
+    :param cellRatios: (x, y) ratios of the last to the first cell width, every mesh size is stretched to keep them, see MeshOptimiser.
+    :return: mesh size, its maximum error, number of solves performed
+    """
+    maxErrors = {}
+    nodeTables = {}
+
+    def MaxError(meshSize):
+        if meshSize not in maxErrors:
+            initialTable = nodeTables[min(nodeTables, key=lambda solvedSize: abs(solvedSize - meshSize))] if nodeTables else None
+            stretchFactors = [mg.StretchFactorForCellRatio(meshSize, cellRatio) for cellRatio in cellRatios]
+            nodeTable, solveTime = SolveRefinementTable(meshSize, thermalConduct, solverType, stretchFactors, initialTable)
+            meshSize, maxErrors[meshSize], l2Error, solveTime, iterations = LevelSummary(meshSize, nodeTable, solveTime)
+            if iswarmStart:
+                nodeTables[meshSize] = nodeTable
+            if not isquiet:
+                print("Mesh Size: " + str(meshSize) + 'x' + str(meshSize) + '\tAbsolute error: ' + str(maxErrors[meshSize]) + '\tIterations: ' + str(iterations))
+        return maxErrors[meshSize]
+
+    if MaxError(minimumMeshSize) <= errorTolerance:
+        return minimumMeshSize, maxErrors[minimumMeshSize], len(maxErrors)
+
+    # Predict from the convergence rate until a passing mesh is found, lower is always a failing mesh.
+    lower = minimumMeshSize
+    probe = 2*minimumMeshSize - 1
+    while MaxError(probe) > errorTolerance:
+        lower = probe
+        probe = PredictMeshSize(maxErrors, errorTolerance, lower)
+    upper = probe
+
+    # Check just below the prediction first, it is usually the bracket, then bisect.
+    if upper - 1 > lower and MaxError(upper - 1) > errorTolerance:
+        lower = upper - 1
+    while upper - lower > 1:
+        middle = (lower + upper)//2
+        if MaxError(middle) <= errorTolerance:
+            upper = middle
+        else:
+            lower = middle
+    return upper, maxErrors[upper], len(maxErrors)
+
+
+def PredictMeshSize(maxErrors, errorTolerance, failedMeshSize):
+
+    # Fit log(error) = log(C) + p log(h) to the two finest solves so far.
+    meshSizes = sorted(maxErrors)[-2:]
+    spacing = 1.0/(np.array(meshSizes) - 1.0)
+    logErrors = np.log([maxErrors[meshSize] for meshSize in meshSizes])
+    order = (logErrors[1] - logErrors[0])/np.log(spacing[1]/spacing[0])
+    if not np.isfinite(order) or order <= 0.0:
+        return 2*failedMeshSize - 1
+    targetSpacing = spacing[1]*(errorTolerance/maxErrors[meshSizes[1]])**(1.0/order)
+    return max(failedMeshSize + 1, int(np.ceil(1.0/targetSpacing + 1.0)))
@@ -10,11 +10,36 @@ You may NOT download or copy this file for publication or sale.
 This file is intended for teaching purposes.
 '''
 
+import os
+import sys
+import tempfile
+import subprocess
 import unittest
 import numpy as np
+import scipy.sparse.linalg as spla
 import MeshGenerator as mg
 import Discretisation as dc
 import ErrorAnalysis as ea
+import NodeTable as nt
+import DiffusionSolver as ds
+import FactorisationCache as fc
+import Multigrid as mgs
+import FastPoissonSolver as fps
+import Plotter as pl
+import Benchmarks as bm
+import Instrumentation as ins
+import DomainDecomposition as dd
+import IterativeSolver as its
+import MixedPrecision as mp
+from matplotlib import pyplot as plt
+import RefinementStudy as rs
+import MeshOptimiser as mo
+import QuadtreeRefinement as qr
+import HeatDiffusion as hd
+
+# assertItemsEqual was renamed assertCountEqual in Python 3.
+if not hasattr(unittest.TestCase, 'assertItemsEqual'):
+    unittest.TestCase.assertItemsEqual = unittest.TestCase.assertCountEqual
 
 class TestMeshGenerator(unittest.TestCase):
 
@@ -99,6 +124,84 @@ class TestMeshGenerator(unittest.TestCase):
         self.assertEqual(nodeTable.Volume[1][4], 0.0625)
         self.assertEqual(nodeTable.Volume[2][4], 0.03125)
 
+    def test_GenerateMesh2DMesh_Stretched(self):
+        """
+        Tests that stretched meshes span the unit square with a constant ratio between successive cells.
+        """
+        nodeTable = mg.GenerateMesh2DMesh(6, 5, 1.2, 0.8)
+        spacingX = np.diff(nodeTable.Coordinate[:, 0, 0])
+        spacingY = np.diff(nodeTable.Coordinate[0, :, 1])
+        self.assertAlmostEqual(nodeTable.Coordinate[-1][-1][0], 1.0)
+        self.assertAlmostEqual(nodeTable.Coordinate[-1][-1][1], 1.0)
+        self.assertAlmostEqual(spacingX[0], mg.ComputeInitialNodeSpacing(6, 1.2))
+        np.testing.assert_allclose(spacingX[1:]/spacingX[:-1], 1.2)
+        np.testing.assert_allclose(spacingY[1:]/spacingY[:-1], 0.8)
+        self.assertAlmostEqual(np.sum(nodeTable.Volume), 1.0)
+
+    def test_GenerateMesh2DMesh_SubBlock(self):
+        """
+        Tests that a sub-block of the mesh is identical to the same nodes of the full mesh.
+        """
+        fullTable = mg.GenerateMesh2DMesh(9, 7, 1.1, 0.9)
+        blockTable = mg.GenerateMesh2DMesh(9, 7, 1.1, 0.9, (2, 6, 0, 3))
+        self.assertEqual(blockTable.Coordinate.shape, (4, 3, 2))
+        np.testing.assert_array_equal(blockTable.Coordinate, fullTable.Coordinate[2:6, 0:3])
+        np.testing.assert_array_equal(blockTable.CellSize, fullTable.CellSize[2:6, 0:3])
+        np.testing.assert_array_equal(blockTable.Volume, fullTable.Volume[2:6, 0:3])
+
+class TestNodeTable(unittest.TestCase):
+
+    def test_Diffusion2D_Layout(self):
+        """
+        Checks the node table fields share one buffer, the temperature vector is in matrix order and error fields are lazy.
+        """
+        nodeTable = nt.NodeTable()
+        nodeTable.Diffusion2D(4, 3)
+        self.assertEqual(nodeTable.Coordinate.shape, (4, 3, 2))
+        self.assertEqual(nodeTable.TemperatureNP1.shape, (4, 3, 1))
+        self.assertTrue(np.shares_memory(nodeTable.Coordinate, nodeTable.Buffer))
+        self.assertTrue(np.shares_memory(nodeTable.Volume, nodeTable.Buffer))
+        self.assertIsNone(nodeTable._AbsoluteError)
+
+        nodeTable.TemperatureVector()[dc.GetMatrixIndex(3, 1, 4)] = 7.0
+        self.assertEqual(nodeTable.TemperatureNP1[3][1][0], 7.0)
+        self.assertEqual(nodeTable.AbsoluteError.shape, (4, 3, 1))
+        self.assertRaises(AttributeError, setattr, nodeTable, 'UnknownField', 0.0)
+
+    def test_Diffusion2D_SinglePrecision(self):
+        """
+        Checks single precision storage solves to the accuracy of the discretisation.
+        """
+        doubleTable = ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(9, 9), 4.0, True, "sparse")
+        singleTable = ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(9, 9, dataType=np.float32), 4.0, True, "sparse")
+        self.assertEqual(singleTable.TemperatureNP1.dtype, np.float32)
+        self.assertEqual(singleTable.AbsoluteError.dtype, np.float32)
+        np.testing.assert_allclose(singleTable.TemperatureNP1, doubleTable.TemperatureNP1, atol=1.0e-7)
+
+    def test_Diffusion2D_SaveLoad(self):
+        """
+        Checks memory mapped node tables solve in place and checkpoints reopen with every field intact.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            mappedTable = mg.GenerateMesh2DMesh(7, 6, storageDirectory=os.path.join(directory, "mapped"))
+            self.assertIsInstance(mappedTable.Buffer, np.memmap)
+            mappedTable = ds.ImplicitDiffusion(mappedTable, 4.0, True, "cg")
+            self.assertIsInstance(mappedTable.AbsoluteError, np.memmap)
+            mappedTable.Save(os.path.join(directory, "mapped"))
+
+            memoryTable = ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(7, 6), 4.0, True, "cg")
+            memoryTable.Save(os.path.join(directory, "memory"))
+
+            for subDirectory in ["mapped", "memory"]:
+                loadedTable = nt.NodeTable().Load(os.path.join(directory, subDirectory), "r")
+                np.testing.assert_array_equal(loadedTable.Coordinate, memoryTable.Coordinate)
+                np.testing.assert_array_equal(loadedTable.Volume, memoryTable.Volume)
+                np.testing.assert_allclose(loadedTable.TemperatureNP1, memoryTable.TemperatureNP1, atol=1.0e-14)
+                np.testing.assert_allclose(loadedTable.AbsoluteError, memoryTable.AbsoluteError, atol=1.0e-14)
+                self.assertEqual(loadedTable.AnalyticalSolution.shape, (7, 6, 1))
+                self.assertEqual(len(loadedTable.ResidualHistory), len(memoryTable.ResidualHistory))
+                del loadedTable
+
 class TestDiscretisation(unittest.TestCase):
 
     def test_GetMatrixIndex(self):
@@ -164,6 +267,22 @@ class TestDiscretisation(unittest.TestCase):
         deriRow[8] = 1.0
         self.assertItemsEqual(dc.Diffusion2DRow(nodeTable.Coordinate, nodeTable.CellSize, nodeTable.Volume, thermalConduct, 8), deriRow)
 
+    def test_Diffusion2DStencil(self):
+        """
+        Checks the whole mesh stencil coefficients and Dirichlet boundary mask.
+        """
+        nodeTable = mg.GenerateMesh2DMesh(3, 4)
+        coeffCentre, coeffWest, coeffEast, coeffSouth, coeffNorth, isBoundary = dc.Diffusion2DStencil(nodeTable.Coordinate, nodeTable.CellSize, nodeTable.Volume, 5)
+        self.assertEqual(isBoundary.shape, (3, 4))
+        self.assertEqual(np.count_nonzero(~isBoundary), 2)
+        np.testing.assert_allclose(coeffCentre[isBoundary], 1.0)
+        np.testing.assert_allclose(coeffWest[isBoundary], 0.0)
+        np.testing.assert_allclose(coeffWest[1, 1:3], [20.0, 20.0])
+        np.testing.assert_allclose(coeffEast[1, 1:3], [20.0, 20.0])
+        np.testing.assert_allclose(coeffSouth[1, 1:3], [45.0, 45.0])
+        np.testing.assert_allclose(coeffNorth[1, 1:3], [45.0, 45.0])
+        np.testing.assert_allclose(coeffCentre[1, 1:3], [-130.0, -130.0])
+
     def test_ComputeSource(self):
         """
         Tests that the source term is being correctly calculated.
@@ -192,6 +311,15 @@ class TestDiscretisation(unittest.TestCase):
         self.assertAlmostEqual(dc.ComputeSource(nodeCoordinate, 14), 0)
         self.assertAlmostEqual(dc.ComputeSource(nodeCoordinate, 15), 0)
 
+    def test_ComputeSourceField(self):
+        """
+        Checks the whole mesh source field matches the per node source.
+        """
+        nodeTable = mg.GenerateMesh2DMesh(6, 5, 1.1)
+        sourceVector = dc.ComputeSourceField(nodeTable.Coordinate).ravel(order='F')
+        for inode in range(6*5):
+            self.assertAlmostEqual(sourceVector[inode], dc.ComputeSource(nodeTable.Coordinate, inode))
+
 class TestErrorAnalysis(unittest.TestCase):
 
     def test_AnalyicalSolution2D(self):
@@ -222,6 +350,17 @@ class TestErrorAnalysis(unittest.TestCase):
         self.assertAlmostEqual(ea.AnalyicalSolution2D(nodeCoordinate[2][3]), 0)
         self.assertAlmostEqual(ea.AnalyicalSolution2D(nodeCoordinate[3][3]), 0)
 
+    def test_AnalyicalSolution2DField(self):
+        """
+        Checks the whole mesh analytical field matches the per node analytical solution.
+        """
+        nodeTable = mg.GenerateMesh2DMesh(5, 6, 1.0, 0.9)
+        analyticalField = ea.AnalyicalSolution2DField(nodeTable.Coordinate)
+        self.assertEqual(analyticalField.shape, (5, 6))
+        for irow in range(6):
+            for icolu in range(5):
+                self.assertAlmostEqual(analyticalField[icolu][irow], ea.AnalyicalSolution2D(nodeTable.Coordinate[icolu][irow]))
+
     def test_ComputeAbsoluteError(self):
         """
         Checks that the absolute error is computed correctly.
@@ -229,6 +368,77 @@ class TestErrorAnalysis(unittest.TestCase):
         self.assertEqual(ea.ComputeAbsoluteError(10.0, 5.0), 5.0)
         self.assertEqual(ea.ComputeAbsoluteError(-5.0, 5.0), 10.0)
 
+    def test_ComputeErrorNorms(self):
+        """
+        Checks the chunked single pass norms against whole field reductions, in memory and memory mapped.
+        """
+        nodeTable = ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(13, 11, 1.1, 0.95), 4.0, True, "sparse")
+        absoluteError = nodeTable.AbsoluteError[:, :, 0]
+        volume = nodeTable.Volume[:, :, 0]
+        for rowsPerChunk in [None, 1, 4, 11]:
+            norms = ea.ComputeErrorNorms(nodeTable.Coordinate, nodeTable.TemperatureNP1, nodeTable.Volume, rowsPerChunk=rowsPerChunk)
+            self.assertEqual(norms['MaxError'], np.amax(absoluteError))
+            self.assertAlmostEqual(norms['L1Error'], np.sum(absoluteError*volume), 15)
+            self.assertAlmostEqual(norms['L2Error'], ea.ComputeIntegralL2Error(absoluteError, volume), 15)
+            self.assertAlmostEqual(norms['RMSError'], np.sqrt(np.mean(np.square(absoluteError))), 15)
+            icolumn, irow = np.unravel_index(np.argmax(absoluteError), absoluteError.shape)
+            self.assertEqual((norms['MaxErrorColumn'], norms['MaxErrorRow']), (icolumn, irow))
+            self.assertEqual((norms['MaxErrorX'], norms['MaxErrorY']), tuple(nodeTable.Coordinate[icolumn, irow]))
+
+        analyticalSolution = np.zeros((13, 11))
+        ea.ComputeErrorNorms(nodeTable.Coordinate, nodeTable.TemperatureNP1, nodeTable.Volume, analyticalSolution=analyticalSolution, rowsPerChunk=3)
+        np.testing.assert_array_equal(analyticalSolution, nodeTable.AnalyticalSolution[:, :, 0])
+
+        with tempfile.TemporaryDirectory() as directory:
+            mappedTable = ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(13, 11, 1.1, 0.95, storageDirectory=directory), 4.0, True, "sparse", isstoreErrorFields=False)
+            self.assertIsNone(mappedTable._AbsoluteError)
+            self.assertFalse(os.path.isfile(os.path.join(directory, "AbsoluteError.npy")))
+            self.assertEqual(mappedTable.ErrorNorms['MaxError'], nodeTable.ErrorNorms['MaxError'])
+
+    def test_RunRefinementStudy(self):
+        """
+        Checks the parallel refinement study matches serial solves and observes second order accuracy.
+        """
+        results = rs.RunRefinementStudy([17, 9, 33], 4.0, maxWorkers=2)
+        self.assertEqual(list(results['MeshSize']), [9, 17, 33])
+        for row in results:
+            nodeTable = ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(row['MeshSize'], row['MeshSize']), 4.0, True, "sparse")
+            self.assertAlmostEqual(row['MaxError'], np.amax(nodeTable.AbsoluteError))
+        self.assertTrue(np.isnan(results['MaxErrorOrder'][0]))
+        np.testing.assert_allclose(results['MaxErrorOrder'][1:], 2.0, atol=0.1)
+        np.testing.assert_allclose(results['L2ErrorOrder'][1:], 2.0, atol=0.1)
+
+    def test_SearchMeshSize(self):
+        """
+        Checks the predictive mesh search finds the same mesh as growing the mesh one node at a time.
+        """
+        for errorTolerance in [1.0e-3, 2.0e-4]:
+            meshSize = 5
+            while rs.SolveRefinementLevel(meshSize, 4.0, "sparse", 1.0)[1] > errorTolerance:
+                meshSize += 1
+            searchSize, searchError, numberofSolves = rs.SearchMeshSize(4.0, errorTolerance, 5)
+            self.assertEqual(searchSize, meshSize)
+            self.assertLessEqual(searchError, errorTolerance)
+            self.assertLess(numberofSolves, meshSize - 5 + 1)
+
+    def test_SearchGradedMeshSize(self):
+        """
+        Checks the optimised grading clusters nodes where the error is, and meets the tolerance with fewer nodes than a uniform mesh.
+        """
+        self.assertAlmostEqual(mg.StretchFactorForCellRatio(17, 0.5)**15, 0.5)
+        cellRatios, maxError, numberofSolves = mo.OptimiseCellRatios(9, 4.0)
+        self.assertLess(cellRatios[0], 1.0)
+        self.assertLess(maxError, 0.5*rs.SolveRefinementLevel(9, 4.0, "sparse", 1.0)[1])
+        cappedRatios, cappedError, numberofSolves = mo.OptimiseCellRatios(9, 4.0, maxSearches=1, maxCellRatio=1.1)
+        self.assertAlmostEqual(np.linalg.norm(np.log(cappedRatios)), np.log(1.1))
+        self.assertLess(cappedError, rs.SolveRefinementLevel(9, 4.0, "sparse", 1.0)[1])
+
+        uniformSize = rs.SearchMeshSize(4.0, 2.0e-5, 5)[0]
+        gradedSize, cellRatios, maxError, numberofSolves = mo.SearchGradedMeshSize(4.0, 2.0e-5, 9)
+        self.assertLessEqual(maxError, 2.0e-5)
+        self.assertEqual(rs.SearchMeshSize(4.0, 2.0e-5, 5, cellRatios=cellRatios)[0], gradedSize)
+        self.assertLess(gradedSize**2, 0.5*uniformSize**2)
+
     def test_ComputeErrorL2Norm(self):
         """
         Checks the the L2Norm is being computed
@@ -240,6 +450,384 @@ class TestErrorAnalysis(unittest.TestCase):
         MeshSize = np.array([10, 100])
         self.assertAlmostEqual(ea.ComputeErrorL2Norm(MeshError, MeshSize), 5.0)
 
+class TestDiffusionSolver(unittest.TestCase):
+
+    def test_Diffusion2DSparseMatrix(self):
+        """
+        Checks that every row of the sparse operator matches Diffusion2DRow.
+        """
+        nodeTable = mg.GenerateMesh2DMesh(5, 4)
+        sparseMatrix = dc.Diffusion2DSparseMatrix(nodeTable.Coordinate, nodeTable.CellSize, nodeTable.Volume, 3.0).toarray()
+        for inode in range(5*4):
+            np.testing.assert_allclose(sparseMatrix[inode], dc.Diffusion2DRow(nodeTable.Coordinate, nodeTable.CellSize, nodeTable.Volume, 3.0, inode))
+
+    def test_ImplicitDiffusion_SparseMatchesDense(self):
+        """
+        Checks that the sparse solver gives the same temperatures as the dense solver.
+        """
+        denseTable = ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(7, 6), 4.0, True, "dense")
+        sparseTable = ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(7, 6), 4.0, True, "sparse")
+        np.testing.assert_allclose(sparseTable.TemperatureNP1, denseTable.TemperatureNP1, rtol=1e-12, atol=1e-14)
+        self.assertLess(np.amax(denseTable.AbsoluteError), 1.0e-2)
+
+    def test_ImplicitDiffusion_Fast(self):
+        """
+        Checks the sine transform solver reproduces the dense solver on uniform meshes and falls back on stretched ones.
+        """
+        for numberofNodesX, numberofNodesY in [(2, 2), (3, 7), (9, 6), (16, 17)]:
+            denseTable = ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(numberofNodesX, numberofNodesY), 3.0, True, "dense")
+            fastTable = ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(numberofNodesX, numberofNodesY), 3.0, True, "fast")
+            np.testing.assert_allclose(fastTable.TemperatureNP1, denseTable.TemperatureNP1, rtol=1e-12, atol=1e-12)
+
+        source = np.random.RandomState(3).rand(8, 11)
+        nodeTable = mg.GenerateMesh2DMesh(8, 11)
+        fastField = fps.FastDiffusionSolve(nodeTable.Coordinate, 2.0, source)
+        sparseField = spla.spsolve(-dc.Diffusion2DSparseMatrix(nodeTable.Coordinate, nodeTable.CellSize, nodeTable.Volume, 2.0).tocsc(), source.ravel(order='F'))
+        np.testing.assert_allclose(fastField.ravel(order='F'), sparseField, rtol=1e-11, atol=1e-14)
+
+        self.assertTrue(fps.IsUniformMesh(mg.GenerateMesh2DMesh(65, 33).Coordinate))
+        self.assertFalse(fps.IsUniformMesh(mg.GenerateMesh2DMesh(65, 33, 1.0, 1.001).Coordinate))
+        sparseTable = ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(9, 8, 1.1, 0.9), 4.0, True, "sparse")
+        fastTable = ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(9, 8, 1.1, 0.9), 4.0, True, "fast")
+        np.testing.assert_array_equal(fastTable.TemperatureNP1, sparseTable.TemperatureNP1)
+
+    def test_ImplicitDiffusion_MatrixFree(self):
+        """
+        Checks the matrix free iterative solvers converge to the direct solution and report their residuals.
+        """
+        sparseTable = ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(9, 8), 4.0, True, "sparse")
+        for solverType in ["cg", "sor", "jacobi"]:
+            nodeTable = ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(9, 8), 4.0, True, solverType, tolerance=1.0e-12)
+            np.testing.assert_allclose(nodeTable.TemperatureNP1, sparseTable.TemperatureNP1, atol=1.0e-12)
+            self.assertLess(nodeTable.ResidualHistory[-1], 1.0e-12*nodeTable.ResidualHistory[0])
+
+        nodeTable = ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(9, 8), 4.0, True, "jacobi", tolerance=1.0e-12, maxIterations=5)
+        self.assertEqual(len(nodeTable.ResidualHistory), 6)
+
+    def test_ImplicitDiffusion_Multigrid(self):
+        """
+        Checks the multigrid solvers on odd, even and stretched meshes against the direct solution.
+        """
+        for meshSize, stretchFactor in [(17, 1.0), (18, 1.0), (17, 1.15), (12, 0.9)]:
+            sparseTable = ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(meshSize, meshSize + 3, stretchFactor, 1.0/stretchFactor), 4.0, True, "sparse")
+            for solverType in ["multigrid", "fmg"]:
+                nodeTable = ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(meshSize, meshSize + 3, stretchFactor, 1.0/stretchFactor), 4.0, True, solverType, tolerance=1.0e-12, maxIterations=30)
+                np.testing.assert_allclose(nodeTable.TemperatureNP1, sparseTable.TemperatureNP1, atol=1.0e-12)
+                self.assertLess(len(nodeTable.ResidualHistory), 20)
+
+    def test_ImplicitDiffusion_Parallel(self):
+        """
+        Checks the domain decomposition solver against the direct solution for single, strip and grid layouts, and the subdomain splits.
+        """
+        self.assertEqual(dd.SplitLine(11, 3), [(1, 4), (4, 7), (7, 10)])
+        self.assertEqual(dd.ChooseSubdomains(66, 34, 8), (4, 2))
+        self.assertEqual(dd.ChooseSubdomains(4, 4, 8), (2, 2))
+
+        sparseTable = ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(19, 14, 1.1, 0.95), 4.0, True, "sparse")
+        for subdomains in [(1, 1), (2, 1), (2, 3)]:
+            nodeTable = ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(19, 14, 1.1, 0.95), 4.0, True, "parallel", tolerance=1.0e-12, subdomains=subdomains)
+            np.testing.assert_allclose(nodeTable.TemperatureNP1, sparseTable.TemperatureNP1, atol=1.0e-12)
+        self.assertLess(len(nodeTable.ResidualHistory), 60)
+
+        # More subdomains than interior node lines are reduced to one per line.
+        sparseTable = ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(3, 4), 4.0, True, "sparse")
+        for subdomains in [(2, 2), (1, 5)]:
+            nodeTable = ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(3, 4), 4.0, True, "parallel", tolerance=1.0e-12, subdomains=subdomains)
+            np.testing.assert_allclose(nodeTable.TemperatureNP1, sparseTable.TemperatureNP1, atol=1.0e-12)
+
+        results = bm.BenchmarkDomainDecomposition(9, [(1, 1), (2, 2)])
+        self.assertEqual([result[0] for result in results], [(1, 1), (2, 2)])
+        self.assertEqual(results[0][4], 1.0)
+        self.assertGreater(results[1][4], 0.0)
+
+    def test_ImplicitDiffusion_MixedPrecision(self):
+        """
+        Checks single precision solvers refined against double precision residuals reach the double precision temperatures and errors,
+        with the factorisations held in half (dense) or two thirds (sparse, with its indices) of the memory.
+        """
+        for stretchFactor, solverTypes in [(1.0, ["fast"]), (1.1, ["dense", "sparse", "cg", "sor", "jacobi", "multigrid", "fmg"])]:
+            doubleTable = ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(19, 14, stretchFactor, 0.95), 4.0, True, "sparse", factorisationCache=None)
+            for solverType in solverTypes:
+                nodeTable = ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(19, 14, stretchFactor, 0.95), 4.0, True, solverType, factorisationCache=None,
+                                                 ismixedPrecision=True)
+                np.testing.assert_allclose(nodeTable.TemperatureNP1, doubleTable.TemperatureNP1, atol=1.0e-11)
+                self.assertAlmostEqual(nodeTable.ErrorNorms['MaxError'], doubleTable.ErrorNorms['MaxError'], delta=1.0e-11)
+                self.assertEqual(nodeTable.TemperatureNP1.dtype, np.float64)
+                self.assertLess(len(nodeTable.ResidualHistory), 6)
+                self.assertEqual(nodeTable.Profile.Phases["solve"]["Iterations"], len(nodeTable.ResidualHistory) - 1)
+
+        nodeTable = mg.GenerateMesh2DMesh(19, 14, 1.1, 0.95)
+        operator = its.DiffusionOperator2D(nodeTable.Coordinate, nodeTable.CellSize, nodeTable.Volume, 4.0)
+        doubleLU = fc.DenseLUFactorisation(operator.InteriorMatrix().toarray())
+        self.assertEqual(mp.SinglePrecisionSolver(nodeTable, operator, 4.0, "dense").NumberofBytes(), doubleLU.LU.nbytes//2 + doubleLU.Pivots.nbytes)
+        singleLU = mp.SinglePrecisionSolver(nodeTable, operator, 4.0, "sparse")
+        self.assertEqual(singleLU.Factorisation.L.dtype, np.float32)
+        self.assertLess(singleLU.NumberofBytes(), 0.7*fc.SparseLUNumberofBytes(spla.splu(operator.InteriorMatrix().tocsc())))
+        hierarchy = mgs.BuildHierarchy(nodeTable.Coordinate, 4.0)
+        self.assertEqual(2*hierarchy.AsType(np.float32).NumberofBytes(), hierarchy.NumberofBytes() + sum(prolongation.indices.nbytes + prolongation.indptr.nbytes
+                                                                                                       for prolongation in hierarchy.ProlongationX + hierarchy.ProlongationY))
+
+        # Meshes without interior nodes hold only Dirichlet values.
+        for numberofNodesX, numberofNodesY in [(2, 2), (2, 5), (5, 2)]:
+            doubleTable = ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(numberofNodesX, numberofNodesY), 4.0, True, "sparse", factorisationCache=None)
+            for solverType in ["dense", "sparse", "cg", "multigrid"]:
+                nodeTable = ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(numberofNodesX, numberofNodesY), 4.0, True, solverType, factorisationCache=None,
+                                                 ismixedPrecision=True)
+                np.testing.assert_array_equal(nodeTable.TemperatureNP1, doubleTable.TemperatureNP1)
+
+        results = bm.BenchmarkMixedPrecision(9, ["sparse", "cg"], 1.1)
+        self.assertEqual([result[0] for result in results], ["sparse", "cg"])
+        self.assertLess(results[0][5], 1.0e-12)
+
+    def test_ImplicitDiffusion_WarmStart(self):
+        """
+        Checks a coarse solution interpolated onto a finer, stretched mesh converges to the same answer in fewer iterations.
+        """
+        coarseTable = mg.GenerateMesh2DMesh(9, 7)
+        fineTable = mg.GenerateMesh2DMesh(17, 13, 1.1, 0.9)
+        bilinear = (1.0 + 2.0*coarseTable.Coordinate[:, :, 0])*(3.0 - coarseTable.Coordinate[:, :, 1])
+        np.testing.assert_allclose(mgs.InterpolateField(coarseTable.Coordinate, bilinear, fineTable.Coordinate),
+                                   (1.0 + 2.0*fineTable.Coordinate[:, :, 0])*(3.0 - fineTable.Coordinate[:, :, 1]), rtol=1e-12)
+
+        coarseTable = ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(17, 17, 1.1, 1.1), 4.0, True, "sparse")
+        for solverType in ["cg", "sor", "multigrid"]:
+            coldTable = ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(33, 33, 1.05, 1.05), 4.0, True, solverType, tolerance=1.0e-10)
+            warmTable = ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(33, 33, 1.05, 1.05), 4.0, True, solverType, tolerance=1.0e-10, initialTable=coarseTable)
+            np.testing.assert_allclose(warmTable.TemperatureNP1, coldTable.TemperatureNP1, atol=1.0e-9)
+            self.assertLess(len(warmTable.ResidualHistory), len(coldTable.ResidualHistory))
+
+    def test_ImplicitDiffusionBatch(self):
+        """
+        Checks every case of a batch matches a single right hand side solve, for each solver and for broadcast inputs.
+        """
+        thermalConducts = [4.0, 2.0, 4.0]
+        sources = np.random.RandomState(7).rand(3, 9, 8)
+        for stretchFactor, solverTypes in [(1.1, ["sparse", "dense", "cg", "multigrid", "parallel"]), (1.0, ["fast"])]:
+            nodeTable = mg.GenerateMesh2DMesh(9, 8, stretchFactor, 1.0/stretchFactor)
+            for solverType in solverTypes:
+                temperatures, absoluteErrors, errorNorms = ds.ImplicitDiffusionBatch(nodeTable, thermalConducts, sources, solverType, tolerance=1.0e-13,
+                                                                                     factorisationCache=None)
+                for icase in range(3):
+                    diffusionMatrix = -dc.Diffusion2DSparseMatrix(nodeTable.Coordinate, nodeTable.CellSize, nodeTable.Volume, thermalConducts[icase])
+                    expected = spla.spsolve(diffusionMatrix.tocsc(), sources[icase].ravel(order='F')).reshape((9, 8), order='F')
+                    np.testing.assert_allclose(temperatures[icase], expected, rtol=1e-10, atol=1e-12)
+                    np.testing.assert_array_equal(absoluteErrors[icase], np.abs(temperatures[icase] - ea.AnalyicalSolution2DField(nodeTable.Coordinate)))
+                    self.assertEqual(errorNorms[icase]['MaxError'], np.amax(absoluteErrors[icase]))
+
+        nodeTable = ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(9, 8, 1.1), 4.0, True, "sparse")
+        temperatures, absoluteErrors, errorNorms = ds.ImplicitDiffusionBatch(mg.GenerateMesh2DMesh(9, 8, 1.1), [4.0, 4.0], solverType="sparse", isstoreErrorFields=False)
+        self.assertIsNone(absoluteErrors)
+        np.testing.assert_allclose(temperatures[1], nodeTable.TemperatureNP1[:, :, 0], rtol=1e-12, atol=1e-15)
+        self.assertAlmostEqual(errorNorms[0]['L2Error'], nodeTable.ErrorNorms['L2Error'], 15)
+
+    def test_ImplicitDiffusion_Profile(self):
+        """
+        Checks every phase is recorded with its counts and that call and registered hooks see each phase as it finishes.
+        """
+        calledPhases = []
+        registeredPhases = []
+        hook = ins.RegisterHook(lambda name, record: registeredPhases.append(name))
+        try:
+            nodeTable = ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(9, 8, 1.1), 4.0, True, "sparse", factorisationCache=None,
+                                             hooks=[lambda name, record: calledPhases.append((name, record["Time"]))])
+        finally:
+            ins.RemoveHook(hook)
+        self.assertEqual([name for name, phaseTime in calledPhases], ["source", "assembly", "solve", "transfer", "error"])
+        self.assertEqual(registeredPhases, ["source", "assembly", "solve", "transfer", "error"])
+        self.assertTrue(all(phaseTime >= 0.0 for name, phaseTime in calledPhases))
+        profile = nodeTable.Profile.Phases
+        self.assertEqual((profile["assembly"]["Rows"], profile["assembly"]["Nonzeros"], profile["assembly"]["CacheHit"]), (72, 7*6*5 + 30, False))
+        self.assertEqual(profile["source"]["Bytes"], 72*8)
+        self.assertEqual(profile["error"]["MaxError"], nodeTable.ErrorNorms['MaxError'])
+
+        ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(9, 8), 4.0, True, "cg", tolerance=1.0e-8, initialTable=nodeTable)
+        self.assertEqual(len(registeredPhases), 5)
+        nodeTable = ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(9, 8), 4.0, True, "cg", tolerance=1.0e-8, initialTable=nodeTable)
+        profile = nodeTable.Profile.Phases
+        self.assertEqual(profile["solve"]["Iterations"], len(nodeTable.ResidualHistory) - 1)
+        self.assertEqual(profile["solve"]["Residual"], nodeTable.ResidualHistory[-1])
+        self.assertEqual((profile["assembly"]["Rows"], profile["transfer"]["Rows"]), (7*6, 72))
+        self.assertAlmostEqual(nodeTable.Profile.TotalTime(), sum(record["Time"] for record in profile.values()))
+
+    def test_ImplicitDiffusion_FactorisationCache(self):
+        """
+        Checks repeat solves reuse the factorisation and that the cache evicts the least recently used entry.
+        """
+        cache = fc.FactorisationCache(64*1024**2)
+        firstTable = ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(8, 9), 4.0, True, "sparse", factorisationCache=cache)
+        secondTable = ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(8, 9), 4.0, True, "sparse", factorisationCache=cache)
+        ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(8, 9), 2.0, True, "sparse", factorisationCache=cache)
+        ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(8, 9, 1.1), 4.0, True, "sparse", factorisationCache=cache)
+        self.assertEqual((cache.Hits, cache.Misses), (1, 3))
+        np.testing.assert_array_equal(firstTable.TemperatureNP1, secondTable.TemperatureNP1)
+
+        cache = fc.FactorisationCache(100)
+        cache.Put("a", "A", 40)
+        cache.Put("b", "B", 40)
+        cache.Get("a")
+        cache.Put("c", "C", 40)
+        self.assertIsNone(cache.Get("b"))
+        self.assertEqual(cache.Get("a"), "A")
+        self.assertEqual((cache.Evictions, cache.MemoryUsed), (1, 80))
+
+
+class TestPlotter(unittest.TestCase):
+
+    def test_Plotter_Headless(self):
+        """
+        Checks a headless plotter renders png and svg files in the background without creating a pyplot window.
+        """
+        nodeTable = ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(9, 7), 4.0, True)
+        figureNumbers = plt.get_fignums()
+        with tempfile.TemporaryDirectory() as directory:
+            plotter = pl.Plotter("Headless", 1, 2, 2, os.path.join(directory, "Plots", "Field.png"))
+            plotter.Add2DPlot(1, "Temperature", "x", "y", 9, 7, True)
+            plotter.Add1DPlot(2, "Error", "x", "y", "log", "-x", False)
+            plotter.Update2DPlotData(1, nodeTable.TemperatureNP1, "Temperature")
+            plotter.Update1DPlotData(2, [1, 2, 3], [1.0, 0.1, 0.01], "")
+            plotter.Plot(True)
+            plotter.SaveFigure(os.path.join(directory, "Field.svg"), False)
+            pl.WaitForAllRenders()
+            self.assertGreater(os.path.getsize(os.path.join(directory, "Plots", "Field.png")), 0)
+            with open(os.path.join(directory, "Field.svg")) as svgFile:
+                self.assertIn("<svg", svgFile.read())
+        self.assertEqual(plt.get_fignums(), figureNumbers)
+
+
+    def test_Plotter_IncrementalUpdate(self):
+        """
+        Checks repeat 2D updates reuse the mesh artist and colour bar and only change the colours.
+        """
+        nodeTable = ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(9, 7), 4.0, True)
+        plotter = pl.Plotter("Incremental", 1, 1, 1, os.path.join(tempfile.gettempdir(), "Incremental.png"))
+        plotter.Add2DPlot(1, "Temperature", "x", "y", 9, 7, True)
+        plotter.Update2DPlotData(1, nodeTable.TemperatureNP1, "Temperature")
+        mesh = plotter.Mesh2D[0]
+        colorBar = plotter.ColorBar[0]
+
+        plotter.Update2DPlotData(1, 2.0*nodeTable.TemperatureNP1[:, :, 0], "Scaled")
+        self.assertIs(plotter.Mesh2D[0], mesh)
+        self.assertIs(plotter.ColorBar[0], colorBar)
+        self.assertEqual(len(plotter.SubPlot[0].collections), 1)
+        np.testing.assert_array_equal(mesh.get_array(), 2.0*nodeTable.TemperatureNP1[:, :, 0].T)
+        self.assertEqual(colorBar.mappable.get_clim(), (2.0*np.min(nodeTable.TemperatureNP1), 2.0*np.max(nodeTable.TemperatureNP1)))
+
+        plotter.Update2DPlotData(1, nodeTable.TemperatureNP1, "Temperature", (-1.0, 1.0))
+        self.assertEqual(mesh.get_clim(), (-1.0, 1.0))
+
+    def test_Plotter_DecimateField(self):
+        """
+        Checks large fields are reduced to the plot resolution keeping their extremes, and lose their node grid lines.
+        """
+        field = np.random.RandomState(5).rand(301, 517)
+        decimated = pl.DecimateField(field, 40, 60)
+        self.assertLessEqual(decimated.shape[0], 40)
+        self.assertLessEqual(decimated.shape[1], 60)
+        self.assertEqual((np.min(decimated), np.max(decimated)), (np.min(field), np.max(field)))
+        np.testing.assert_array_equal(decimated[0, :2], [np.min(field[:8, :18]), np.max(field[:8, :18])])
+        self.assertIs(pl.DecimateField(field, 301, 517), field)
+
+        plotter = pl.Plotter("Decimated", 1, 1, 1, os.path.join(tempfile.gettempdir(), "Decimated.png"))
+        plotter.Add2DPlot(1, "Field", "x", "y", 517, 301, True)
+        plotter.Update2DPlotData(1, field.T, "Field")
+        plotSize = plotter.SubPlot[0].get_window_extent()
+        self.assertLessEqual(plotter.Mesh2D[0].get_array().size, plotSize.width*plotSize.height)
+        self.assertEqual(len(plotter.SubPlot[0].get_xticks(minor=True)), 0)
+
+
+class TestQuadtreeRefinement(unittest.TestCase):
+
+    def test_BlockHierarchy_Conservative(self):
+        """
+        Checks refinement keeps neighbouring blocks within one level, interface fluxes cancel and uniform refinement is second order.
+        """
+        hierarchy = qr.BlockHierarchy(6)
+        hierarchy.Refine([(0, 0, 0)])
+        hierarchy.Refine([(1, 0, 0)])
+        hierarchy.Refine([(2, 1, 1)])
+        self.assertItemsEqual([key for key in hierarchy.Blocks if key[0] == 1], [(1, 1, 1)])
+        self.assertEqual(hierarchy.NumberofCells(), (1 + 11 + 4)*36)
+        for (level, indexX, indexY), block in hierarchy.Blocks.items():
+            for side in qr.BlockSides:
+                neighbour = hierarchy.FindLeaf(level, indexX + side[0], indexY + side[1])
+                self.assertTrue(neighbour is None or neighbour.Level >= level - 1)
+
+        # Summing every cell's equation leaves only the wall fluxes.
+        matrix, rhs = hierarchy.Assemble(4.0)
+        isWall = np.zeros(hierarchy.NumberofCells(), dtype=bool)
+        for (level, indexX, indexY), block in hierarchy.Blocks.items():
+            for side in qr.BlockSides:
+                if not (0 <= indexX + side[0] < 2**level and 0 <= indexY + side[1] < 2**level):
+                    isWall[block.EdgeCells(side)] = True
+                    isWall[block.EdgeCells(side) - side[0] - side[1]*6] = True
+        np.testing.assert_allclose(np.asarray(matrix.sum(axis=0)).ravel()[~isWall], 0.0, atol=1.0e-12)
+
+        maxErrors = []
+        for numberofRefinements in range(1, 4):
+            hierarchy = qr.BlockHierarchy(8)
+            for irefinement in range(numberofRefinements):
+                hierarchy.Refine(list(hierarchy.Blocks))
+            maxErrors.append(hierarchy.Solve(4.0)['MaxError'])
+        np.testing.assert_allclose(np.log2(np.array(maxErrors[:-1])/maxErrors[1:]), 2.0, atol=0.3)
+
+    def test_RefineToTolerance(self):
+        """
+        Checks adaptive refinement meets the tolerance with fewer cells than refining every block.
+        """
+        uniform = qr.RefineToTolerance(4.0, 1.0e-5, refineFraction=0.0)
+        adaptive = qr.RefineToTolerance(4.0, 1.0e-5)
+        self.assertLessEqual(adaptive.ErrorNorms['MaxError'], 1.0e-5)
+        self.assertLess(adaptive.NumberofCells(), 0.6*uniform.NumberofCells())
+        self.assertGreater(len(set(key[0] for key in adaptive.Blocks)), 1)
+        self.assertTrue(all(block.ErrorEstimate >= 0.0 for block in adaptive.Blocks.values()))
+        for blockCells in [3, 4]:
+            self.assertRaises(SystemExit, qr.RefineToTolerance, 4.0, 1.0e-3, blockCells, 4)
+
+
+class TestHeatDiffusion(unittest.TestCase):
+
+    def test_Main(self):
+        """
+        Checks the command line subcommands run, plot only on request and that importing the solvers never loads matplotlib.
+        """
+        directory = os.path.dirname(os.path.abspath(__file__))
+        command = "import sys, HeatDiffusion, Assignment2Main; print('matplotlib' in sys.modules)"
+        output = subprocess.run([sys.executable, "-c", command], cwd=directory, capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip(), "False")
+
+        self.assertEqual(hd.Main(["solve", "--size", "9", "--solver", "cg", "--tolerance", "1e-12"]), 0)
+        self.assertEqual(hd.Main(["refine", "--sizes", "5", "9", "--workers", "0"]), 0)
+        with tempfile.TemporaryDirectory() as directory:
+            fileName = os.path.join(directory, "Search.png")
+            self.assertEqual(hd.Main(["search", "--tolerance", "1e-3", "--size", "5", "--plot", fileName]), 0)
+            self.assertTrue(os.path.isfile(fileName))
+        np.testing.assert_allclose(hd.SolveMesh(9, solverType="cg", tolerance=1.0e-12).TemperatureNP1,
+                                   ds.ImplicitDiffusion(mg.GenerateMesh2DMesh(9, 9), 4.0, True, "sparse").TemperatureNP1, atol=1.0e-12)
+
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_BenchmarkSuite(self):
+        """
+        Checks every phase is measured, results round trip through JSON and regressions against a baseline are flagged.
+        """
+        results = bm.RunBenchmarkSuite([5, 9], isplot=False, repeats=1)
+        self.assertEqual(list(results['Phase'][:4]), ["mesh", "assembly", "solve", "error"])
+        self.assertEqual(list(results['MeshSize']), [5]*4 + [9]*4)
+        self.assertTrue(np.all(results['PeakMemory'] > 0))
+
+        with tempfile.TemporaryDirectory() as directory:
+            bm.WriteBenchmarkJSON(results, os.path.join(directory, "Results.json"), "fast", 1.0)
+            np.testing.assert_array_equal(bm.ReadBenchmarkJSON(os.path.join(directory, "Results.json")), results)
+
+        slower = results.copy()
+        slower['Time'][slower['Phase'] == "solve"] = 1.0
+        slower['PeakMemory'][0] *= 2
+        regressions = bm.CompareWithBaseline(slower, results)
+        self.assertEqual(sorted((meshSize, phase, quantity) for meshSize, phase, quantity, baselineValue, newValue in regressions),
+                         [(5, "mesh", "PeakMemory"), (5, "solve", "Time"), (9, "solve", "Time")])
+        self.assertEqual(bm.CompareWithBaseline(results, slower), [])
+
 
 if __name__ == '__main__':
     unittest.main(verbosity=2)